@@ -0,0 +1,212 @@
+"""
+Storage helpers for per-question practice attempts.
+
+Two layouts are supported:
+
+- "packed" (default): one `practice_session_attempt_packs` row per session
+  holding parallel arrays (answers, correctness bitmap, times). Question fields
+  that are identical across the whole session (operation, digit settings, ...)
+  are stored once in `question_templates`, deduplicated by hash, so a
+  100-question session is one row instead of 100.
+- "rows": the legacy `attempts` table, one row per question, written with a
+  single multi-row INSERT (executemany).
+
+Set ATTEMPT_STORAGE=rows to keep writing the legacy layout. Reads handle both,
+so sessions saved before the switch keep working.
+"""
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, joinedload
+
+from models import Attempt, PracticeSession, PracticeSessionAttemptPack, QuestionTemplate
+from timezone_utils import get_ist_now
+
+ATTEMPT_STORAGE = os.getenv("ATTEMPT_STORAGE", "packed").lower()
+
+
+def build_attempt_rows(session_id: int, attempts: Sequence) -> List[dict]:
+    """Convert validated AttemptCreate objects into plain row dicts for a bulk insert."""
+    created_at = get_ist_now().replace(tzinfo=None)
+    return [
+        {
+            "session_id": session_id,
+            "question_data": attempt.question_data,
+            "user_answer": attempt.user_answer,
+            "correct_answer": attempt.correct_answer,
+            "is_correct": attempt.is_correct,
+            "time_taken": attempt.time_taken,
+            "question_number": attempt.question_number,
+            "created_at": created_at,
+        }
+        for attempt in attempts
+    ]
+
+
+def bulk_insert_attempts(db: Session, session_id: int, attempts: Sequence) -> int:
+    """
+    Insert all attempts for a practice session in one executemany round trip.
+    Runs inside the caller's transaction. Returns the number of rows written.
+
+    Uses the Core table rather than the ORM entity: the ORM bulk insert starts a
+    new batch whenever the set of NULL columns changes (unanswered questions),
+    which on PostgreSQL turned one statement into dozens.
+    """
+    rows = build_attempt_rows(session_id, attempts)
+    if rows:
+        db.execute(insert(Attempt.__table__), rows)
+    return len(rows)
+
+
+# ---------------------------------------------------------------------------
+# Packed layout
+# ---------------------------------------------------------------------------
+
+def _canonical_json(value: Any) -> str:
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+
+
+def encode_bits(flags: Sequence[bool]) -> str:
+    """Pack booleans into a hex string, bit i of byte i // 8 = flags[i]."""
+    packed = bytearray((len(flags) + 7) // 8)
+    for i, flag in enumerate(flags):
+        if flag:
+            packed[i // 8] |= 1 << (i % 8)
+    return packed.hex()
+
+
+def decode_bits(bits: str, count: int) -> List[bool]:
+    """Inverse of encode_bits."""
+    packed = bytes.fromhex(bits or "")
+    return [bool(packed[i // 8] & (1 << (i % 8))) if i // 8 < len(packed) else False for i in range(count)]
+
+
+def split_question_template(question_data: Sequence[Dict[str, Any]]):
+    """
+    Split per-question data into (shared template, per-question remainders).
+
+    A key goes into the template when every question has it with the same
+    value. Single-question sessions keep everything per-question - there is
+    nothing to share.
+    """
+    if len(question_data) < 2:
+        return {}, [dict(q) for q in question_data]
+
+    first = question_data[0]
+    template = {}
+    for key, value in first.items():
+        encoded = _canonical_json(value)
+        if all(key in q and _canonical_json(q[key]) == encoded for q in question_data[1:]):
+            template[key] = value
+
+    values = [{k: v for k, v in q.items() if k not in template} for q in question_data]
+    return template, values
+
+
+def get_or_create_question_template(db: Session, template: Dict[str, Any]) -> Optional[QuestionTemplate]:
+    """Return the stored template with this content, inserting it if needed. None for an empty template."""
+    if not template:
+        return None
+
+    template_hash = hashlib.sha256(_canonical_json(template).encode("utf-8")).hexdigest()
+    existing = db.query(QuestionTemplate).filter(QuestionTemplate.template_hash == template_hash).first()
+    if existing:
+        return existing
+
+    # Savepoint so a concurrent insert of the same template doesn't abort the caller's transaction
+    try:
+        with db.begin_nested():
+            created = QuestionTemplate(template_hash=template_hash, template=template)
+            db.add(created)
+        return created
+    except IntegrityError:
+        return db.query(QuestionTemplate).filter(QuestionTemplate.template_hash == template_hash).one()
+
+
+def pack_attempts(db: Session, session_id: int, attempts: Sequence) -> PracticeSessionAttemptPack:
+    """Build (and add to the session) the packed record for a practice session's attempts."""
+    ordered = sorted(attempts, key=lambda a: a.question_number)
+    template, question_values = split_question_template([a.question_data or {} for a in ordered])
+    question_template = get_or_create_question_template(db, template)
+
+    pack = PracticeSessionAttemptPack(
+        session_id=session_id,
+        question_count=len(ordered),
+        template_id=question_template.id if question_template else None,
+        question_values=question_values,
+        user_answers=[a.user_answer for a in ordered],
+        correct_answers=[a.correct_answer for a in ordered],
+        correct_bits=encode_bits([a.is_correct for a in ordered]),
+        times=[a.time_taken for a in ordered],
+        question_numbers=[a.question_number for a in ordered],
+        created_at=get_ist_now().replace(tzinfo=None),
+    )
+    db.add(pack)
+    return pack
+
+
+def unpack_attempts(pack: PracticeSessionAttemptPack) -> List[dict]:
+    """
+    Decode a packed record into AttemptResponse-shaped dicts, ordered by
+    question number. Packed attempts have no row ids, so `id` is the
+    1-based position within the session.
+    """
+    template = pack.template.template if pack.template else {}
+    count = pack.question_count
+    correct = decode_bits(pack.correct_bits, count)
+
+    attempts = []
+    for i in range(count):
+        question_data = dict(template)
+        question_data.update(pack.question_values[i] or {})
+        attempts.append({
+            "id": i + 1,
+            "question_data": question_data,
+            "user_answer": pack.user_answers[i],
+            "correct_answer": pack.correct_answers[i],
+            "is_correct": correct[i],
+            "time_taken": pack.times[i],
+            "question_number": pack.question_numbers[i],
+            "created_at": pack.created_at,
+        })
+    return attempts
+
+
+def store_attempts(db: Session, session_id: int, attempts: Sequence) -> int:
+    """
+    Persist a session's attempts in the configured layout (ATTEMPT_STORAGE).
+    Runs inside the caller's transaction. Returns the number of attempts stored.
+    """
+    if not attempts:
+        return 0
+    if ATTEMPT_STORAGE == "rows":
+        return bulk_insert_attempts(db, session_id, attempts)
+    pack_attempts(db, session_id, attempts)
+    return len(attempts)
+
+
+def get_session_with_attempts(db: Session, session_id: int, user_id: int) -> Optional[PracticeSession]:
+    """Fetch a user's practice session together with its pack and template in one query."""
+    return db.query(PracticeSession).options(
+        joinedload(PracticeSession.attempt_pack).joinedload(PracticeSessionAttemptPack.template)
+    ).filter(
+        PracticeSession.id == session_id,
+        PracticeSession.user_id == user_id
+    ).first()
+
+
+def load_session_attempts(db: Session, session: PracticeSession) -> List[Any]:
+    """
+    All attempts of a session, whichever layout they were saved in. Returns
+    dicts for packed sessions and Attempt rows for legacy ones; both validate
+    into AttemptResponse.
+    """
+    if session.attempt_pack is not None:
+        return unpack_attempts(session.attempt_pack)
+    return db.query(Attempt).filter(
+        Attempt.session_id == session.id
+    ).order_by(Attempt.question_number).all()
@@ -0,0 +1,286 @@
+"""
+Attendance rollups: per-student monthly counts (`student_attendance_monthly`)
+and per day, branch and course counts (`attendance_daily_summary`).
+
+Marking, unmarking, session deletion and student deletion call
+refresh_attendance_months for the students and months they touched, and
+refresh_daily_summary for each session's day, branch and course. Each
+recounts the affected records in one grouped query and upserts the result,
+so the rollups can't drift through edits or status changes. The reward
+summary and student stats read the monthly rows, the admin metrics card
+reads the daily rows, and the rebuild_* functions backfill or repair both
+from AttendanceRecord history.
+"""
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import case, extract, func
+from sqlalchemy.orm import Session
+
+from models import AttendanceDailySummary, AttendanceRecord, ClassSession, StudentAttendanceMonthly, StudentProfile
+from timezone_utils import IST_TIMEZONE, get_ist_now
+from upsert_utils import replace_upsert
+
+STATUSES = ("present", "absent", "on_break", "leave")
+
+
+def month_start(day) -> date:
+    """First day of the month containing `day` (a date or naive IST datetime)."""
+    return date(day.year, day.month, 1)
+
+
+def month_window(month: date) -> Tuple[datetime, datetime]:
+    """[first day of month, first day of next month) as naive IST datetimes."""
+    start = datetime(month.year, month.month, 1)
+    end = datetime(month.year + 1, 1, 1) if month.month == 12 else datetime(month.year, month.month + 1, 1)
+    return start, end
+
+
+def _month_counts(db: Session, student_profile_ids, month: date):
+    """Per student: record counts by status and T-shirts for sessions in the month (one grouped query)."""
+    start, end = month_window(month)
+    return db.query(
+        AttendanceRecord.student_profile_id,
+        *[func.sum(case((AttendanceRecord.status == status, 1), else_=0)).label(status) for status in STATUSES],
+        func.sum(case((AttendanceRecord.t_shirt_worn == True, 1), else_=0)).label("t_shirts"),
+    ).join(
+        ClassSession, ClassSession.id == AttendanceRecord.session_id
+    ).filter(
+        AttendanceRecord.student_profile_id.in_(list(student_profile_ids)),
+        ClassSession.session_date >= start,
+        ClassSession.session_date < end
+    ).group_by(AttendanceRecord.student_profile_id).all()
+
+
+def refresh_attendance_months(db: Session, student_profile_ids: Iterable[int], months: Iterable[date]) -> None:
+    """
+    Recount the given students' attendance for each month and upsert their
+    rollup rows (students left with no records in the month lose the row).
+    Runs in the caller's transaction. The students' cached reward summaries
+    are dropped when it commits.
+    """
+    student_profile_ids = set(student_profile_ids)
+    if not student_profile_ids:
+        return
+    db.flush()  # Count the records the caller has added, changed or deleted
+    updated_at = get_ist_now().replace(tzinfo=None)
+    for month in set(months):
+        counts = _month_counts(db, student_profile_ids, month)
+        # Upsert rather than delete-and-insert: concurrent marks for the same student and month can't collide
+        replace_upsert(db, StudentAttendanceMonthly, ("student_profile_id", "month_start"), [
+            {
+                "student_profile_id": row.student_profile_id,
+                "month_start": month,
+                **{status: getattr(row, status) or 0 for status in STATUSES},
+                "t_shirts": row.t_shirts or 0,
+                "updated_at": updated_at,
+            }
+            for row in counts
+        ])
+        emptied = student_profile_ids - {row.student_profile_id for row in counts}
+        if emptied:
+            db.query(StudentAttendanceMonthly).filter(
+                StudentAttendanceMonthly.student_profile_id.in_(emptied),
+                StudentAttendanceMonthly.month_start == month
+            ).delete(synchronize_session=False)
+
+    from stats_cache import invalidate_on_commit, reward_summary_cache
+    for (user_id,) in db.query(StudentProfile.user_id).filter(StudentProfile.id.in_(student_profile_ids)):
+        invalidate_on_commit(db, reward_summary_cache, user_id)
+
+
+def summary_key(session: ClassSession) -> Tuple[date, str, str]:
+    """The attendance_daily_summary row a session's records count towards."""
+    return session.session_date.date(), session.branch, session.course or ""
+
+
+def refresh_daily_summary(db: Session, keys: Iterable[Tuple[date, str, str]]) -> None:
+    """
+    Recount attendance for each (IST day, branch, course) from summary_key
+    and upsert its summary row (dropped once nothing is marked). Only those
+    rows are touched, so markings for other branches and courses on the same
+    day never collide. Runs in the caller's transaction.
+    """
+    keys = set(keys)
+    if not keys:
+        return
+    db.flush()  # Count the records the caller has added, changed or deleted
+    updated_at = get_ist_now().replace(tzinfo=None)
+    for day, branch, course in keys:
+        start = datetime(day.year, day.month, day.day)
+        counts = db.query(
+            *[func.sum(case((AttendanceRecord.status == status, 1), else_=0)).label(status) for status in STATUSES],
+        ).select_from(ClassSession).join(
+            AttendanceRecord, AttendanceRecord.session_id == ClassSession.id
+        ).filter(
+            ClassSession.session_date >= start,
+            ClassSession.session_date < start + timedelta(days=1),
+            ClassSession.branch == branch,
+            func.coalesce(ClassSession.course, "") == course
+        ).one()
+        if any(counts):
+            replace_upsert(db, AttendanceDailySummary, ("summary_date", "branch", "course"), [{
+                "summary_date": day,
+                "branch": branch,
+                "course": course,
+                **{status: getattr(counts, status) or 0 for status in STATUSES},
+                "updated_at": updated_at,
+            }])
+        else:
+            db.query(AttendanceDailySummary).filter(
+                AttendanceDailySummary.summary_date == day,
+                AttendanceDailySummary.branch == branch,
+                AttendanceDailySummary.course == course
+            ).delete(synchronize_session=False)
+
+
+def daily_summary_counts(db: Session, start: date, end: date,
+                         branch: Optional[str] = None, course: Optional[str] = None) -> Dict[str, int]:
+    """{status: count} summed over the IST days in [start, end) (one indexed read)."""
+    query = db.query(*[func.coalesce(func.sum(getattr(AttendanceDailySummary, status)), 0) for status in STATUSES]).filter(
+        AttendanceDailySummary.summary_date >= start,
+        AttendanceDailySummary.summary_date < end
+    )
+    if branch:
+        query = query.filter(AttendanceDailySummary.branch == branch)
+    if course:
+        query = query.filter(AttendanceDailySummary.course == course)
+    return dict(zip(STATUSES, query.one()))
+
+
+def monthly_status_counts(db: Session, student_profile_id: int,
+                          start: Optional[datetime] = None, end: Optional[datetime] = None) -> Dict[date, Dict[str, int]]:
+    """
+    {month start: {status: count}} for one student's records, over the
+    sessions in [start, end] when either bound is given. Without bounds it
+    reads the rollup rows; with them it is one GROUP BY month, status over
+    the records (session dates are naive IST, so months are IST months).
+    """
+    if start is None and end is None:
+        rows = db.query(StudentAttendanceMonthly).filter(
+            StudentAttendanceMonthly.student_profile_id == student_profile_id
+        ).all()
+        return {row.month_start: {status: getattr(row, status) or 0 for status in STATUSES} for row in rows}
+
+    # Session dates are stored as naive IST; compare aware bounds in IST too
+    start, end = [bound.astimezone(IST_TIMEZONE).replace(tzinfo=None) if bound is not None and bound.tzinfo else bound
+                  for bound in (start, end)]
+    year = extract("year", ClassSession.session_date)
+    month = extract("month", ClassSession.session_date)
+    query = db.query(year, month, AttendanceRecord.status, func.count(AttendanceRecord.id)).join(
+        ClassSession, ClassSession.id == AttendanceRecord.session_id
+    ).filter(AttendanceRecord.student_profile_id == student_profile_id)
+    if start is not None:
+        query = query.filter(ClassSession.session_date >= start)
+    if end is not None:
+        query = query.filter(ClassSession.session_date <= end)
+
+    months: Dict[date, Dict[str, int]] = {}
+    for row_year, row_month, status, count in query.group_by(year, month, AttendanceRecord.status):
+        counts = months.setdefault(date(int(row_year), int(row_month), 1), dict.fromkeys(STATUSES, 0))
+        counts[status] = counts.get(status, 0) + count
+    return months
+
+
+def get_month_attendance(db: Session, student_profile_id: int, month: date) -> Dict[str, int]:
+    """{status: count, "t_shirts": count} for one student and month (zeros when unmarked)."""
+    row = db.query(StudentAttendanceMonthly).filter(
+        StudentAttendanceMonthly.student_profile_id == student_profile_id,
+        StudentAttendanceMonthly.month_start == month
+    ).first()
+    return {name: (getattr(row, name) or 0) if row else 0 for name in (*STATUSES, "t_shirts")}
+
+
+def attendance_percentage(db: Session, profile: StudentProfile, month: date) -> float:
+    """Present records as a % of the class sessions held for the student's branch in the month."""
+    start, end = month_window(month)
+    sessions = db.query(func.count(ClassSession.id)).filter(
+        ClassSession.branch == profile.branch,
+        ClassSession.session_date >= start,
+        ClassSession.session_date < end
+    ).scalar() or 0
+    if not sessions:
+        return 0.0
+    return get_month_attendance(db, profile.id, month)["present"] / sessions * 100
+
+
+def rebuild_attendance_rollup(db: Session, student_profile_id: Optional[int] = None) -> int:
+    """
+    Recompute the rollup from the full AttendanceRecord history (backfill /
+    repair). Commits. Returns the number of rows written.
+    """
+    totals: Dict[Tuple[int, date], Dict[str, int]] = {}
+    query = db.query(
+        AttendanceRecord.student_profile_id, ClassSession.session_date,
+        AttendanceRecord.status, AttendanceRecord.t_shirt_worn
+    ).join(ClassSession, ClassSession.id == AttendanceRecord.session_id)
+    if student_profile_id is not None:
+        query = query.filter(AttendanceRecord.student_profile_id == student_profile_id)
+    for profile_id, session_date, status, t_shirt_worn in query:
+        counts = totals.setdefault((profile_id, month_start(session_date)), dict.fromkeys((*STATUSES, "t_shirts"), 0))
+        if status in STATUSES:
+            counts[status] += 1
+        if t_shirt_worn:
+            counts["t_shirts"] += 1
+
+    try:
+        delete_query = db.query(StudentAttendanceMonthly)
+        if student_profile_id is not None:
+            delete_query = delete_query.filter(StudentAttendanceMonthly.student_profile_id == student_profile_id)
+        delete_query.delete(synchronize_session=False)
+        updated_at = get_ist_now().replace(tzinfo=None)
+        db.add_all([
+            StudentAttendanceMonthly(student_profile_id=profile_id, month_start=month, updated_at=updated_at, **counts)
+            for (profile_id, month), counts in totals.items()
+        ])
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"❌ [ATTENDANCE_ROLLUP] Error rebuilding rollup: {e}")
+        raise
+
+    print(f"✅ [ATTENDANCE_ROLLUP] Rebuilt {len(totals)} student-month rows")
+    return len(totals)
+
+
+def rebuild_daily_summary(db: Session) -> int:
+    """
+    Recompute attendance_daily_summary from the full AttendanceRecord history
+    (backfill / repair). Commits. Returns the number of rows written.
+    """
+    totals: Dict[Tuple[date, str, str], Dict[str, int]] = {}
+    query = db.query(
+        ClassSession.session_date, ClassSession.branch, ClassSession.course, AttendanceRecord.status
+    ).join(AttendanceRecord, AttendanceRecord.session_id == ClassSession.id)
+    for session_date, branch, course, status in query:
+        counts = totals.setdefault((session_date.date(), branch, course or ""), dict.fromkeys(STATUSES, 0))
+        if status in STATUSES:
+            counts[status] += 1
+
+    try:
+        db.query(AttendanceDailySummary).delete(synchronize_session=False)
+        updated_at = get_ist_now().replace(tzinfo=None)
+        db.add_all([
+            AttendanceDailySummary(summary_date=day, branch=branch, course=course, updated_at=updated_at, **counts)
+            for (day, branch, course), counts in totals.items()
+        ])
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"❌ [ATTENDANCE_ROLLUP] Error rebuilding daily summary: {e}")
+        raise
+
+    print(f"✅ [ATTENDANCE_ROLLUP] Rebuilt {len(totals)} daily summary rows")
+    return len(totals)
+
+
+def backfill_if_empty(db: Session) -> int:
+    """Build the rollups from history the first time the app starts with an empty table."""
+    if db.query(AttendanceRecord.id).first() is None:
+        return 0
+    rebuilt = 0
+    if db.query(StudentAttendanceMonthly.student_profile_id).first() is None:
+        rebuilt += rebuild_attendance_rollup(db)
+    if db.query(AttendanceDailySummary.summary_date).first() is None:
+        rebuilt += rebuild_daily_summary(db)
+    return rebuilt
@@ -1,8 +1,8 @@
 """API routes for attendance management system."""
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, and_, or_
-from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
+from sqlalchemy.orm import Session, contains_eager
+from sqlalchemy import func, desc, and_, or_, insert
+from typing import Any, Dict, List, Optional, Union
 from datetime import datetime, timedelta, date
 from timezone_utils import get_ist_now
 from calendar import monthrange
@@ -12,6 +12,8 @@ from models import (
     Certificate, get_db
 )
 from auth import get_current_user, get_current_admin
+from attendance_rollup import month_start, refresh_attendance_months, refresh_daily_summary, summary_key
+from stats_cache import invalidate_on_commit, reward_summary_cache
 from user_schemas import (
     ClassScheduleCreate, ClassScheduleResponse,
     ClassSessionCreate, ClassSessionResponse,
@@ -252,6 +254,8 @@ async def create_class_session(
         created_by_user_id=admin.id
     )
     db.add(session)
+    # Attendance percentages in cached reward summaries count the branch's sessions
+    invalidate_on_commit(db, reward_summary_cache)
     db.commit()
     db.refresh(session)
     return ClassSessionResponse.model_validate(session)
@@ -327,8 +331,15 @@ async def delete_class_session(
         raise HTTPException(status_code=404, detail="Session not found")
     
     try:
+        student_profile_ids = [
+            student_profile_id for (student_profile_id,) in
+            db.query(AttendanceRecord.student_profile_id).filter(AttendanceRecord.session_id == session_id)
+        ]
         # Attendance records will be deleted via cascade
         db.delete(session)
+        refresh_attendance_months(db, student_profile_ids, [month_start(session.session_date)])
+        refresh_daily_summary(db, [summary_key(session)])
+        invalidate_on_commit(db, reward_summary_cache)
         db.commit()
         return {"message": "Session deleted successfully"}
     except Exception as e:
@@ -344,6 +355,8 @@ async def mark_attendance(
     db: Session = Depends(get_db)
 ):
     """Mark attendance for a single student."""
+    session = db.query(ClassSession).filter(ClassSession.id == attendance_data.session_id).first()
+    
     # Check if record already exists
     existing = db.query(AttendanceRecord).filter(
         AttendanceRecord.session_id == attendance_data.session_id,
@@ -357,8 +370,6 @@ async def mark_attendance(
         existing.remarks = attendance_data.remarks
         existing.marked_by_user_id = admin.id
         existing.updated_at = get_ist_now()
-        db.commit()
-        db.refresh(existing)
         record = existing
     else:
         # Create new record
@@ -371,14 +382,14 @@ async def mark_attendance(
             marked_by_user_id=admin.id
         )
         db.add(record)
-        db.commit()
-        db.refresh(record)
     
     # Mark session as completed
-    session = db.query(ClassSession).filter(ClassSession.id == attendance_data.session_id).first()
     if session:
         session.is_completed = True
-        db.commit()
+        refresh_attendance_months(db, [attendance_data.student_profile_id], [month_start(session.session_date)])
+        refresh_daily_summary(db, [summary_key(session)])
+    db.commit()
+    db.refresh(record)
     
     # Get student info for response
     profile = db.query(StudentProfile).filter(StudentProfile.id == attendance_data.student_profile_id).first()
@@ -396,54 +407,72 @@ async def mark_bulk_attendance(
     admin: User = Depends(get_current_admin),
     db: Session = Depends(get_db)
 ):
-    """Mark attendance for multiple students at once."""
-    results = []
-    
-    for attendance_data in bulk_data.attendance_data:
-        # Check if record already exists
-        existing = db.query(AttendanceRecord).filter(
+    """
+    Mark attendance for multiple students at once.
+    Existing records for the session are prefetched in one query, new ones
+    are inserted in one executemany and the response is built from one joined
+    record/profile fetch, so a whole class takes a handful of queries.
+    """
+    # Last entry wins if a student appears twice
+    marks = {item.student_profile_id: item for item in bulk_data.attendance_data}
+    if not marks:
+        return []
+    
+    existing_records = {
+        record.student_profile_id: record
+        for record in db.query(AttendanceRecord).filter(
             AttendanceRecord.session_id == bulk_data.session_id,
-            AttendanceRecord.student_profile_id == attendance_data.student_profile_id
-        ).first()
-        
+            AttendanceRecord.student_profile_id.in_(list(marks))
+        )
+    }
+    
+    now = get_ist_now()
+    new_records = []
+    for student_profile_id, attendance_data in marks.items():
+        existing = existing_records.get(student_profile_id)
         if existing:
             existing.status = attendance_data.status
-            existing.t_shirt_worn = getattr(attendance_data, 't_shirt_worn', False) if hasattr(attendance_data, 't_shirt_worn') else existing.t_shirt_worn
+            if attendance_data.t_shirt_worn is not None:
+                existing.t_shirt_worn = attendance_data.t_shirt_worn
             existing.remarks = attendance_data.remarks
             existing.marked_by_user_id = admin.id
-            existing.updated_at = get_ist_now()
-            record = existing
+            existing.updated_at = now
         else:
-            record = AttendanceRecord(
-                session_id=bulk_data.session_id,
-                student_profile_id=attendance_data.student_profile_id,
-                status=attendance_data.status,
-                t_shirt_worn=getattr(attendance_data, 't_shirt_worn', False) if hasattr(attendance_data, 't_shirt_worn') else False,
-                remarks=attendance_data.remarks,
-                marked_by_user_id=admin.id
-            )
-            db.add(record)
-        
-        results.append(record)
+            new_records.append({
+                "session_id": bulk_data.session_id,
+                "student_profile_id": student_profile_id,
+                "status": attendance_data.status,
+                "t_shirt_worn": bool(attendance_data.t_shirt_worn),
+                "remarks": attendance_data.remarks,
+                "marked_by_user_id": admin.id
+            })
+    if new_records:
+        db.execute(insert(AttendanceRecord), new_records)
     
     # Mark session as completed
     session = db.query(ClassSession).filter(ClassSession.id == bulk_data.session_id).first()
     if session:
         session.is_completed = True
+        refresh_attendance_months(db, list(marks), [month_start(session.session_date)])
+        refresh_daily_summary(db, [summary_key(session)])
     
     db.commit()
     
-    # Add student info to responses
-    response_list = []
-    for record in results:
-        profile = db.query(StudentProfile).filter(StudentProfile.id == record.student_profile_id).first()
+    # Add student info to responses (records and profiles in one query)
+    rows = db.query(AttendanceRecord, StudentProfile).join(
+        StudentProfile, StudentProfile.id == AttendanceRecord.student_profile_id
+    ).filter(
+        AttendanceRecord.session_id == bulk_data.session_id,
+        AttendanceRecord.student_profile_id.in_(list(marks))
+    ).all()
+    responses = {}
+    for record, profile in rows:
         response = AttendanceRecordResponse.model_validate(record)
-        if profile:
-            response.student_name = profile.full_name or profile.display_name
-            response.student_public_id = profile.public_id
-        response_list.append(response)
+        response.student_name = profile.full_name or profile.display_name
+        response.student_public_id = profile.public_id
+        responses[record.student_profile_id] = response
     
-    return response_list
+    return [responses[student_profile_id] for student_profile_id in marks if student_profile_id in responses]
 
 
 @router.delete("/records")
@@ -463,7 +492,11 @@ async def delete_attendance_record_by_session_student(
         raise HTTPException(status_code=404, detail="Attendance record not found")
     
     try:
+        session = db.query(ClassSession).filter(ClassSession.id == session_id).first()
         db.delete(record)
+        if session:
+            refresh_attendance_months(db, [student_profile_id], [month_start(session.session_date)])
+            refresh_daily_summary(db, [summary_key(session)])
         db.commit()
         return {"message": "Attendance record deleted successfully"}
     except Exception as e:
@@ -471,50 +504,72 @@ async def delete_attendance_record_by_session_student(
         raise HTTPException(status_code=500, detail=f"Failed to delete attendance record: {str(e)}")
 
 
-@router.get("/records", response_model=List[AttendanceRecordResponse])
+@router.get("/records", response_model=List[Union[AttendanceRecordResponse, Dict[str, Any]]])
 async def get_attendance_records(
+    response: Response,
     student_profile_id: Optional[int] = Query(None),
     session_id: Optional[int] = Query(None),
     start_date: Optional[datetime] = Query(None),
     end_date: Optional[datetime] = Query(None),
+    fields: Optional[str] = Query(None, description="Comma-separated subset of the record fields, e.g. id,status,student_name,session"),
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = Query(None),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get attendance records with optional filters."""
-    query = db.query(AttendanceRecord)
+    """
+    Get attendance records with optional filters, newest first.
+    Records, students and sessions are read in one joined query; the date
+    range applies to the session date. Returns `limit` records per page (older
+    pages via the X-Next-Cursor header); pass fields to return only some of the
+    fields.
+    """
+    from pagination import keyset_page, set_next_cursor
+    
+    names = None
+    if fields:
+        names = {name.strip() for name in fields.split(",") if name.strip()}
+        unknown = sorted(names - set(AttendanceRecordResponse.model_fields))
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(AttendanceRecordResponse.model_fields)}"
+            )
+    
+    query = db.query(AttendanceRecord).join(
+        AttendanceRecord.session
+    ).outerjoin(
+        AttendanceRecord.student_profile
+    ).options(
+        contains_eager(AttendanceRecord.session),
+        contains_eager(AttendanceRecord.student_profile)
+    )
     
     # Students can only see their own records
     if current_user.role != "admin":
-        profile = db.query(StudentProfile).filter(StudentProfile.user_id == current_user.id).first()
-        if profile:
-            query = query.filter(AttendanceRecord.student_profile_id == profile.id)
-        else:
-            return []
+        query = query.filter(StudentProfile.user_id == current_user.id)
     
     if student_profile_id:
         query = query.filter(AttendanceRecord.student_profile_id == student_profile_id)
     if session_id:
         query = query.filter(AttendanceRecord.session_id == session_id)
-    if start_date or end_date:
-        query = query.join(ClassSession).filter(ClassSession.session_date >= start_date if start_date else True)
-        if end_date:
-            query = query.filter(ClassSession.session_date <= end_date)
+    if start_date:
+        query = query.filter(ClassSession.session_date >= start_date)
+    if end_date:
+        query = query.filter(ClassSession.session_date <= end_date)
     
-    records = query.order_by(desc(AttendanceRecord.created_at)).all()
+    records, next_cursor = keyset_page(query, AttendanceRecord.created_at, AttendanceRecord.id, cursor, limit)
+    set_next_cursor(response, next_cursor)
     
-    # Add student and session info
+    # Add student info (the session is validated from the eager-loaded relationship)
     results = []
     for record in records:
-        profile = db.query(StudentProfile).filter(StudentProfile.id == record.student_profile_id).first()
-        session = db.query(ClassSession).filter(ClassSession.id == record.session_id).first()
-        
-        response = AttendanceRecordResponse.model_validate(record)
+        record_response = AttendanceRecordResponse.model_validate(record)
+        profile = record.student_profile
         if profile:
-            response.student_name = profile.full_name or profile.display_name
-            response.student_public_id = profile.public_id
-        if session:
-            response.session = ClassSessionResponse.model_validate(session)
-        results.append(response)
+            record_response.student_name = profile.full_name or profile.display_name
+            record_response.student_public_id = profile.public_id
+        results.append(record_response if names is None else record_response.model_dump(mode="json", include=names))
     
     return results
 
@@ -534,39 +589,29 @@ async def get_attendance_stats(
         if not profile or profile.id != student_profile_id:
             raise HTTPException(status_code=403, detail="You can only view your own stats")
     
-    # Build query
-    query = db.query(AttendanceRecord).filter(
-        AttendanceRecord.student_profile_id == student_profile_id
-    )
-    
-    if start_date or end_date:
-        query = query.join(ClassSession)
-        if start_date:
-            query = query.filter(ClassSession.session_date >= start_date)
-        if end_date:
-            query = query.filter(ClassSession.session_date <= end_date)
-    
-    records = query.all()
+    # Status counts per month in one grouped query (or from the monthly rollup without a range)
+    from attendance_rollup import STATUSES, monthly_status_counts
+    months = monthly_status_counts(db, student_profile_id, start_date, end_date)
     
     # Calculate stats
-    total_sessions = len(records)
-    present_count = sum(1 for r in records if r.status == "present")
-    absent_count = sum(1 for r in records if r.status == "absent")
-    on_break_count = sum(1 for r in records if r.status == "on_break")
-    leave_count = sum(1 for r in records if r.status == "leave")
+    totals = {status: sum(counts.get(status, 0) for counts in months.values()) for status in STATUSES}
+    total_sessions = sum(sum(counts.values()) for counts in months.values())
+    present_count = totals["present"]
+    absent_count = totals["absent"]
+    on_break_count = totals["on_break"]
+    leave_count = totals["leave"]
     
     attendance_percentage = (present_count / total_sessions * 100) if total_sessions > 0 else 0
     
     # Monthly breakdown
     monthly_stats = {}
     if start_date and end_date:
-        current = start_date.replace(day=1)
-        while current <= end_date:
-            month_key = current.strftime("%Y-%m")
-            month_records = [r for r in records if r.session and r.session.session_date.strftime("%Y-%m") == month_key]
-            month_total = len(month_records)
-            month_present = sum(1 for r in month_records if r.status == "present")
-            monthly_stats[month_key] = {
+        current = start_date.date().replace(day=1)
+        while current <= end_date.date():
+            counts = months.get(current, {})
+            month_total = sum(counts.values())
+            month_present = counts.get("present", 0)
+            monthly_stats[current.strftime("%Y-%m")] = {
                 "total": month_total,
                 "present": month_present,
                 "percentage": (month_present / month_total * 100) if month_total > 0 else 0
@@ -596,7 +641,11 @@ async def get_attendance_metrics(
     admin: User = Depends(get_current_admin),
     db: Session = Depends(get_db)
 ):
-    """Get attendance metrics for a specific date and overall monthly stats."""
+    """
+    Get attendance metrics for a specific date and overall monthly stats.
+    Both are read from attendance_daily_summary with half-open date ranges.
+    """
+    from attendance_rollup import daily_summary_counts, month_window
     ist_now = get_ist_now()
     
     # Default to today if no date provided
@@ -610,77 +659,21 @@ async def get_attendance_metrics(
             target_date = date
         target_date = target_date.replace(hour=0, minute=0, second=0, microsecond=0)
     
-    # Calculate date range for the day
-    start_of_day = target_date
-    end_of_day = target_date.replace(hour=23, minute=59, second=59, microsecond=999999)
-    
-    # Get sessions for the selected date
-    session_query = db.query(ClassSession).filter(
-        func.date(ClassSession.session_date) == func.date(start_of_day)
-    )
-    
-    if branch:
-        session_query = session_query.filter(ClassSession.branch == branch)
-    if course:
-        session_query = session_query.filter(ClassSession.course == course)
-    
-    sessions = session_query.all()
-    session_ids = [s.id for s in sessions]
-    
-    # Get attendance records for these sessions
-    if session_ids:
-        records_query = db.query(AttendanceRecord).filter(
-            AttendanceRecord.session_id.in_(session_ids)
-        )
-        records = records_query.all()
-        
-        present_count = sum(1 for r in records if r.status == "present")
-        absent_count = sum(1 for r in records if r.status == "absent")
-        on_break_count = sum(1 for r in records if r.status == "on_break")
-        total_marked = len(records)
-        attendance_percentage = (present_count / total_marked * 100) if total_marked > 0 else 0
-    else:
-        present_count = 0
-        absent_count = 0
-        on_break_count = 0
-        total_marked = 0
-        attendance_percentage = 0
-    
-    # Get overall monthly stats (current month)
-    current_month_start = ist_now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    if ist_now.month == 12:
-        current_month_end = ist_now.replace(year=ist_now.year + 1, month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
-    else:
-        current_month_end = ist_now.replace(month=ist_now.month + 1, day=1, hour=0, minute=0, second=0, microsecond=0)
-    
-    # Get all sessions for current month
-    monthly_session_query = db.query(ClassSession).filter(
-        ClassSession.session_date >= current_month_start,
-        ClassSession.session_date < current_month_end
-    )
-    
-    if branch:
-        monthly_session_query = monthly_session_query.filter(ClassSession.branch == branch)
-    if course:
-        monthly_session_query = monthly_session_query.filter(ClassSession.course == course)
-    
-    monthly_sessions = monthly_session_query.all()
-    monthly_session_ids = [s.id for s in monthly_sessions]
-    
-    # Get monthly attendance records
-    if monthly_session_ids:
-        monthly_records_query = db.query(AttendanceRecord).filter(
-            AttendanceRecord.session_id.in_(monthly_session_ids)
-        )
-        monthly_records = monthly_records_query.all()
-        
-        monthly_present = sum(1 for r in monthly_records if r.status == "present")
-        monthly_total = len(monthly_records)
-        monthly_percentage = (monthly_present / monthly_total * 100) if monthly_total > 0 else 0
-    else:
-        monthly_present = 0
-        monthly_total = 0
-        monthly_percentage = 0
+    # Counts for the selected day: [day, next day)
+    day = target_date.date()
+    day_counts = daily_summary_counts(db, day, day + timedelta(days=1), branch, course)
+    present_count = day_counts["present"]
+    absent_count = day_counts["absent"]
+    on_break_count = day_counts["on_break"]
+    total_marked = sum(day_counts.values())
+    attendance_percentage = (present_count / total_marked * 100) if total_marked > 0 else 0
+    
+    # Overall monthly stats (current month): [first day, first day of next month)
+    current_month_start, current_month_end = month_window(ist_now.date())
+    monthly_counts = daily_summary_counts(db, current_month_start.date(), current_month_end.date(), branch, course)
+    monthly_present = monthly_counts["present"]
+    monthly_total = sum(monthly_counts.values())
+    monthly_percentage = (monthly_present / monthly_total * 100) if monthly_total > 0 else 0
     
     return {
         "date": target_date.isoformat(),
@@ -781,34 +774,70 @@ async def delete_certificate(
 
 
 # Helper endpoint to get students for a branch (for admin dashboard)
+# Columns selectable through /attendance/students?fields=
+STUDENT_LIST_FIELDS = {
+    "id": StudentProfile.id,
+    "user_id": StudentProfile.user_id,
+    "public_id": StudentProfile.public_id,
+    "name": func.coalesce(
+        func.nullif(StudentProfile.full_name, ""),
+        func.nullif(StudentProfile.display_name, ""),
+        func.nullif(User.name, ""),
+        "Unknown"
+    ),
+    "display_name": StudentProfile.display_name,
+    "class_name": StudentProfile.class_name,
+    "course": StudentProfile.course,
+    "level": StudentProfile.level,
+    "branch": StudentProfile.branch,
+}
+
+
 @router.get("/students")
 async def get_students_for_attendance(
+    response: Response,
     branch: Optional[str] = Query(None),
     course: Optional[str] = Query(None),
+    search: Optional[str] = Query(None, max_length=100),
+    fields: Optional[str] = Query(None, description="Comma-separated subset of the student fields, e.g. id,public_id,name"),
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    offset: int = Query(0, ge=0),
     admin: User = Depends(get_current_admin),
     db: Session = Depends(get_db)
 ):
-    """Get list of students for attendance marking (admin only)."""
-    query = db.query(StudentProfile, User).join(User).filter(User.role == "student")
+    """
+    Get list of students for attendance marking (admin only).
+    Only the requested fields are selected; pass limit/offset to page
+    (the X-Total-Count header carries the number of matches).
+    """
+    from student_directory import search_filter
+    
+    if fields:
+        names = [name.strip() for name in fields.split(",") if name.strip()]
+        unknown = [name for name in names if name not in STUDENT_LIST_FIELDS]
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(STUDENT_LIST_FIELDS)}"
+            )
+    else:
+        names = list(STUDENT_LIST_FIELDS)
+    
+    query = db.query(*[STUDENT_LIST_FIELDS[name].label(name) for name in names]).select_from(StudentProfile).join(
+        User, User.id == StudentProfile.user_id
+    ).filter(User.role == "student", StudentProfile.status == "active")
 
     if branch:
         query = query.filter(StudentProfile.branch == branch)
     if course:
         query = query.filter(StudentProfile.course == course)
+    condition = search_filter(search)
+    if condition is not None:
+        query = query.filter(condition)
 
-    results = query.filter(StudentProfile.status == "active").all()
-
-    return [
-        {
-            "id": profile.id,
-            "user_id": profile.user_id,
-            "public_id": profile.public_id,
-            "name": profile.full_name or profile.display_name or user.name or "Unknown",
-            "display_name": profile.display_name,
-            "class_name": profile.class_name,
-            "course": profile.course,
-            "level": profile.level,
-            "branch": profile.branch
-        }
-        for profile, user in results
-    ]
+    query = query.order_by(StudentProfile.id)
+    if limit is not None:
+        response.headers["X-Total-Count"] = str(query.order_by(None).count())
+        query = query.offset(offset).limit(limit)
+
+    return [dict(row._mapping) for row in query.all()]
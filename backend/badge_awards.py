@@ -0,0 +1,85 @@
+"""
+Badge ownership lookup and bulk award shared by the reward engines.
+
+Engines load a user's owned (badge_type, month_earned) pairs once, work out
+every newly crossed threshold in memory and hand the candidates to
+award_badges, which inserts the missing ones in a single statement. The
+unique index on (user_id, badge_type, coalesce(month_earned, '')) makes the
+insert skip rows another evaluator awarded concurrently, so a badge can never
+be granted twice.
+"""
+from typing import Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from models import Reward
+from timezone_utils import get_ist_now
+
+OwnedBadges = Set[Tuple[str, Optional[str]]]
+
+
+def load_owned_badges(db: Session, user_id: int) -> OwnedBadges:
+    """Every (badge_type, month_earned) the user holds, in one query."""
+    return set(db.query(Reward.badge_type, Reward.month_earned).filter(Reward.user_id == user_id).all())
+
+
+def badge(badge_type: str, badge_name: str, badge_category: str = "general",
+          is_lifetime: bool = False, month_earned: Optional[str] = None) -> dict:
+    """A candidate Reward row for award_badges."""
+    return {
+        "badge_type": badge_type,
+        "badge_name": badge_name,
+        "badge_category": badge_category,
+        "is_lifetime": is_lifetime,
+        "month_earned": month_earned,
+    }
+
+
+def award_badges(db: Session, user_id: int, candidates: Iterable[dict], owned: Optional[OwnedBadges] = None) -> List[str]:
+    """
+    Insert the candidates the user doesn't own yet (one INSERT) and return
+    their badge names. `owned` is updated in place so later engines sharing
+    it see the new badges. Runs in the caller's transaction.
+    """
+    if owned is None:
+        owned = load_owned_badges(db, user_id)
+    new_rows = []
+    for candidate in candidates:
+        key = (candidate["badge_type"], candidate.get("month_earned"))
+        if key in owned:
+            continue
+        owned.add(key)
+        new_rows.append({**candidate, "user_id": user_id, "earned_at": get_ist_now()})
+    return [row["badge_name"] for row in insert_rewards(db, new_rows)]
+
+
+def insert_rewards(db: Session, rows: List[dict]) -> List[dict]:
+    """
+    Insert complete Reward rows (any users) in one statement and return the
+    rows actually inserted - rows the unique index rejects as already awarded
+    are skipped. Runs in the caller's transaction.
+    """
+    if not rows:
+        return []
+
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        # Rows a concurrent evaluator already inserted hit the unique index and are skipped
+        result = db.execute(
+            insert(Reward).values(rows).on_conflict_do_nothing().returning(
+                Reward.user_id, Reward.badge_type, Reward.month_earned
+            )
+        )
+        inserted = {(row.user_id, row.badge_type, row.month_earned) for row in result}
+        rows = [row for row in rows if (row["user_id"], row["badge_type"], row.get("month_earned")) in inserted]
+    else:
+        db.add_all([Reward(**row) for row in rows])
+
+    from stats_cache import invalidate_on_commit, reward_summary_cache
+    for user_id in {row["user_id"] for row in rows}:
+        invalidate_on_commit(db, reward_summary_cache, user_id)
+    return rows
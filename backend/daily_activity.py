@@ -0,0 +1,156 @@
+"""
+Per-user daily activity rollup (`user_daily_activity`).
+
+Every mental-math session and paper submission upserts one row keyed by
+(user_id, IST date) in the same transaction as the submission. Streak checks,
+"active today" counts and the full-month streak check read a single row (or a
+single indexed range) instead of re-scanning PracticeSession/PaperAttempt.
+"""
+from calendar import monthrange
+from datetime import date, datetime
+from typing import Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from models import UserDailyActivity, PracticeSession, PaperAttempt
+from timezone_utils import get_ist_now
+from upsert_utils import increment_upsert
+
+# Questions per day needed to keep a streak alive
+DAILY_QUESTION_REQUIREMENT = 15
+
+_COUNTERS = ("questions_attempted", "mental_math_questions", "paper_questions", "sessions", "papers", "points")
+
+
+def record_activity(
+    db: Session,
+    user_id: int,
+    mental_math_questions: int = 0,
+    paper_questions: int = 0,
+    sessions: int = 0,
+    papers: int = 0,
+    points: int = 0,
+    activity_date: Optional[date] = None
+) -> None:
+    """
+    Add a submission to the user's rollup row for the day (IST today by default).
+    Runs inside the caller's transaction - don't commit here.
+    """
+    ist_now = get_ist_now()
+    increment_upsert(
+        db,
+        UserDailyActivity,
+        key={"user_id": user_id, "ist_date": activity_date or ist_now.date()},
+        counters={
+            "questions_attempted": mental_math_questions + paper_questions,
+            "mental_math_questions": mental_math_questions,
+            "paper_questions": paper_questions,
+            "sessions": sessions,
+            "papers": papers,
+            "points": points,
+        },
+        extra={"updated_at": ist_now.replace(tzinfo=None)}
+    )
+
+
+def get_daily_activity(db: Session, user_id: int, activity_date: date) -> Optional[UserDailyActivity]:
+    """The rollup row for one user and day, or None if they were inactive."""
+    return db.query(UserDailyActivity).filter(
+        UserDailyActivity.user_id == user_id,
+        UserDailyActivity.ist_date == activity_date
+    ).first()
+
+
+def get_streak_questions(db: Session, user_id: int, activity_date: date, source: str = "mental_math") -> int:
+    """Questions counted towards the streak on a day: mental math (Abacus) or papers (Vedic Maths)."""
+    activity = get_daily_activity(db, user_id, activity_date)
+    if activity is None:
+        return 0
+    if source == "paper":
+        return activity.paper_questions or 0
+    return activity.mental_math_questions or 0
+
+
+def count_active_days(db: Session, user_id: int, year: int, month: int) -> int:
+    """Days in the month on which the user completed at least one mental-math session."""
+    month_start = date(year, month, 1)
+    month_end = date(year, month, monthrange(year, month)[1])
+    return db.query(func.count(UserDailyActivity.ist_date)).filter(
+        UserDailyActivity.user_id == user_id,
+        UserDailyActivity.ist_date >= month_start,
+        UserDailyActivity.ist_date <= month_end,
+        UserDailyActivity.sessions > 0
+    ).scalar() or 0
+
+
+def rebuild_daily_activity(db: Session, user_id: Optional[int] = None) -> int:
+    """
+    Recompute the rollup from PracticeSession and PaperAttempt history.
+    Used to backfill rows for submissions made before the table existed and to
+    repair drift. Commits. Returns the number of rows written.
+    """
+    totals = {}
+
+    def bucket(uid: int, completed_at: datetime) -> dict:
+        key = (uid, completed_at.date())
+        if key not in totals:
+            totals[key] = {name: 0 for name in _COUNTERS}
+        return totals[key]
+
+    sessions_query = db.query(
+        PracticeSession.user_id, PracticeSession.completed_at,
+        PracticeSession.correct_answers, PracticeSession.wrong_answers, PracticeSession.points_earned
+    ).filter(PracticeSession.completed_at.isnot(None))
+    papers_query = db.query(
+        PaperAttempt.user_id, PaperAttempt.completed_at,
+        PaperAttempt.correct_answers, PaperAttempt.wrong_answers, PaperAttempt.points_earned
+    ).filter(PaperAttempt.completed_at.isnot(None))
+    if user_id is not None:
+        sessions_query = sessions_query.filter(PracticeSession.user_id == user_id)
+        papers_query = papers_query.filter(PaperAttempt.user_id == user_id)
+
+    for uid, completed_at, correct, wrong, points in sessions_query:
+        row = bucket(uid, completed_at)
+        attempted = (correct or 0) + (wrong or 0)
+        row["mental_math_questions"] += attempted
+        row["questions_attempted"] += attempted
+        row["sessions"] += 1
+        row["points"] += points or 0
+
+    for uid, completed_at, correct, wrong, points in papers_query:
+        row = bucket(uid, completed_at)
+        attempted = (correct or 0) + (wrong or 0)
+        row["paper_questions"] += attempted
+        row["questions_attempted"] += attempted
+        row["papers"] += 1
+        row["points"] += points or 0
+
+    try:
+        delete_query = db.query(UserDailyActivity)
+        if user_id is not None:
+            delete_query = delete_query.filter(UserDailyActivity.user_id == user_id)
+        delete_query.delete(synchronize_session=False)
+
+        updated_at = get_ist_now().replace(tzinfo=None)
+        db.add_all([
+            UserDailyActivity(user_id=uid, ist_date=day, updated_at=updated_at, **counters)
+            for (uid, day), counters in totals.items()
+        ])
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"❌ [DAILY_ACTIVITY] Error rebuilding rollup: {e}")
+        raise
+
+    print(f"✅ [DAILY_ACTIVITY] Rebuilt {len(totals)} daily activity rows")
+    return len(totals)
+
+
+def backfill_if_empty(db: Session) -> int:
+    """Build the rollup from history the first time the app starts with an empty table."""
+    if db.query(UserDailyActivity.user_id).first() is not None:
+        return 0
+    if db.query(PracticeSession.id).first() is None and db.query(PaperAttempt.id).first() is None:
+        return 0
+    return rebuild_daily_activity(db)
@@ -1,5 +1,5 @@
 """API routes for fee management system."""
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from sqlalchemy.orm import Session
 from sqlalchemy import func, desc, and_, or_
 from typing import List, Optional
@@ -390,15 +390,22 @@ async def create_fee_transaction(
 
 @router.get("/transactions", response_model=List[FeeTransactionResponse])
 async def get_fee_transactions(
+    response: Response,
     assignment_id: Optional[int] = Query(None),
     student_profile_id: Optional[int] = Query(None),
     start_date: Optional[datetime] = Query(None),
     end_date: Optional[datetime] = Query(None),
     payment_mode: Optional[str] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[str] = Query(None),
     admin: User = Depends(get_current_admin),
     db: Session = Depends(get_db)
 ):
-    """Get fee transactions with optional filters."""
+    """
+    Get fee transactions with optional filters, newest payment first.
+    Pass limit to page; older pages via the X-Next-Cursor header.
+    """
+    from pagination import keyset_page, set_next_cursor
     query = db.query(FeeTransaction)
     
     if assignment_id:
@@ -415,7 +422,8 @@ async def get_fee_transactions(
     if payment_mode:
         query = query.filter(FeeTransaction.payment_mode == payment_mode)
     
-    transactions = query.order_by(desc(FeeTransaction.payment_date)).all()
+    transactions, next_cursor = keyset_page(query, FeeTransaction.payment_date, FeeTransaction.id, cursor, limit)
+    set_next_cursor(response, next_cursor)
     return [FeeTransactionResponse.model_validate(t) for t in transactions]
 
 
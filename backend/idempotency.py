@@ -0,0 +1,131 @@
+"""
+Idempotency-Key support for submission endpoints.
+
+Clients send an ``Idempotency-Key`` header with practice-session and paper
+submissions. The first successful request stores its response in the
+``idempotency_keys`` table in the same transaction as the write, so a retry
+with the same key becomes a single indexed lookup instead of a duplicate
+session, duplicate points and another background reprocessing run.
+"""
+import hashlib
+import json
+from datetime import timedelta
+from typing import Any, Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session
+
+from models import IdempotencyKey
+from timezone_utils import get_ist_now
+
+# How long a key (and its cached response) is honoured
+IDEMPOTENCY_KEY_TTL_SECONDS = 24 * 3600  # 24 hours
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+
+
+def _hash_json(payload: Any) -> str:
+    """Stable SHA-256 of a JSON-serialisable payload."""
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def hash_request(endpoint: str, payload: Any) -> str:
+    """Fingerprint a request so a reused key with a different body can be rejected."""
+    return _hash_json({"endpoint": endpoint, "payload": payload})
+
+
+def validate_idempotency_key(key: Optional[str]) -> Optional[str]:
+    """Normalise the header value. Returns None when no key was sent."""
+    if key is None:
+        return None
+    key = key.strip()
+    if not key:
+        return None
+    if len(key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Idempotency-Key must be at most {MAX_IDEMPOTENCY_KEY_LENGTH} characters"
+        )
+    return key
+
+
+def get_cached_response(
+    db: Session,
+    user_id: int,
+    key: str,
+    endpoint: str,
+    request_hash: str
+) -> Optional[dict]:
+    """
+    Look up a previously stored response for (user, key).
+
+    Returns:
+        The cached response body, or None if the key is unknown or expired.
+
+    Raises:
+        HTTPException(422) if the key was already used for a different request.
+    """
+    entry = db.query(IdempotencyKey).filter(
+        IdempotencyKey.user_id == user_id,
+        IdempotencyKey.key == key
+    ).first()
+
+    if not entry:
+        return None
+
+    if entry.expires_at <= get_ist_now().replace(tzinfo=None):
+        # Expired - forget it so the key can be reused
+        db.delete(entry)
+        db.commit()
+        return None
+
+    if entry.endpoint != endpoint or entry.request_hash != request_hash:
+        raise HTTPException(
+            status_code=422,
+            detail="Idempotency-Key was already used for a different request"
+        )
+
+    print(f"♻️ [IDEMPOTENCY] Replaying cached response for user {user_id}, {endpoint}")
+    return entry.response_body
+
+
+def store_response(
+    db: Session,
+    user_id: int,
+    key: str,
+    endpoint: str,
+    request_hash: str,
+    response_body: dict
+) -> IdempotencyKey:
+    """
+    Record the response for (user, key). Call before the caller's commit so the
+    key and the write it protects land in the same transaction; the unique index
+    on (user_id, key) makes a concurrent duplicate fail at commit time.
+    """
+    ist_now = get_ist_now().replace(tzinfo=None)
+    entry = IdempotencyKey(
+        user_id=user_id,
+        key=key,
+        endpoint=endpoint,
+        request_hash=request_hash,
+        response_hash=_hash_json(response_body),
+        response_body=response_body,
+        created_at=ist_now,
+        expires_at=ist_now + timedelta(seconds=IDEMPOTENCY_KEY_TTL_SECONDS)
+    )
+    db.add(entry)
+    return entry
+
+
+def purge_expired_keys(db: Session) -> int:
+    """Delete expired idempotency keys. Returns the number of rows removed."""
+    try:
+        deleted = db.query(IdempotencyKey).filter(
+            IdempotencyKey.expires_at <= get_ist_now().replace(tzinfo=None)
+        ).delete(synchronize_session=False)
+        db.commit()
+        return deleted
+    except Exception as e:
+        print(f"❌ [IDEMPOTENCY] Error purging expired keys: {e}")
+        db.rollback()
+        return 0
@@ -0,0 +1,92 @@
+"""
+In-memory top-K leaderboard read model.
+
+Every student dashboard polls the leaderboard endpoints. The top
+LEADERBOARD_TOP_K entries of each board are built from one joined query,
+serialized to JSON once and served as-is with an ETag, so repeat polls cost
+no database work and unchanged boards answer 304. Leaderboard writers call
+invalidate() after committing; a short TTL covers changes made by other
+worker processes and profile updates (name/avatar) that don't invalidate.
+"""
+import hashlib
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from pydantic import TypeAdapter
+from sqlalchemy.orm import Session
+
+from user_schemas import LeaderboardEntry, MonthlyLeaderboardEntry
+
+LEADERBOARD_TOP_K = int(os.getenv("LEADERBOARD_TOP_K", "100"))
+LEADERBOARD_CACHE_TTL_SECONDS = float(os.getenv("LEADERBOARD_CACHE_TTL_SECONDS", "60"))
+
+_ENTRY_SCHEMAS = {
+    "overall": LeaderboardEntry,
+    "weekly": LeaderboardEntry,
+    "monthly": MonthlyLeaderboardEntry,
+}
+_adapters = {board: TypeAdapter(List[schema]) for board, schema in _ENTRY_SCHEMAS.items()}
+
+
+class LeaderboardSnapshot:
+    """One board's top-K entries with the pre-serialized body and its ETag."""
+
+    def __init__(self, board: str, entries: List[dict], version: int):
+        self.entries = entries
+        schema = _ENTRY_SCHEMAS[board]
+        self.body = _adapters[board].dump_json([schema(**entry) for entry in entries])
+        self.etag = '"' + hashlib.sha1(self.body).hexdigest() + '"'
+        self.version = version
+        self.built_at = time.monotonic()
+
+
+class LeaderboardReadModel:
+    """Caches a snapshot per board ("overall", "weekly", "monthly") until invalidated or expired."""
+
+    def __init__(self, top_k: int = LEADERBOARD_TOP_K, ttl_seconds: float = LEADERBOARD_CACHE_TTL_SECONDS):
+        self.top_k = top_k
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._snapshots: Dict[str, LeaderboardSnapshot] = {}
+        self._version = 0
+        self.hits = 0
+        self.misses = 0
+
+    def invalidate(self) -> None:
+        """Drop all snapshots; the next read rebuilds from the database."""
+        with self._lock:
+            self._version += 1
+            self._snapshots.clear()
+
+    def get(self, db: Session, board: str) -> LeaderboardSnapshot:
+        with self._lock:
+            snapshot = self._snapshots.get(board)
+            if snapshot and time.monotonic() - snapshot.built_at < self.ttl_seconds:
+                self.hits += 1
+                return snapshot
+            self.misses += 1
+            version = self._version
+
+        from leaderboard_service import get_overall_leaderboard, get_weekly_leaderboard, get_monthly_leaderboard
+        loader = {
+            "overall": get_overall_leaderboard,
+            "weekly": get_weekly_leaderboard,
+            "monthly": get_monthly_leaderboard,
+        }[board]
+        snapshot = LeaderboardSnapshot(board, loader(db, limit=self.top_k), version)
+
+        with self._lock:
+            # Don't cache a snapshot built from data that was invalidated meanwhile
+            if version == self._version:
+                self._snapshots[board] = snapshot
+        return snapshot
+
+    def top(self, db: Session, board: str, limit: Optional[int] = None) -> List[dict]:
+        """The cached entries as dicts, optionally truncated."""
+        entries = self.get(db, board).entries
+        return entries[:limit] if limit is not None else entries
+
+
+leaderboard_read_model = LeaderboardReadModel()
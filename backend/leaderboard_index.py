@@ -0,0 +1,171 @@
+"""
+In-process sorted rank index for the leaderboards.
+
+Each board keeps a sorted array of (-points, user_id) keys, the same order as
+the stored ranks (points descending, ties by user id). A user's rank is a
+bisect, and the entries around them are a slice, so "what is my rank" and
+"who is around me" never scan the students table. The index is built from
+one joined query on first use and then updated in place as leaderboard rows
+change; full resyncs reset it and a TTL rebuild covers changes made by other
+worker processes.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from models import Leaderboard, User
+
+LEADERBOARD_INDEX_TTL_SECONDS = float(os.getenv("LEADERBOARD_INDEX_TTL_SECONDS", "300"))
+
+BOARDS = ("overall", "weekly")
+
+
+class SortedRankIndex:
+    """Sorted (-points, user_id) keys with O(log N) rank lookup."""
+
+    def __init__(self):
+        self._keys: List[Tuple[int, int]] = []
+        self._points: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._points
+
+    def set(self, user_id: int, points: int) -> None:
+        points = points or 0
+        old = self._points.get(user_id)
+        if old == points:
+            return
+        if old is not None:
+            del self._keys[bisect_left(self._keys, (-old, user_id))]
+        self._points[user_id] = points
+        insort(self._keys, (-points, user_id))
+
+    def remove(self, user_id: int) -> None:
+        old = self._points.pop(user_id, None)
+        if old is not None:
+            del self._keys[bisect_left(self._keys, (-old, user_id))]
+
+    def points(self, user_id: int) -> Optional[int]:
+        return self._points.get(user_id)
+
+    def rank(self, user_id: int) -> Optional[int]:
+        """1-based rank, or None if the user isn't on the board."""
+        points = self._points.get(user_id)
+        if points is None:
+            return None
+        return bisect_left(self._keys, (-points, user_id)) + 1
+
+    def slice(self, start: int, stop: int) -> List[Tuple[int, int, int]]:
+        """(rank, user_id, points) for 0-based positions [start, stop)."""
+        start = max(0, start)
+        return [
+            (position + 1, user_id, -negative_points)
+            for position, (negative_points, user_id) in enumerate(self._keys[start:stop], start=start)
+        ]
+
+
+class LeaderboardIndex:
+    """Overall and weekly rank indexes plus the display info needed to render entries."""
+
+    def __init__(self, ttl_seconds: float = LEADERBOARD_INDEX_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._boards: Dict[str, SortedRankIndex] = {}
+        self._profiles: Dict[int, Tuple[str, Optional[str]]] = {}
+        self._built_at: Optional[float] = None
+
+    def reset(self) -> None:
+        """Forget everything; the next lookup rebuilds from the database."""
+        with self._lock:
+            self._built_at = None
+
+    def _ensure_built(self, db: Session) -> None:
+        with self._lock:
+            if self._built_at is not None and time.monotonic() - self._built_at < self.ttl_seconds:
+                return
+
+        rows = db.query(
+            Leaderboard.user_id, Leaderboard.total_points, Leaderboard.weekly_points,
+            User.name, User.display_name, User.avatar_url
+        ).join(User, User.id == Leaderboard.user_id).filter(User.role == "student").all()
+
+        boards = {board: SortedRankIndex() for board in BOARDS}
+        profiles = {}
+        for row in rows:
+            boards["overall"].set(row.user_id, row.total_points or 0)
+            boards["weekly"].set(row.user_id, row.weekly_points or 0)
+            profiles[row.user_id] = (row.display_name or row.name, row.avatar_url)
+
+        with self._lock:
+            self._boards = boards
+            self._profiles = profiles
+            self._built_at = time.monotonic()
+
+    def apply(self, changes: Dict[int, Tuple[int, int]]) -> None:
+        """Apply committed {user_id: (total_points, weekly_points)} updates in place."""
+        with self._lock:
+            if self._built_at is None:
+                return
+            for user_id, (total_points, weekly_points) in changes.items():
+                if user_id not in self._profiles:
+                    # New student - pick up their name on the next rebuild
+                    self._built_at = None
+                    return
+                self._boards["overall"].set(user_id, total_points)
+                self._boards["weekly"].set(user_id, weekly_points)
+
+    def remove(self, user_id: int) -> None:
+        """Drop a user (deleted or no longer a student)."""
+        with self._lock:
+            for index in self._boards.values():
+                index.remove(user_id)
+            self._profiles.pop(user_id, None)
+
+    def update_profile(self, user_id: int, name: str, avatar_url: Optional[str]) -> None:
+        with self._lock:
+            if user_id in self._profiles:
+                self._profiles[user_id] = (name, avatar_url)
+
+    def _entry(self, rank: int, user_id: int) -> dict:
+        name, avatar_url = self._profiles.get(user_id, ("", None))
+        return {
+            "rank": rank,
+            "user_id": user_id,
+            "name": name,
+            "avatar_url": avatar_url,
+            "total_points": self._boards["overall"].points(user_id) or 0,
+            "weekly_points": self._boards["weekly"].points(user_id) or 0,
+        }
+
+    def position(self, db: Session, board: str, user_id: int, k: int = 5) -> dict:
+        """The user's rank and points on a board with up to k entries above and below."""
+        self._ensure_built(db)
+        with self._lock:
+            index = self._boards[board]
+            rank = index.rank(user_id)
+            if rank is None:
+                return {"rank": None, "points": 0, "total_entries": len(index), "above": [], "below": []}
+            position = rank - 1
+            return {
+                "rank": rank,
+                "points": index.points(user_id),
+                "total_entries": len(index),
+                "above": [self._entry(r, uid) for r, uid, _ in index.slice(position - k, position)],
+                "below": [self._entry(r, uid) for r, uid, _ in index.slice(position + 1, position + 1 + k)],
+            }
+
+    def top(self, db: Session, board: str, count: int) -> List[int]:
+        """User ids of the top `count` entries on a board."""
+        self._ensure_built(db)
+        with self._lock:
+            return [user_id for _, user_id, _ in self._boards[board].slice(0, count)]
+
+
+leaderboard_index = LeaderboardIndex()
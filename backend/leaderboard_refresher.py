@@ -0,0 +1,141 @@
+"""
+Coalesced, debounced leaderboard refresh.
+
+Submissions, admin point edits and student deletions only mark the
+leaderboard dirty (optionally for a specific user). A single timer thread
+flushes at most once per LEADERBOARD_REFRESH_WINDOW_SECONDS: it syncs every
+dirty user's row and re-ranks once, so 40 submissions in the same minute cost
+a handful of refreshes instead of 80 full recomputes.
+"""
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Optional, Set
+
+from models import SessionLocal
+from timezone_utils import get_ist_now
+
+LEADERBOARD_REFRESH_WINDOW_SECONDS = float(os.getenv("LEADERBOARD_REFRESH_WINDOW_SECONDS", "5"))
+
+
+class LeaderboardRefresher:
+    """Collects dirty signals and flushes them on a debounce window."""
+
+    def __init__(self, window_seconds: float = LEADERBOARD_REFRESH_WINDOW_SECONDS):
+        self.window_seconds = window_seconds
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._dirty_users: Set[int] = set()
+        self._dirty = False
+        self._dirty_since: Optional[float] = None
+        self._timer: Optional[threading.Timer] = None
+        self._last_flush_monotonic: Optional[float] = None
+        self.last_refresh_at: Optional[datetime] = None
+        self.last_refresh_duration: Optional[float] = None
+        self.refresh_count = 0
+        self.signal_count = 0
+
+    def mark_dirty(self, user_id: Optional[int] = None) -> None:
+        """Signal that rankings changed; user_id limits the row sync to that user (None = re-rank only)."""
+        with self._lock:
+            if user_id is not None:
+                self._dirty_users.add(user_id)
+            if not self._dirty:
+                self._dirty = True
+                self._dirty_since = time.monotonic()
+            self.signal_count += 1
+            self._schedule_locked()
+
+    def _schedule_locked(self) -> None:
+        if self._timer is not None:
+            return
+        delay = 0.0
+        if self._last_flush_monotonic is not None:
+            delay = max(0.0, self.window_seconds - (time.monotonic() - self._last_flush_monotonic))
+        self._timer = threading.Timer(delay, self._run_scheduled)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _run_scheduled(self) -> None:
+        with self._lock:
+            self._timer = None
+        try:
+            self.flush()
+        except Exception:
+            pass  # Already logged; the failed work was re-queued
+
+    def flush(self, force: bool = False) -> bool:
+        """
+        Apply pending signals now. force=True runs a full resync of both
+        leaderboards even if nothing is pending. Returns True if a refresh ran.
+        """
+        from leaderboard_service import (
+            sync_user_rows, recompute_ranks, update_leaderboard, update_weekly_leaderboard,
+            publish_leaderboard_changes
+        )
+
+        with self._flush_lock:
+            with self._lock:
+                if not self._dirty and not force:
+                    return False
+                user_ids = self._dirty_users
+                self._dirty_users = set()
+                self._dirty = False
+                self._dirty_since = None
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+
+            start = time.monotonic()
+            db = SessionLocal()
+            try:
+                if force:
+                    update_leaderboard(db)
+                    update_weekly_leaderboard(db)
+                else:
+                    changes = sync_user_rows(db, user_ids)
+                    recompute_ranks(db)
+                    db.commit()
+                    publish_leaderboard_changes(changes)
+            except Exception as e:
+                db.rollback()
+                print(f"❌ [LEADERBOARD] Refresh failed, will retry: {e}")
+                # Put the work back so the next window picks it up
+                with self._lock:
+                    self._dirty_users |= user_ids
+                    if not self._dirty:
+                        self._dirty = True
+                        self._dirty_since = start
+                    self._last_flush_monotonic = time.monotonic()
+                    self._schedule_locked()
+                raise
+            finally:
+                db.close()
+
+            end = time.monotonic()
+            with self._lock:
+                self._last_flush_monotonic = end
+                self.last_refresh_at = get_ist_now()
+                self.last_refresh_duration = end - start
+                self.refresh_count += 1
+            print(f"✅ [LEADERBOARD] Refreshed ({len(user_ids)} users{', full' if force else ''}) in {end - start:.3f}s")
+            return True
+
+    def status(self) -> dict:
+        """Last refresh time, current lag and counters for monitoring."""
+        with self._lock:
+            lag = time.monotonic() - self._dirty_since if self._dirty_since is not None else 0.0
+            return {
+                "window_seconds": self.window_seconds,
+                "last_refresh_at": self.last_refresh_at,
+                "last_refresh_duration_seconds": self.last_refresh_duration,
+                "pending": self._dirty,
+                "pending_users": len(self._dirty_users),
+                "lag_seconds": round(lag, 3),
+                "refresh_count": self.refresh_count,
+                "signal_count": self.signal_count,
+            }
+
+
+leaderboard_refresher = LeaderboardRefresher()
@@ -1,135 +1,267 @@
 """Leaderboard calculation and management."""
 from sqlalchemy.orm import Session
-from sqlalchemy import desc, func
-from models import User, Leaderboard, PracticeSession
-from datetime import datetime, timedelta
+from sqlalchemy import desc, func, select, update, insert, literal, or_, DateTime
+from models import User, Leaderboard, PointsPeriodRollup
+from datetime import date
 from timezone_utils import get_ist_now
-from typing import List, Optional
+from leaderboard_cache import leaderboard_read_model
+from leaderboard_index import leaderboard_index
+from points_rollup import (
+    PERIOD_WEEK, PERIOD_MONTH, week_start, month_start,
+    get_period_points_for_users, period_points_subquery
+)
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+def _week_start() -> date:
+    """Monday of the current IST week."""
+    return week_start(get_ist_now().date())
+
+
+# Week whose weekly_points are currently stored; a new week forces one full weekly recompute
+_weekly_points_week_start: Optional[date] = None
+
+
+def _supports_update_from(db: Session) -> bool:
+    """UPDATE ... FROM with window functions: PostgreSQL, and SQLite 3.33+."""
+    dialect = db.get_bind().dialect
+    if dialect.name == "postgresql":
+        return True
+    if dialect.name == "sqlite":
+        import sqlite3
+        return sqlite3.sqlite_version_info >= (3, 33, 0)
+    return False
+
+
+def recompute_ranks(db: Session) -> None:
+    """
+    Recompute overall and weekly ranks for every student in one set-based UPDATE.
+    Ties are broken by user id so ranks are stable. Only rows whose rank
+    actually changed are written. Does not commit.
+    """
+    if _supports_update_from(db):
+        ranked = select(
+            Leaderboard.id.label("id"),
+            func.row_number().over(order_by=(desc(Leaderboard.total_points), Leaderboard.user_id)).label("overall_rank"),
+            func.row_number().over(order_by=(desc(Leaderboard.weekly_points), Leaderboard.user_id)).label("weekly_rank"),
+        ).join(User, User.id == Leaderboard.user_id).where(User.role == "student").subquery()
+
+        db.execute(
+            update(Leaderboard).where(
+                Leaderboard.id == ranked.c.id,
+                or_(
+                    Leaderboard.rank.is_distinct_from(ranked.c.overall_rank),
+                    Leaderboard.weekly_rank.is_distinct_from(ranked.c.weekly_rank),
+                )
+            ).values(rank=ranked.c.overall_rank, weekly_rank=ranked.c.weekly_rank),
+            execution_options={"synchronize_session": False}
+        )
+        return
+
+    # Fallback: one SELECT, rank in Python, bulk UPDATE of the changed rows only
+    rows = db.query(
+        Leaderboard.id, Leaderboard.user_id, Leaderboard.total_points,
+        Leaderboard.weekly_points, Leaderboard.rank, Leaderboard.weekly_rank
+    ).join(User, User.id == Leaderboard.user_id).filter(User.role == "student").all()
+
+    overall = {row.id: rank for rank, row in enumerate(sorted(rows, key=lambda r: (-(r.total_points or 0), r.user_id)), start=1)}
+    weekly = {row.id: rank for rank, row in enumerate(sorted(rows, key=lambda r: (-(r.weekly_points or 0), r.user_id)), start=1)}
+    changes = [
+        {"id": row.id, "rank": overall[row.id], "weekly_rank": weekly[row.id]}
+        for row in rows
+        if row.rank != overall[row.id] or row.weekly_rank != weekly[row.id]
+    ]
+    if changes:
+        db.execute(update(Leaderboard), changes)
+
+
+def _ensure_leaderboard_rows(db: Session) -> None:
+    """Create missing leaderboard rows for students in one INSERT ... SELECT."""
+    existing = select(Leaderboard.user_id)
+    missing = select(
+        User.id, User.total_points, literal(0), literal(get_ist_now().replace(tzinfo=None), DateTime)
+    ).where(User.role == "student", User.id.not_in(existing))
+    db.execute(
+        insert(Leaderboard).from_select(
+            ["user_id", "total_points", "weekly_points", "last_updated"], missing
+        )
+    )
+
+
+def _sync_weekly_points(db: Session) -> None:
+    """Copy this week's rollup points into every row in one correlated UPDATE."""
+    global _weekly_points_week_start
+    current_week = _week_start()
+    weekly_points = period_points_subquery(PERIOD_WEEK, current_week, Leaderboard.user_id)
+    db.execute(
+        update(Leaderboard).where(Leaderboard.weekly_points != weekly_points).values(weekly_points=weekly_points),
+        execution_options={"synchronize_session": False}
+    )
+    _weekly_points_week_start = current_week
+
+
+def publish_leaderboard_changes(changes: Optional[Dict[int, Tuple[int, int]]] = None) -> None:
+    """
+    Push committed leaderboard changes to the in-memory read models.
+    changes maps user_id -> (total_points, weekly_points); None means anything
+    may have changed and the rank index is rebuilt on next use.
+    """
+    leaderboard_read_model.invalidate()
+    if changes is None:
+        leaderboard_index.reset()
+    else:
+        leaderboard_index.apply(changes)
 
 
 def update_leaderboard(db: Session) -> None:
-    """Update overall leaderboard rankings."""
-    # Get all users ordered by total points
-    users = db.query(User).filter(User.role == "student").order_by(
-        desc(User.total_points)
-    ).all()
-    
-    # Update or create leaderboard entries
-    for rank, user in enumerate(users, start=1):
-        leaderboard = db.query(Leaderboard).filter(
-            Leaderboard.user_id == user.id
-        ).first()
-        
-        if leaderboard:
-            leaderboard.total_points = user.total_points
-            leaderboard.rank = rank
-            leaderboard.last_updated = get_ist_now()
-        else:
-            leaderboard = Leaderboard(
-                user_id=user.id,
-                total_points=user.total_points,
-                rank=rank
-            )
-            db.add(leaderboard)
-    
+    """
+    Full overall-leaderboard resync: copy every student's total_points and
+    recompute ranks, all set-based. Use after bulk changes (deletions, resets);
+    per-submission updates go through update_user_leaderboard.
+    """
+    _ensure_leaderboard_rows(db)
+    user_points = select(User.total_points).where(User.id == Leaderboard.user_id).scalar_subquery()
+    db.execute(
+        update(Leaderboard).where(Leaderboard.total_points != user_points).values(
+            total_points=user_points, last_updated=get_ist_now().replace(tzinfo=None)
+        ),
+        execution_options={"synchronize_session": False}
+    )
+    recompute_ranks(db)
     db.commit()
+    publish_leaderboard_changes()
 
 
 def update_weekly_leaderboard(db: Session) -> None:
-    """Update weekly leaderboard rankings."""
-    # Calculate start of week (Monday) in IST
-    ist_now = get_ist_now()
-    today = ist_now.date()
-    days_since_monday = today.weekday()
-    week_start = today - timedelta(days=days_since_monday)
-    week_start_datetime = datetime.combine(week_start, datetime.min.time()).replace(tzinfo=ist_now.tzinfo)
-    
-    # Get weekly points for each user
-    weekly_points_query = db.query(
-        PracticeSession.user_id,
-        func.sum(PracticeSession.points_earned).label('weekly_points')
-    ).filter(
-        PracticeSession.started_at >= week_start_datetime
-    ).group_by(PracticeSession.user_id).subquery()
-    
-    # Get all users with their weekly points
-    users_with_points = db.query(
-        User.id,
-        User.name,
-        User.avatar_url,
-        func.coalesce(weekly_points_query.c.weekly_points, 0).label('weekly_points')
-    ).outerjoin(
-        weekly_points_query, User.id == weekly_points_query.c.user_id
-    ).filter(
-        User.role == "student"
-    ).order_by(
-        desc('weekly_points')
-    ).all()
-    
-    # Update weekly leaderboard
-    for rank, (user_id, name, avatar_url, weekly_points) in enumerate(users_with_points, start=1):
-        leaderboard = db.query(Leaderboard).filter(
-            Leaderboard.user_id == user_id
-        ).first()
-        
-        if leaderboard:
-            leaderboard.weekly_points = int(weekly_points or 0)
-            leaderboard.weekly_rank = rank
-        else:
-            leaderboard = Leaderboard(
-                user_id=user_id,
-                weekly_points=int(weekly_points or 0),
-                weekly_rank=rank
-            )
+    """Full weekly-leaderboard resync (Monday-start IST week, all ledger points)."""
+    _ensure_leaderboard_rows(db)
+    _sync_weekly_points(db)
+    recompute_ranks(db)
+    db.commit()
+    publish_leaderboard_changes()
+
+
+def sync_user_rows(db: Session, user_ids: Iterable[int]) -> Optional[Dict[int, Tuple[int, int]]]:
+    """
+    Refresh total and weekly points for just these users' leaderboard rows
+    (three queries regardless of how many users). The first call in a new
+    week also resets everyone's weekly points. Does not re-rank or commit.
+
+    Returns {user_id: (total_points, weekly_points)} for the synced rows, or
+    None when the weekly reset touched every row.
+    """
+    user_ids = set(user_ids)
+    if not user_ids:
+        return {}
+
+    ist_now = get_ist_now().replace(tzinfo=None)
+    current_week = _week_start()
+    weekly_reset = _weekly_points_week_start != current_week
+    if weekly_reset:
+        _sync_weekly_points(db)
+
+    totals = dict(db.query(User.id, User.total_points).filter(
+        User.id.in_(user_ids), User.role == "student"
+    ).all())
+    weekly = get_period_points_for_users(db, totals.keys(), PERIOD_WEEK, current_week)
+    rows = {row.user_id: row for row in db.query(Leaderboard).filter(Leaderboard.user_id.in_(totals.keys()))}
+
+    changes = {}
+    for user_id, total_points in totals.items():
+        leaderboard = rows.get(user_id)
+        if leaderboard is None:
+            leaderboard = Leaderboard(user_id=user_id)
             db.add(leaderboard)
-    
+        leaderboard.total_points = total_points or 0
+        leaderboard.weekly_points = int(weekly.get(user_id, 0) or 0)
+        leaderboard.last_updated = ist_now
+        changes[user_id] = (leaderboard.total_points, leaderboard.weekly_points)
+    db.flush()
+    return None if weekly_reset else changes
+
+
+def update_user_leaderboard(db: Session, user_id: int) -> None:
+    """
+    Incremental update after one user's points changed: refresh only that
+    user's row, then recompute ranks with a single statement.
+    """
+    changes = sync_user_rows(db, [user_id])
+    recompute_ranks(db)
     db.commit()
+    publish_leaderboard_changes(changes)
 
 
-def get_overall_leaderboard(db: Session, limit: int = 100) -> List[dict]:
-    """Get overall leaderboard."""
-    leaderboard_entries = db.query(Leaderboard).join(User).filter(
+def _leaderboard_query(db: Session, order_by, limit: int):
+    """Leaderboard rows joined with the user's name and avatar in a single query."""
+    return db.query(
+        Leaderboard.user_id, Leaderboard.rank, Leaderboard.weekly_rank,
+        Leaderboard.total_points, Leaderboard.weekly_points,
+        User.name, User.display_name, User.avatar_url
+    ).join(User, User.id == Leaderboard.user_id).filter(
         User.role == "student"
     ).order_by(
-        desc(Leaderboard.total_points)
+        desc(order_by), Leaderboard.user_id
     ).limit(limit).all()
-    
-    result = []
-    for entry in leaderboard_entries:
-        user = db.query(User).filter(User.id == entry.user_id).first()
-        if user:
-            result.append({
-                "rank": entry.rank or 0,
-                "user_id": user.id,
-                "name": user.display_name or user.name,  # Use display_name if set, otherwise use name
-                "avatar_url": user.avatar_url,
-                "total_points": entry.total_points or 0,
-                "weekly_points": entry.weekly_points or 0  # Include weekly_points even for overall leaderboard
-            })
-    
-    return result
+
+
+def get_overall_leaderboard(db: Session, limit: int = 100) -> List[dict]:
+    """Get overall leaderboard."""
+    return [
+        {
+            "rank": row.rank or 0,
+            "user_id": row.user_id,
+            "name": row.display_name or row.name,  # Use display_name if set, otherwise use name
+            "avatar_url": row.avatar_url,
+            "total_points": row.total_points or 0,
+            "weekly_points": row.weekly_points or 0  # Include weekly_points even for overall leaderboard
+        }
+        for row in _leaderboard_query(db, Leaderboard.total_points, limit)
+    ]
 
 
 def get_weekly_leaderboard(db: Session, limit: int = 100) -> List[dict]:
     """Get weekly leaderboard."""
-    leaderboard_entries = db.query(Leaderboard).join(User).filter(
+    return [
+        {
+            "rank": row.weekly_rank or 0,
+            "user_id": row.user_id,
+            "name": row.display_name or row.name,  # Use display_name if set, otherwise use name
+            "avatar_url": row.avatar_url,
+            "weekly_points": row.weekly_points or 0,
+            "total_points": row.total_points or 0  # Include total_points even for weekly leaderboard
+        }
+        for row in _leaderboard_query(db, Leaderboard.weekly_points, limit)
+    ]
+
+
+def get_monthly_leaderboard(db: Session, limit: int = 100, year: Optional[int] = None, month: Optional[int] = None) -> List[dict]:
+    """Get monthly leaderboard (current IST month by default), ranked on read from the points rollup."""
+    start = date(year, month, 1) if year and month else month_start(get_ist_now().date())
+    rows = db.query(
+        PointsPeriodRollup.user_id, PointsPeriodRollup.points,
+        Leaderboard.total_points, Leaderboard.weekly_points,
+        User.name, User.display_name, User.avatar_url
+    ).join(
+        User, User.id == PointsPeriodRollup.user_id
+    ).outerjoin(
+        Leaderboard, Leaderboard.user_id == PointsPeriodRollup.user_id
+    ).filter(
+        PointsPeriodRollup.period_type == PERIOD_MONTH,
+        PointsPeriodRollup.period_start == start,
         User.role == "student"
     ).order_by(
-        desc(Leaderboard.weekly_points)
+        desc(PointsPeriodRollup.points), PointsPeriodRollup.user_id
     ).limit(limit).all()
-    
-    result = []
-    for entry in leaderboard_entries:
-        user = db.query(User).filter(User.id == entry.user_id).first()
-        if user:
-            result.append({
-                "rank": entry.weekly_rank or 0,
-                "user_id": user.id,
-                "name": user.display_name or user.name,  # Use display_name if set, otherwise use name
-                "avatar_url": user.avatar_url,
-                "weekly_points": entry.weekly_points or 0,
-                "total_points": entry.total_points or 0  # Include total_points even for weekly leaderboard
-            })
-    
-    return result
 
+    return [
+        {
+            "rank": rank,
+            "user_id": row.user_id,
+            "name": row.display_name or row.name,
+            "avatar_url": row.avatar_url,
+            "monthly_points": row.points or 0,
+            "total_points": row.total_points or 0,
+            "weekly_points": row.weekly_points or 0
+        }
+        for rank, row in enumerate(rows, start=1)
+    ]
@@ -1,11 +1,12 @@
 """FastAPI main application."""
-from fastapi import FastAPI, Depends, HTTPException, status, Request, Query, BackgroundTasks
+from fastapi import FastAPI, Depends, HTTPException, status, Request, Query, BackgroundTasks, Header, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse, JSONResponse
 from fastapi.exceptions import RequestValidationError
 from sqlalchemy.orm import Session
 from sqlalchemy import text
-from typing import List
+from sqlalchemy.exc import IntegrityError
+from typing import List, Optional
 from datetime import datetime
 from timezone_utils import get_ist_now, IST_TIMEZONE
 import json
@@ -22,13 +23,14 @@ from schemas import (
 from user_schemas import PaperAttemptCreate, PaperAttemptResponse, PaperAttemptDetailResponse, PaperAttemptSubmit
 from auth import get_current_user
 from models import User
-from gamification import calculate_points, check_and_award_badges, update_streak, check_and_award_super_rewards
+from gamification import calculate_points, update_streak
 from leaderboard_service import update_leaderboard, update_weekly_leaderboard
 from math_generator import generate_block
 from pdf_generator import generate_pdf
 from pdf_generator_v2 import generate_pdf_v2
 from pdf_generator_playwright import generate_pdf_playwright
 from presets import get_preset_blocks
+from idempotency import validate_idempotency_key, hash_request, get_cached_response, store_response, purge_expired_keys
 
 # Lazy import of user_routes to prevent startup failures
 user_router = None
@@ -193,10 +195,38 @@ async def startup_event():
             cleaned_count = cleanup_stale_incomplete_attempts(db)
             if cleaned_count > 0:
                 print(f"✅ [STARTUP] Cleaned up {cleaned_count} stale incomplete attempts")
+            purged_keys = purge_expired_keys(db)
+            if purged_keys > 0:
+                print(f"✅ [STARTUP] Purged {purged_keys} expired idempotency keys")
+            from daily_activity import backfill_if_empty
+            backfilled_days = backfill_if_empty(db)
+            if backfilled_days > 0:
+                print(f"✅ [STARTUP] Backfilled {backfilled_days} daily activity rows")
+            from points_rollup import backfill_if_empty as backfill_points_rollup
+            backfilled_periods = backfill_points_rollup(db)
+            if backfilled_periods > 0:
+                print(f"✅ [STARTUP] Backfilled {backfilled_periods} weekly/monthly points rows")
+            from student_stats import backfill_if_empty as backfill_user_stats
+            backfilled_stats = backfill_user_stats(db)
+            if backfilled_stats > 0:
+                print(f"✅ [STARTUP] Backfilled {backfilled_stats} user stats rows")
+            from attendance_rollup import backfill_if_empty as backfill_attendance_rollup
+            backfilled_attendance = backfill_attendance_rollup(db)
+            if backfilled_attendance > 0:
+                print(f"✅ [STARTUP] Backfilled {backfilled_attendance} attendance rollup rows")
+            from streak_reconciliation import backfill_if_empty as backfill_streak_dates
+            backfilled_streaks = backfill_streak_dates(db)
+            if backfilled_streaks > 0:
+                print(f"✅ [STARTUP] Backfilled {backfilled_streaks} streak dates")
             db.close()
         except Exception as cleanup_error:
             print(f"⚠️ [STARTUP] Failed to clean up stale attempts on startup: {cleanup_error}")
             # Don't fail startup if cleanup fails
+        
+        # Nightly streak reconciliation (also catches up yesterday if it was missed)
+        from streak_reconciliation import STREAK_RECONCILE_ENABLED, streak_scheduler
+        if STREAK_RECONCILE_ENABLED:
+            streak_scheduler.start()
     except Exception as e:
         import traceback
         print(f"❌ [STARTUP] Database initialization failed: {str(e)}")
@@ -204,6 +234,21 @@ async def startup_event():
         # Don't crash the app, but log the error
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Apply any leaderboard changes still waiting for the debounce window
+    try:
+        from leaderboard_refresher import leaderboard_refresher
+        leaderboard_refresher.flush()
+    except Exception as e:
+        print(f"⚠️ [SHUTDOWN] Failed to flush leaderboard refresher: {e}")
+    try:
+        from streak_reconciliation import streak_scheduler
+        streak_scheduler.stop()
+    except Exception as e:
+        print(f"⚠️ [SHUTDOWN] Failed to stop streak scheduler: {e}")
+
+
 # Handle validation errors (specific handler - must come before global handler)
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
@@ -332,18 +377,23 @@ def cleanup_stale_incomplete_attempts(db: Session, user_id: int = None):
 
 @app.get("/papers/attempts", response_model=List[PaperAttemptResponse])
 async def get_paper_attempts(
+    response: Response,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
-    limit: int = Query(10, ge=1, le=100)
+    limit: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = Query(None)
 ):
-    """Get user's paper attempt history. Only latest 10 attempts are stored."""
+    """Get user's paper attempt history, newest first. Older pages via the X-Next-Cursor header."""
+    from pagination import keyset_page, set_next_cursor
     try:
         # Clean up stale incomplete attempts for this user
         cleanup_stale_incomplete_attempts(db, user_id=current_user.id)
         
-        attempts = db.query(PaperAttempt).filter(
-            PaperAttempt.user_id == current_user.id
-        ).order_by(PaperAttempt.started_at.desc()).limit(limit).all()
+        attempts, next_cursor = keyset_page(
+            db.query(PaperAttempt).filter(PaperAttempt.user_id == current_user.id),
+            PaperAttempt.started_at, PaperAttempt.id, cursor, limit
+        )
+        set_next_cursor(response, next_cursor)
         
         print(f"✅ [PAPER_ATTEMPTS] Found {len(attempts)} attempts for user {current_user.id}")
         
@@ -362,6 +412,8 @@ async def get_paper_attempts(
         
         print(f"✅ [PAPER_ATTEMPTS] Returning {len(result)} validated attempts")
         return result
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ [PAPER_ATTEMPTS] Error in get_paper_attempts: {e}")
         import traceback
@@ -696,6 +748,8 @@ async def start_paper_attempt(
         answers=attempt_data.answers or {}
     )
     db.add(paper_attempt)
+    from student_stats import record_paper_started
+    record_paper_started(db, current_user.id, total_questions)
     db.commit()
     db.refresh(paper_attempt)
     
@@ -708,9 +762,8 @@ def process_paper_attempt_async(attempt_id: int, user_id: int, correct_count: in
     """Background task to process paper attempt - updates stats, badges, leaderboards.
     Note: Points are already updated in main request, so we don't update them here."""
     from models import get_db, User, StudentProfile, PracticeSession
-    from reward_system import update_user_question_count
-    from gamification import update_streak, check_and_award_super_rewards, check_and_award_badges
-    from leaderboard_service import update_leaderboard, update_weekly_leaderboard
+    from gamification import update_streak
+    from leaderboard_refresher import leaderboard_refresher
     
     start_time = time.time()
     db = next(get_db())
@@ -722,20 +775,21 @@ def process_paper_attempt_async(attempt_id: int, user_id: int, correct_count: in
             print(f"⚠️ [BG_TASK] User not found for user_id={user_id}")
             return
         
-        # Update question count (points already updated in main request)
-        update_user_question_count(db, user, attempted_questions)
+        # Question count and points were already updated in the main request
         
         # Update streak for Vedic Maths students (only papers count)
         profile = db.query(StudentProfile).filter(StudentProfile.user_id == user.id).first()
         if profile and profile.course == "Vedic Maths":
-            update_streak(db, user, questions_practiced_today=attempted_questions)
+            update_streak(db, user, questions_practiced_today=attempted_questions, source="paper")
         
-        # Check for SUPER badge rewards
-        check_and_award_super_rewards(db, user)
+        # Lifetime volume and SUPER badges: only rules reading the metrics this submission changed
+        if attempted_questions > 0:
+            from reward_rules import QUESTIONS_ATTEMPTED, TOTAL_POINTS, evaluate_user
+            evaluate_user(db, user, {TOTAL_POINTS, QUESTIONS_ATTEMPTED})
         
-        # Check for lifetime badges (new reward system)
-        from reward_system import check_and_award_lifetime_badges
-        check_and_award_lifetime_badges(db, user)
+        # The streak may have changed
+        from stats_cache import invalidate_on_commit, reward_summary_cache
+        invalidate_on_commit(db, reward_summary_cache, user.id)
         
         # Note: Monthly badges (accuracy_ace, perfect_precision, comeback_kid) are evaluated
         # at end of month via monthly_badge_evaluation.py, not per-attempt
@@ -743,16 +797,8 @@ def process_paper_attempt_async(attempt_id: int, user_id: int, correct_count: in
         db.commit()
         db.refresh(user)
         
-        # Update leaderboards (these have their own commits)
-        try:
-            update_leaderboard(db)
-        except Exception as e:
-            print(f"⚠️ [BG_TASK] Error updating leaderboard: {e}")
-        
-        try:
-            update_weekly_leaderboard(db)
-        except Exception as e:
-            print(f"⚠️ [BG_TASK] Error updating weekly leaderboard: {e}")
+        # Queue a leaderboard refresh (coalesced with other submissions)
+        leaderboard_refresher.mark_dirty(user.id)
         
         elapsed = time.time() - start_time
         print(f"✅ [BG_TASK] Processed attempt {attempt_id} in {elapsed:.2f}s")
@@ -771,12 +817,26 @@ async def submit_paper_attempt(
     submit_data: PaperAttemptSubmit,
     background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
+    """Submit answers for a paper attempt and calculate results.
+    
+    If an Idempotency-Key header is sent, a retry with the same key returns the
+    original response without re-scoring or awarding points again."""
     answers = submit_data.answers
     time_taken = submit_data.time_taken
-    """Submit answers for a paper attempt and calculate results."""
     request_start = time.time()
+    
+    endpoint = f"PUT /papers/attempt/{attempt_id}"
+    idempotency_key = validate_idempotency_key(idempotency_key)
+    request_hash = None
+    if idempotency_key:
+        request_hash = hash_request(endpoint, submit_data.model_dump(mode="json"))
+        cached = get_cached_response(db, current_user.id, idempotency_key, endpoint, request_hash)
+        if cached is not None:
+            return PaperAttemptResponse.model_validate(cached)
+    
     try:
         paper_attempt = db.query(PaperAttempt).filter(
             PaperAttempt.id == attempt_id,
@@ -789,10 +849,11 @@ async def submit_paper_attempt(
         print(f"🟡 [SUBMIT] Attempt {attempt_id} found: completed_at = {paper_attempt.completed_at}, user_id = {paper_attempt.user_id}")
         
         # Check if attempt is already completed - but allow if it was just created (within last second)
-        # This handles race conditions where the same attempt might be submitted twice
+        # This handles race conditions where the same attempt might be submitted twice by
+        # clients that don't send an Idempotency-Key
         if paper_attempt.completed_at:
             # Check if it was completed very recently (within 2 seconds) - might be a duplicate submission
-            time_since_completion = (get_ist_now() - paper_attempt.completed_at).total_seconds()
+            time_since_completion = (get_ist_now().replace(tzinfo=None) - paper_attempt.completed_at).total_seconds()
             print(f"🟡 [SUBMIT] Attempt {attempt_id} was completed {time_since_completion:.2f}s ago")
             if time_since_completion > 2:
                 print(f"❌ [SUBMIT] Attempt {attempt_id} was completed too long ago, rejecting submission")
@@ -906,6 +967,19 @@ async def submit_paper_attempt(
         from reward_system import update_user_question_count
         update_user_question_count(db, current_user, attempted_questions)
         
+        # Roll the submission into today's activity row (streaks read this)
+        from daily_activity import record_activity
+        record_activity(db, current_user.id, paper_questions=attempted_questions, papers=1, points=points_earned)
+        from student_stats import record_paper_scored
+        record_paper_scored(db, current_user.id, correct_count, wrong_count)
+        
+        if idempotency_key:
+            # Store the response in the same transaction as the scored attempt
+            store_response(
+                db, current_user.id, idempotency_key, endpoint, request_hash,
+                PaperAttemptResponse.model_validate(paper_attempt).model_dump(mode="json")
+            )
+        
         db.commit()
         db.refresh(paper_attempt)
         db.refresh(current_user)
@@ -931,6 +1005,18 @@ async def submit_paper_attempt(
     except HTTPException:
         # Re-raise HTTP exceptions as-is
         raise
+    except IntegrityError as e:
+        db.rollback()
+        if idempotency_key:
+            # A concurrent request with the same key committed first - replay its response
+            cached = get_cached_response(db, current_user.id, idempotency_key, endpoint, request_hash)
+            if cached is not None:
+                return PaperAttemptResponse.model_validate(cached)
+        print(f"❌ [PAPER ATTEMPT] Integrity error submitting paper attempt: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Paper attempt submission conflicts with an existing record"
+        )
     except Exception as e:
         # Rollback transaction on error
         db.rollback()
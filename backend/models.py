@@ -1,5 +1,5 @@
 """Database models for the application."""
-from sqlalchemy import Column, Integer, String, JSON, DateTime, Float, Boolean, ForeignKey, Text, create_engine, Index
+from sqlalchemy import Column, Integer, String, JSON, DateTime, Date, Float, Boolean, ForeignKey, Text, create_engine, Index, func, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime
@@ -52,6 +52,10 @@ class User(Base):
     rewards = relationship("Reward", back_populates="user", cascade="all, delete-orphan")
     student_profile = relationship("StudentProfile", back_populates="user", uselist=False, cascade="all, delete-orphan")
     points_logs = relationship("PointsLog", back_populates="user", cascade="all, delete-orphan")
+    
+    __table_args__ = (
+        Index('idx_users_role_id', 'role', 'id'),  # Paged student listings
+    )
 
 
 class PracticeSession(Base):
@@ -77,9 +81,11 @@ class PracticeSession(Base):
     # Relationships
     user = relationship("User", back_populates="practice_sessions")
     attempts = relationship("Attempt", back_populates="session", cascade="all, delete-orphan")
+    attempt_pack = relationship("PracticeSessionAttemptPack", back_populates="session", uselist=False, cascade="all, delete-orphan")
     
     __table_args__ = (
         Index('idx_user_created', 'user_id', 'started_at'),
+        Index('idx_session_user_started_id', 'user_id', 'started_at', 'id'),  # Keyset pagination
     )
 
 
@@ -101,6 +107,39 @@ class Attempt(Base):
     session = relationship("PracticeSession", back_populates="attempts")
 
 
+class QuestionTemplate(Base):
+    """Question fields shared by every attempt of a session, deduplicated across sessions."""
+    __tablename__ = "question_templates"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    template_hash = Column(String(64), unique=True, nullable=False, index=True)  # SHA-256 of the template JSON
+    template = Column(JSON, nullable=False)
+    created_at = Column(DateTime, default=get_ist_now)
+
+
+class PracticeSessionAttemptPack(Base):
+    """All attempts of a practice session packed into one row as parallel arrays.
+
+    Replaces one `attempts` row per question. Element i of every array belongs to
+    the i-th attempt; see attempt_storage.unpack_attempts for decoding."""
+    __tablename__ = "practice_session_attempt_packs"
+    
+    session_id = Column(Integer, ForeignKey("practice_sessions.id"), primary_key=True)
+    question_count = Column(Integer, nullable=False)
+    template_id = Column(Integer, ForeignKey("question_templates.id"), nullable=True)
+    question_values = Column(JSON, nullable=False)  # Per-question fields not covered by the template
+    user_answers = Column(JSON, nullable=False)  # List of float or null (skipped)
+    correct_answers = Column(JSON, nullable=False)  # List of float
+    correct_bits = Column(String, nullable=False)  # Hex bitmap, bit i set = attempt i correct
+    times = Column(JSON, nullable=False)  # Seconds per question
+    question_numbers = Column(JSON, nullable=False)
+    created_at = Column(DateTime, default=get_ist_now)
+    
+    # Relationships
+    session = relationship("PracticeSession", back_populates="attempt_pack")
+    template = relationship("QuestionTemplate")
+
+
 class Reward(Base):
     """Rewards and badges earned by users."""
     __tablename__ = "rewards"
@@ -122,6 +161,14 @@ class Reward(Base):
     )
 
 
+# One row per (user, badge, month); lifetime badges have no month, and NULLs
+# never collide in a unique index, hence the coalesce
+Index(
+    'uq_reward_user_badge_month',
+    Reward.user_id, Reward.badge_type, func.coalesce(Reward.month_earned, ''),
+    unique=True
+)
+
 class PaperAttempt(Base):
     """Paper attempt model to track attempts on custom generated papers."""
     __tablename__ = "paper_attempts"
@@ -151,6 +198,7 @@ class PaperAttempt(Base):
     
     __table_args__ = (
         Index('idx_paper_user_created', 'user_id', 'started_at'),
+        Index('idx_paper_user_started_id', 'user_id', 'started_at', 'id'),  # Keyset pagination
     )
 
 
@@ -197,6 +245,109 @@ class PointsLog(Base):
     __table_args__ = (
         Index('idx_user_created', 'user_id', 'created_at'),
         Index('idx_source', 'source_type', 'source_id'),
+        Index('idx_points_user_log_id', 'user_id', 'id'),  # Ledger tail scans after a checkpoint
+        Index('idx_points_user_created_id', 'user_id', 'created_at', 'id'),  # Keyset pagination
+    )
+
+
+class PointsLedgerCheckpoint(Base):
+    """Running balance of a user's points ledger as of a given log id."""
+    __tablename__ = "points_ledger_checkpoints"
+    
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    last_log_id = Column(Integer, nullable=False)  # Highest PointsLog.id included
+    balance = Column(Integer, nullable=False)  # SUM(points) for log ids <= last_log_id
+    entry_count = Column(Integer, nullable=False)  # COUNT(*) for log ids <= last_log_id
+    updated_at = Column(DateTime, default=lambda: get_ist_now().replace(tzinfo=None), nullable=False)
+
+
+class PointsPeriodRollup(Base):
+    """Points earned per user per week/month, maintained from the points ledger by log_points."""
+    __tablename__ = "points_period_rollup"
+    
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    period_type = Column(String(10), primary_key=True)  # "week" (Monday start) or "month"
+    period_start = Column(Date, primary_key=True)  # IST date the period starts on
+    points = Column(Integer, default=0, nullable=False)  # Net points (spends are negative)
+    
+    __table_args__ = (
+        Index('idx_points_period_ranking', 'period_type', 'period_start', 'points'),
+    )
+
+
+class UserDailyActivity(Base):
+    """Per-user, per-IST-day activity rollup, upserted on every session and paper submission."""
+    __tablename__ = "user_daily_activity"
+    
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    ist_date = Column(Date, primary_key=True)  # Calendar day in IST
+    questions_attempted = Column(Integer, default=0, nullable=False)  # Mental math + paper questions answered
+    mental_math_questions = Column(Integer, default=0, nullable=False)  # Drives Abacus streaks
+    paper_questions = Column(Integer, default=0, nullable=False)  # Drives Vedic Maths streaks
+    sessions = Column(Integer, default=0, nullable=False)  # Mental math sessions completed
+    papers = Column(Integer, default=0, nullable=False)  # Paper attempts submitted
+    points = Column(Integer, default=0, nullable=False)  # Points earned from those submissions
+    updated_at = Column(DateTime, default=lambda: get_ist_now().replace(tzinfo=None), nullable=False)
+    
+    __table_args__ = (
+        Index('idx_daily_activity_date', 'ist_date'),
+    )
+
+
+class UserStreak(Base):
+    """The last IST day counted in a user's current_streak (today once met, or a grace-skipped day)."""
+    __tablename__ = "user_streaks"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    streak_date = Column(Date, nullable=False)
+
+
+class StreakRun(Base):
+    """One nightly streak reconciliation per IST day; the row makes re-runs for the same day no-ops."""
+    __tablename__ = "streak_runs"
+
+    run_date = Column(Date, primary_key=True)  # IST day that was reconciled
+    users_changed = Column(Integer, default=0, nullable=False)
+    streaks_advanced = Column(Integer, default=0, nullable=False)
+    streaks_reset = Column(Integer, default=0, nullable=False)
+    grace_preserved = Column(Integer, default=0, nullable=False)
+    bonuses_awarded = Column(Integer, default=0, nullable=False)
+    finished_at = Column(DateTime, default=lambda: get_ist_now().replace(tzinfo=None), nullable=False)
+
+
+class UserStats(Base):
+    """Per-user lifetime practice totals, maintained in the same transaction as each session and paper attempt."""
+    __tablename__ = "user_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    mental_sessions = Column(Integer, default=0, nullable=False)
+    mental_questions = Column(Integer, default=0, nullable=False)
+    mental_correct = Column(Integer, default=0, nullable=False)
+    mental_wrong = Column(Integer, default=0, nullable=False)
+    paper_attempts = Column(Integer, default=0, nullable=False)  # Counted when an attempt is started
+    paper_questions = Column(Integer, default=0, nullable=False)
+    paper_correct = Column(Integer, default=0, nullable=False)  # Added when the attempt is submitted
+    paper_wrong = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, default=lambda: get_ist_now().replace(tzinfo=None), nullable=False)
+
+
+class IdempotencyKey(Base):
+    """Client-supplied Idempotency-Key with the cached response of the first successful request."""
+    __tablename__ = "idempotency_keys"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    key = Column(String(255), nullable=False)  # Value of the Idempotency-Key header
+    endpoint = Column(String, nullable=False)  # e.g. "POST /users/practice-session"
+    request_hash = Column(String(64), nullable=False)  # SHA-256 of the request payload
+    response_hash = Column(String(64), nullable=False)  # SHA-256 of the cached response body
+    response_body = Column(JSON, nullable=False)  # Cached response returned on retries
+    created_at = Column(DateTime, default=lambda: get_ist_now().replace(tzinfo=None), nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+    
+    __table_args__ = (
+        Index('idx_idempotency_user_key', 'user_id', 'key', unique=True),
+        Index('idx_idempotency_expires', 'expires_at'),
     )
 
 
@@ -381,9 +532,39 @@ class AttendanceRecord(Base):
         Index('idx_student_session', 'student_profile_id', 'session_id', unique=True),
         Index('idx_student_date', 'student_profile_id', 'created_at'),
         Index('idx_attendance_status', 'status'),
+        Index('idx_attendance_student_created_id', 'student_profile_id', 'created_at', 'id'),  # Keyset pagination
+        Index('idx_attendance_created_id', 'created_at', 'id'),
     )
 
 
+class StudentAttendanceMonthly(Base):
+    """Per-student attendance counts per IST calendar month, refreshed by the attendance marking endpoints."""
+    __tablename__ = "student_attendance_monthly"
+
+    student_profile_id = Column(Integer, ForeignKey("student_profiles.id", ondelete="CASCADE"), primary_key=True)
+    month_start = Column(Date, primary_key=True)  # First day of the month of the sessions
+    present = Column(Integer, default=0, nullable=False)
+    absent = Column(Integer, default=0, nullable=False)
+    on_break = Column(Integer, default=0, nullable=False)
+    leave = Column(Integer, default=0, nullable=False)
+    t_shirts = Column(Integer, default=0, nullable=False)  # Records with the T-shirt worn
+    updated_at = Column(DateTime, default=lambda: get_ist_now().replace(tzinfo=None), nullable=False)
+
+
+class AttendanceDailySummary(Base):
+    """Attendance counts per IST day, branch and course, refreshed by the attendance marking endpoints."""
+    __tablename__ = "attendance_daily_summary"
+
+    summary_date = Column(Date, primary_key=True)  # IST day of the sessions
+    branch = Column(String, primary_key=True)
+    course = Column(String, primary_key=True, default="")  # "" for sessions without a course
+    present = Column(Integer, default=0, nullable=False)
+    absent = Column(Integer, default=0, nullable=False)
+    on_break = Column(Integer, default=0, nullable=False)
+    leave = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, default=lambda: get_ist_now().replace(tzinfo=None), nullable=False)
+
+
 class Certificate(Base):
     """Certificates issued to students."""
     __tablename__ = "certificates"
@@ -556,6 +737,8 @@ class FeeTransaction(Base):
         Index('idx_assignment_date', 'assignment_id', 'payment_date'),
         Index('idx_type_date', 'transaction_type', 'payment_date'),
         Index('idx_payment_mode', 'payment_mode'),
+        Index('idx_fee_txn_assignment_date_id', 'assignment_id', 'payment_date', 'id'),  # Keyset pagination
+        Index('idx_fee_txn_date_id', 'payment_date', 'id'),
     )
 
 
@@ -629,6 +812,13 @@ def init_db():
                 except Exception as table_error:
                     print(f"⚠️ [INIT_DB] Could not create {table_name}: {str(table_error)}")
     
+    # create_all only creates missing tables - add indexes declared on tables that already existed
+    _create_missing_indexes()
+    
+    # Trigram indexes for admin student search (PostgreSQL only)
+    from student_directory import create_search_indexes
+    create_search_indexes(engine)
+    
     # Verify tables were created
     from sqlalchemy import inspect
     inspector = inspect(engine)
@@ -637,6 +827,55 @@ def init_db():
     print(f"✅ [INIT_DB] Tables verified. Fee tables: {fee_tables_created}")
 
 
+def _dedupe_rewards():
+    """Drop duplicate badge awards (keeping the earliest) so the unique reward index can be built."""
+    with engine.begin() as conn:
+        result = conn.execute(text(
+            "DELETE FROM rewards WHERE id NOT IN ("
+            "SELECT MIN(id) FROM rewards GROUP BY user_id, badge_type, COALESCE(month_earned, ''))"
+        ))
+        if result.rowcount:
+            print(f"✅ [INIT_DB] Removed {result.rowcount} duplicate badge awards")
+
+
+# Data fixes that must run before an index can be added to an existing table
+_BEFORE_INDEX_CREATE = {
+    'uq_reward_user_badge_month': _dedupe_rewards,
+}
+
+
+def _existing_index_names(inspector, table_name):
+    """Index names on a table, including expression indexes SQLite reflection skips."""
+    if engine.dialect.name == "sqlite":
+        with engine.connect() as conn:
+            return set(conn.execute(
+                text("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :table"),
+                {"table": table_name}
+            ).scalars())
+    return {index["name"] for index in inspector.get_indexes(table_name)}
+
+
+def _create_missing_indexes():
+    """Create indexes declared in the models that an existing database doesn't have yet."""
+    from sqlalchemy import inspect
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing_indexes = _existing_index_names(inspector, table.name)
+        for index in table.indexes:
+            if index.name in existing_indexes:
+                continue
+            try:
+                if index.name in _BEFORE_INDEX_CREATE:
+                    _BEFORE_INDEX_CREATE[index.name]()
+                index.create(bind=engine, checkfirst=True)
+                print(f"✅ [INIT_DB] Created index {index.name} on {table.name}")
+            except Exception as index_error:
+                print(f"⚠️ [INIT_DB] Could not create index {index.name} on {table.name}: {str(index_error)}")
+
+
 def get_db():
     """Dependency to get database session."""
     db = SessionLocal()
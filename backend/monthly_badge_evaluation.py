@@ -9,23 +9,69 @@ If year and month are not provided, evaluates the previous month.
 """
 import sys
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from timezone_utils import get_ist_now, IST_TIMEZONE
-from models import get_db
+from models import SessionLocal, engine
 from reward_system import (
     evaluate_attendance_badges,
     evaluate_tshirt_star_badges,
-    award_leaderboard_badges
+    award_leaderboard_badges,
+    evaluate_monthly_streak_badges
 )
+from reward_rules import evaluate_batch
 
 
-def evaluate_monthly_badges(year: int = None, month: int = None):
+def evaluate_lifetime_badges(db, year: int, month: int) -> int:
+    """Catch up lifetime threshold badges (points can also change outside submissions)."""
+    return sum(evaluate_batch(db).values())
+
+
+# Independent month-end stages: (name, stage(db, year, month) -> badges awarded)
+MONTHLY_STAGES = (
+    ("attendance", evaluate_attendance_badges),
+    ("tshirt", evaluate_tshirt_star_badges),
+    ("leaderboard", award_leaderboard_badges),
+    ("streak", evaluate_monthly_streak_badges),
+    ("lifetime", evaluate_lifetime_badges),
+)
+
+
+def _run_stage(name: str, stage, year: int, month: int) -> dict:
+    """Run one stage in its own session and transaction, timing it."""
+    db = SessionLocal()
+    start_time = time.perf_counter()
+    try:
+        awarded = stage(db, year, month)
+        db.commit()
+        elapsed = time.perf_counter() - start_time
+        print(f"⏱ [MONTHLY EVALUATION] {name}: {awarded} badges awarded in {elapsed:.2f}s")
+        return {"awarded": awarded, "seconds": round(elapsed, 3)}
+    except Exception as e:
+        db.rollback()
+        elapsed = time.perf_counter() - start_time
+        print(f"❌ [MONTHLY EVALUATION] {name} failed after {elapsed:.2f}s: {e}")
+        import traceback
+        traceback.print_exc()
+        return {"awarded": 0, "seconds": round(elapsed, 3), "error": str(e)}
+    finally:
+        db.close()
+
+
+def evaluate_monthly_badges(year: int = None, month: int = None) -> dict:
     """
     Evaluate and award monthly badges for a specific month.
     
+    Stages run in parallel, each in its own transaction, so one failing stage
+    doesn't undo the others. Every stage is safe to re-run for a past month.
+    
     Args:
         year: Year to evaluate (default: previous month's year)
         month: Month to evaluate (default: previous month)
+    
+    Returns:
+        {"year", "month", "awarded", "seconds", "stages": {name: {"awarded", "seconds"[, "error"]}}, "failed": [...]}
     """
     ist_now = get_ist_now()
     
@@ -39,35 +85,33 @@ def evaluate_monthly_badges(year: int = None, month: int = None):
             month = ist_now.month - 1
     
     print(f"🏆 [MONTHLY EVALUATION] Evaluating badges for {year}-{month:02d}")
+    start_time = time.perf_counter()
     
-    db = next(get_db())
-    try:
-        # 1. Evaluate attendance badges
-        print("📅 [ATTENDANCE] Evaluating attendance badges...")
-        evaluate_attendance_badges(db, year, month)
-        print("✅ [ATTENDANCE] Attendance badges evaluated")
-        
-        # 2. Evaluate T-shirt star badges
-        print("⭐ [T-SHIRT] Evaluating T-shirt star badges...")
-        evaluate_tshirt_star_badges(db, year, month)
-        print("✅ [T-SHIRT] T-shirt star badges evaluated")
-        
-        # 3. Award leaderboard badges
-        print("🏅 [LEADERBOARD] Awarding leaderboard badges...")
-        award_leaderboard_badges(db, year, month)
-        print("✅ [LEADERBOARD] Leaderboard badges awarded")
-        
-        db.commit()
-        print(f"✅ [MONTHLY EVALUATION] Completed evaluation for {year}-{month:02d}")
-        
-    except Exception as e:
-        db.rollback()
-        print(f"❌ [MONTHLY EVALUATION] Error: {e}")
-        import traceback
-        traceback.print_exc()
-        raise
-    finally:
-        db.close()
+    # SQLite allows one writer at a time, so stages run one after another there
+    workers = 1 if engine.dialect.name == "sqlite" else len(MONTHLY_STAGES)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="monthly-badges") as pool:
+        futures = {
+            name: pool.submit(_run_stage, name, stage, year, month)
+            for name, stage in MONTHLY_STAGES
+        }
+        stages = {name: future.result() for name, future in futures.items()}
+    
+    failed = [name for name, result in stages.items() if "error" in result]
+    elapsed = time.perf_counter() - start_time
+    awarded = sum(result["awarded"] for result in stages.values())
+    if failed:
+        print(f"⚠️ [MONTHLY EVALUATION] {year}-{month:02d} finished with failed stages: {', '.join(failed)}")
+    else:
+        print(f"✅ [MONTHLY EVALUATION] Completed evaluation for {year}-{month:02d}: {awarded} badges in {elapsed:.2f}s")
+    
+    return {
+        "year": year,
+        "month": month,
+        "awarded": awarded,
+        "seconds": round(elapsed, 3),
+        "stages": stages,
+        "failed": failed,
+    }
 
 
 if __name__ == "__main__":
@@ -85,4 +129,6 @@ if __name__ == "__main__":
             print("Usage: python monthly_badge_evaluation.py [year] [month]")
             sys.exit(1)
     
-    evaluate_monthly_badges(year, month)
+    result = evaluate_monthly_badges(year, month)
+    if result["failed"]:
+        sys.exit(1)
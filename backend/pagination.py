@@ -0,0 +1,65 @@
+"""
+Keyset (cursor) pagination for history endpoints.
+
+Pages are ordered newest first on (timestamp, id) and each page starts
+strictly after the last row of the previous one, so every page is a range
+scan on a matching (filter, timestamp, id) composite index however deep the
+client has paged - OFFSET reads and discards every skipped row instead.
+Cursors are opaque URL-safe tokens: list endpoints return the next one in the
+X-Next-Cursor header (object responses carry next_cursor) and clients pass it
+back unchanged as ?cursor=.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+from fastapi import HTTPException, Response, status
+from sqlalchemy import tuple_
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(sort_value: datetime, row_id: int) -> str:
+    payload = json.dumps([sort_value.isoformat(), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Parse a cursor from encode_cursor; a malformed cursor is a 400."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(sort_value), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor"
+        )
+
+
+def keyset_page(query, sort_column, id_column, cursor: Optional[str], limit: Optional[int]) -> Tuple[List[Any], Optional[str]]:
+    """
+    One page of `query` ordered by (sort_column, id_column) descending.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    limit=None returns every remaining row.
+    """
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor)
+        query = query.filter(tuple_(sort_column, id_column) < tuple_(sort_value, row_id))
+    query = query.order_by(sort_column.desc(), id_column.desc())
+    if limit is None:
+        return query.all(), None
+
+    # Fetch one extra row to know whether another page exists
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, sort_column.key), getattr(last, id_column.key))
+
+
+def set_next_cursor(response: Response, next_cursor: Optional[str]) -> None:
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
@@ -1,8 +1,11 @@
 """
 Points logging utility - tracks all point transactions for audit and checksum.
 """
+import os
+from datetime import timedelta
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from models import PointsLog, User
+from models import PointsLog, PointsLedgerCheckpoint, SessionLocal, User
 from typing import Optional, Dict, Any
 from timezone_utils import get_ist_now
 
@@ -17,7 +20,7 @@ def log_points(
     extra_data: Optional[Dict[str, Any]] = None
 ) -> PointsLog:
     """
-    Log a points transaction.
+    Log a points transaction and add it to the user's weekly/monthly rollup.
     
     Args:
         db: Database session
@@ -37,32 +40,194 @@ def log_points(
         source_type=source_type,
         description=description,
         source_id=source_id,
-        extra_datadata=extradata or {}
+        extra_data=extra_data or {}
     )
     db.add(points_log)
+    
+    # Keep the weekly/monthly rollup in step with the ledger
+    from points_rollup import record_points
+    record_points(db, user.id, points)
+    
+    from stats_cache import invalidate_on_commit, reward_summary_cache
+    invalidate_on_commit(db, reward_summary_cache, user.id)
     return points_log
 
 
+# Advance a user's checkpoint once this many entries have accumulated after it
+POINTS_CHECKPOINT_INTERVAL = int(os.getenv("POINTS_CHECKPOINT_INTERVAL", "50"))
+# Entries younger than this are never checkpointed, so a transaction that took
+# a lower log id but commits late can't be skipped
+CHECKPOINT_SETTLE_SECONDS = 300
+
+
+def _ledger_tail(db: Session, user_id: int, after_log_id: int):
+    """(sum, count, max id) of a user's entries after a log id - an index range scan on (user_id, id)."""
+    return db.query(
+        func.coalesce(func.sum(PointsLog.points), 0),
+        func.count(PointsLog.id),
+        func.max(PointsLog.id)
+    ).filter(
+        PointsLog.user_id == user_id,
+        PointsLog.id > after_log_id
+    ).one()
+
+
+def advance_checkpoint(db: Session, user_id: int) -> Optional[PointsLedgerCheckpoint]:
+    """
+    Fold settled entries after the user's current checkpoint into it.
+    Does not commit. Returns the checkpoint (None if the user has no settled entries).
+    """
+    checkpoint = db.query(PointsLedgerCheckpoint).filter(PointsLedgerCheckpoint.user_id == user_id).first()
+    after_log_id = checkpoint.last_log_id if checkpoint else 0
+    settled_before = get_ist_now().replace(tzinfo=None) - timedelta(seconds=CHECKPOINT_SETTLE_SECONDS)
+
+    points, count, max_id = db.query(
+        func.coalesce(func.sum(PointsLog.points), 0),
+        func.count(PointsLog.id),
+        func.max(PointsLog.id)
+    ).filter(
+        PointsLog.user_id == user_id,
+        PointsLog.id > after_log_id,
+        PointsLog.created_at < settled_before
+    ).one()
+
+    if not count:
+        return checkpoint
+    if checkpoint is None:
+        checkpoint = PointsLedgerCheckpoint(user_id=user_id, last_log_id=0, balance=0, entry_count=0)
+        db.add(checkpoint)
+    # Only settled entries are folded in; anything with a higher id stays in the tail
+    checkpoint.balance += int(points)
+    checkpoint.entry_count += int(count)
+    checkpoint.last_log_id = int(max_id)
+    checkpoint.updated_at = get_ist_now().replace(tzinfo=None)
+    return checkpoint
+
+
 def get_points_summary(db: Session, user_id: int) -> Dict[str, Any]:
     """
     Get points summary for a user (checksum verification).
     
+    Sums only the entries after the user's latest checkpoint, so the cost grows
+    with new entries rather than with the whole history. Read-only: callers
+    advance the checkpoint when checkpoint_due is set.
+    
     Returns:
-        Dict with total_points_from_logs and total_points_from_user for comparison
+        Dict with total_points_from_logs, total_points_from_user, match, total_entries and checkpoint_due
     """
-    from sqlalchemy import func
+    checkpoint = db.query(PointsLedgerCheckpoint).filter(PointsLedgerCheckpoint.user_id == user_id).first()
+    base_balance = checkpoint.balance if checkpoint else 0
+    base_count = checkpoint.entry_count if checkpoint else 0
+    tail_points, tail_count, _ = _ledger_tail(db, user_id, checkpoint.last_log_id if checkpoint else 0)
     
-    # Sum all points from logs
-    total_from_logs = db.query(func.sum(PointsLog.points)).filter(
-        PointsLog.user_id == user_id
-    ).scalar() or 0
+    total_from_logs = base_balance + int(tail_points)
     
     # Get current user points
-    user = db.query(User).filter(User.id == user_id).first()
-    total_from_user = user.total_points if user else 0
+    total_from_user = db.query(User.total_points).filter(User.id == user_id).scalar() or 0
     
     return {
-        "total_points_from_logs": int(total_from_logs),
+        "total_points_from_logs": total_from_logs,
         "total_points_from_user": total_from_user,
-        "match": total_from_logs == total_from_user
+        "match": total_from_logs == total_from_user,
+        "total_entries": base_count + int(tail_count),
+        # Enough entries after the checkpoint to fold them in (advance_checkpoint_in_background)
+        "checkpoint_due": tail_count >= POINTS_CHECKPOINT_INTERVAL
     }
+
+
+def advance_checkpoint_in_background(user_id: int) -> None:
+    """Advance a user's checkpoint on its own session (background task after a read)."""
+    db = SessionLocal()
+    try:
+        advance_checkpoint(db, user_id)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"⚠️ [POINTS] Could not advance ledger checkpoint for user {user_id}: {e}")
+    finally:
+        db.close()
+
+
+def verify_all_ledgers(db: Session, advance_checkpoints: bool = True) -> Dict[str, Any]:
+    """
+    Verify every user's ledger against users.total_points in one set-based
+    query (checkpoint balance + tail sum), then optionally advance all
+    checkpoints in one more aggregate pass. Commits when advancing.
+    """
+    tail = db.query(
+        PointsLog.user_id.label("user_id"),
+        func.sum(PointsLog.points).label("points")
+    ).outerjoin(
+        PointsLedgerCheckpoint, PointsLedgerCheckpoint.user_id == PointsLog.user_id
+    ).filter(
+        PointsLog.id > func.coalesce(PointsLedgerCheckpoint.last_log_id, 0)
+    ).group_by(PointsLog.user_id).subquery()
+
+    ledger_total = func.coalesce(PointsLedgerCheckpoint.balance, 0) + func.coalesce(tail.c.points, 0)
+    rows = db.query(
+        User.id, User.name, User.total_points, ledger_total.label("ledger_total")
+    ).outerjoin(
+        PointsLedgerCheckpoint, PointsLedgerCheckpoint.user_id == User.id
+    ).outerjoin(
+        tail, tail.c.user_id == User.id
+    ).all()
+
+    mismatches = [
+        {
+            "user_id": row.id,
+            "name": row.name,
+            "total_points_from_user": row.total_points or 0,
+            "total_points_from_logs": int(row.ledger_total or 0),
+            "difference": (row.total_points or 0) - int(row.ledger_total or 0)
+        }
+        for row in rows
+        if (row.total_points or 0) != int(row.ledger_total or 0)
+    ]
+
+    advanced = 0
+    if advance_checkpoints:
+        advanced = _advance_all_checkpoints(db)
+
+    return {"checked_users": len(rows), "mismatches": mismatches, "checkpoints_advanced": advanced}
+
+
+def _advance_all_checkpoints(db: Session) -> int:
+    """Fold every user's settled tail into their checkpoint with one aggregate query. Commits."""
+    settled_before = get_ist_now().replace(tzinfo=None) - timedelta(seconds=CHECKPOINT_SETTLE_SECONDS)
+    tails = db.query(
+        PointsLog.user_id,
+        func.sum(PointsLog.points),
+        func.count(PointsLog.id),
+        func.max(PointsLog.id)
+    ).outerjoin(
+        PointsLedgerCheckpoint, PointsLedgerCheckpoint.user_id == PointsLog.user_id
+    ).filter(
+        PointsLog.id > func.coalesce(PointsLedgerCheckpoint.last_log_id, 0),
+        PointsLog.created_at < settled_before
+    ).group_by(PointsLog.user_id).all()
+    if not tails:
+        return 0
+
+    try:
+        checkpoints = {
+            checkpoint.user_id: checkpoint
+            for checkpoint in db.query(PointsLedgerCheckpoint).filter(
+                PointsLedgerCheckpoint.user_id.in_([user_id for user_id, *_ in tails])
+            )
+        }
+        updated_at = get_ist_now().replace(tzinfo=None)
+        for user_id, points, count, max_id in tails:
+            checkpoint = checkpoints.get(user_id)
+            if checkpoint is None:
+                checkpoint = PointsLedgerCheckpoint(user_id=user_id, last_log_id=0, balance=0, entry_count=0)
+                db.add(checkpoint)
+            checkpoint.balance += int(points or 0)
+            checkpoint.entry_count += int(count)
+            checkpoint.last_log_id = int(max_id)
+            checkpoint.updated_at = updated_at
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"❌ [POINTS] Error advancing ledger checkpoints: {e}")
+        raise
+    return len(tails)
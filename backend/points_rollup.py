@@ -0,0 +1,136 @@
+"""
+Weekly and monthly points rollup (`points_period_rollup`).
+
+log_points adds every ledger entry to the user's current week and month rows
+in the same transaction, so weekly/monthly leaderboards and monthly badges
+read pre-aggregated totals that include every points source (sessions,
+papers, login and streak bonuses, admin adjustments) instead of re-summing
+history.
+"""
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import desc, func, select
+from sqlalchemy.orm import Session
+
+from models import PointsLog, PointsPeriodRollup, User
+from timezone_utils import get_ist_now
+from upsert_utils import increment_upsert
+
+PERIOD_WEEK = "week"
+PERIOD_MONTH = "month"
+
+
+def week_start(day: date) -> date:
+    """Monday of the IST week containing `day`."""
+    return day - timedelta(days=day.weekday())
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def period_starts(day: date) -> Dict[str, date]:
+    return {PERIOD_WEEK: week_start(day), PERIOD_MONTH: month_start(day)}
+
+
+def record_points(db: Session, user_id: int, points: int, day: Optional[date] = None) -> None:
+    """Add a ledger entry to the user's week and month rows. Runs in the caller's transaction."""
+    if not points:
+        return
+    day = day or get_ist_now().date()
+    for period_type, start in period_starts(day).items():
+        increment_upsert(
+            db,
+            PointsPeriodRollup,
+            key={"user_id": user_id, "period_type": period_type, "period_start": start},
+            counters={"points": points}
+        )
+
+
+def get_period_points(db: Session, user_id: int, period_type: str, start: date) -> int:
+    points = db.query(PointsPeriodRollup.points).filter(
+        PointsPeriodRollup.user_id == user_id,
+        PointsPeriodRollup.period_type == period_type,
+        PointsPeriodRollup.period_start == start
+    ).scalar()
+    return points or 0
+
+
+def get_period_points_for_users(db: Session, user_ids, period_type: str, start: date) -> Dict[int, int]:
+    """{user_id: points} for one period, for several users in one query."""
+    return dict(db.query(PointsPeriodRollup.user_id, PointsPeriodRollup.points).filter(
+        PointsPeriodRollup.user_id.in_(list(user_ids)),
+        PointsPeriodRollup.period_type == period_type,
+        PointsPeriodRollup.period_start == start
+    ).all())
+
+
+def period_points_subquery(period_type: str, start: date, user_id_column):
+    """Correlated scalar expression: the period's points for user_id_column (0 if none)."""
+    return func.coalesce(
+        select(PointsPeriodRollup.points).where(
+            PointsPeriodRollup.user_id == user_id_column,
+            PointsPeriodRollup.period_type == period_type,
+            PointsPeriodRollup.period_start == start
+        ).scalar_subquery(),
+        0
+    )
+
+
+def get_top_students(db: Session, period_type: str, start: date, limit: int) -> List[Tuple[int, int]]:
+    """[(user_id, points)] of the highest-scoring students for a period, ties by user id."""
+    return db.query(PointsPeriodRollup.user_id, PointsPeriodRollup.points).join(
+        User, User.id == PointsPeriodRollup.user_id
+    ).filter(
+        PointsPeriodRollup.period_type == period_type,
+        PointsPeriodRollup.period_start == start,
+        PointsPeriodRollup.points > 0,
+        User.role == "student"
+    ).order_by(
+        desc(PointsPeriodRollup.points), PointsPeriodRollup.user_id
+    ).limit(limit).all()
+
+
+def rebuild_points_rollup(db: Session, user_id: Optional[int] = None) -> int:
+    """
+    Recompute the rollup from the full PointsLog history (backfill / repair).
+    Commits. Returns the number of rows written.
+    """
+    totals: Dict[Tuple[int, str, date], int] = {}
+    query = db.query(PointsLog.user_id, PointsLog.created_at, PointsLog.points)
+    if user_id is not None:
+        query = query.filter(PointsLog.user_id == user_id)
+    for uid, created_at, points in query:
+        if not points or created_at is None:
+            continue
+        for period_type, start in period_starts(created_at.date()).items():
+            key = (uid, period_type, start)
+            totals[key] = totals.get(key, 0) + points
+
+    try:
+        delete_query = db.query(PointsPeriodRollup)
+        if user_id is not None:
+            delete_query = delete_query.filter(PointsPeriodRollup.user_id == user_id)
+        delete_query.delete(synchronize_session=False)
+        db.add_all([
+            PointsPeriodRollup(user_id=uid, period_type=period_type, period_start=start, points=points)
+            for (uid, period_type, start), points in totals.items()
+        ])
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"❌ [POINTS_ROLLUP] Error rebuilding rollup: {e}")
+        raise
+
+    print(f"✅ [POINTS_ROLLUP] Rebuilt {len(totals)} period rows")
+    return len(totals)
+
+
+def backfill_if_empty(db: Session) -> int:
+    """Build the rollup from the ledger the first time the app starts with an empty table."""
+    if db.query(PointsPeriodRollup.user_id).first() is not None:
+        return 0
+    if db.query(PointsLog.id).first() is None:
+        return 0
+    return rebuild_points_rollup(db)
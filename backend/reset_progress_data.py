@@ -2,7 +2,7 @@
 Database Reset Script - Resets all user progress data
 This script will:
 - Reset all user points, streaks, and stats to 0
-- Delete all practice sessions and attempts
+- Delete all practice sessions and attempts (rows and packed records)
 - Delete all paper attempts
 - Delete all badges/rewards
 - Reset leaderboard entries
@@ -21,7 +21,7 @@ import sys
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 from models import (
-    User, PracticeSession, Attempt, PaperAttempt, Reward, Leaderboard,
+    User, PracticeSession, Attempt, PracticeSessionAttemptPack, QuestionTemplate, UserDailyActivity, UserStats, PointsPeriodRollup, PaperAttempt, Reward, Leaderboard,
     SessionLocal, engine
 )
 from dotenv import load_dotenv
@@ -41,6 +41,10 @@ def reset_all_progress_data():
         print("\n1️⃣ Deleting all attempts...")
         deleted_attempts = db.query(Attempt).delete()
         print(f"   ✅ Deleted {deleted_attempts} attempts")
+        deleted_packs = db.query(PracticeSessionAttemptPack).delete()
+        print(f"   ✅ Deleted {deleted_packs} packed attempt records")
+        deleted_templates = db.query(QuestionTemplate).delete()
+        print(f"   ✅ Deleted {deleted_templates} question templates")
         
         # 2. Delete all practice sessions (parent table)
         print("\n2️⃣ Deleting all practice sessions...")
@@ -51,6 +55,12 @@ def reset_all_progress_data():
         print("\n3️⃣ Deleting all paper attempts...")
         deleted_papers = db.query(PaperAttempt).delete()
         print(f"   ✅ Deleted {deleted_papers} paper attempts")
+        deleted_stats = db.query(UserStats).delete()
+        print(f"   ✅ Deleted {deleted_stats} user stats rows")
+        deleted_activity = db.query(UserDailyActivity).delete()
+        print(f"   ✅ Deleted {deleted_activity} daily activity rows")
+        deleted_rollup = db.query(PointsPeriodRollup).delete()
+        print(f"   ✅ Deleted {deleted_rollup} weekly/monthly points rows")
         
         # 4. Delete all rewards/badges
         print("\n4️⃣ Deleting all badges and rewards...")
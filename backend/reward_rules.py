@@ -0,0 +1,315 @@
+"""
+Declarative threshold badge rules.
+
+Every threshold badge is declared once in RULES as (badge_type, badge_name,
+metric, threshold, period, category). A metric is a per-user number with two
+readers: `user_value` for one user, used right after a submission, and
+`source`, a SELECT of (user_id, value) rows over all users for batch runs.
+
+evaluate_user checks only the rules whose metrics the submission changed and
+awards them through badge_awards. evaluate_batch compiles each rule into a
+single INSERT ... SELECT ... WHERE value >= threshold, so catching up every
+user costs one statement per rule. Badges already held are skipped by the
+unique reward index. MONTH rules (attendance, T-shirt, monthly streak) are
+evaluated in batch for a finished month by monthly_badge_evaluation.py.
+
+Milestone rules (the SUPER journey) also drive the progress bar in the reward
+summary through super_progress().
+"""
+from bisect import bisect_right
+from datetime import date, datetime
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import Boolean, DateTime, String, and_, case, func, literal, select
+from sqlalchemy.orm import Session
+
+from badge_awards import OwnedBadges, award_badges, badge
+from models import AttendanceRecord, ClassSession, Reward, StudentProfile, User, UserDailyActivity, UserStats
+from timezone_utils import get_ist_now
+
+LIFETIME = "lifetime"
+MONTH = "month"
+
+TOTAL_POINTS = "total_points"
+QUESTIONS_ATTEMPTED = "questions_attempted"
+MONTH_ATTENDANCE_RATE = "month_attendance_rate"
+MONTH_TSHIRT_RATE = "month_tshirt_rate"
+MONTH_PRACTICE_DAYS_RATE = "month_practice_days_rate"
+
+
+class Metric(NamedTuple):
+    # (db, user, month start or None) -> value for one user
+    user_value: Callable[[Session, User, Optional[date]], float]
+    # month start or None -> select() of (user_id, value) rows
+    source: Callable[[Optional[date]], object]
+
+
+class RewardRule(NamedTuple):
+    badge_type: str
+    badge_name: str
+    metric: str
+    threshold: float
+    period: str = LIFETIME  # LIFETIME badges are earned once, MONTH badges once per month
+    category: str = "general"
+    is_lifetime: bool = False
+    milestone: Optional[str] = None  # Milestone type shown in the SUPER progress bar
+
+
+def _questions_attempted(db: Session, user: User, month: Optional[date]) -> int:
+    from student_stats import get_user_stats, questions_attempted
+    return questions_attempted(get_user_stats(db, user.id))
+
+
+def _month_window(month: date) -> Tuple[datetime, datetime]:
+    """[first day of month, first day of next month) as naive IST datetimes."""
+    start = datetime(month.year, month.month, 1)
+    end = datetime(month.year + 1, 1, 1) if month.month == 12 else datetime(month.year, month.month + 1, 1)
+    return start, end
+
+
+def _class_rate(mark_column: str) -> Callable[[date], object]:
+    """
+    Source for a monthly class metric: per active student, the percentage of
+    their branch's class sessions in the month with `mark_column` set
+    ("present" or "t_shirts"). Sessions are counted once per branch and marks
+    once per student, so the whole month is one grouped query.
+    """
+    def source(month: date):
+        start, end = _month_window(month)
+        in_month = and_(ClassSession.session_date >= start, ClassSession.session_date < end)
+        branch_sessions = select(
+            ClassSession.branch, func.count(ClassSession.id).label("sessions")
+        ).where(in_month).group_by(ClassSession.branch).subquery()
+        marks = select(
+            AttendanceRecord.student_profile_id,
+            func.sum(case((AttendanceRecord.status == "present", 1), else_=0)).label("present"),
+            func.sum(case((AttendanceRecord.t_shirt_worn == True, 1), else_=0)).label("t_shirts"),
+        ).join(
+            ClassSession, ClassSession.id == AttendanceRecord.session_id
+        ).join(
+            StudentProfile, StudentProfile.id == AttendanceRecord.student_profile_id
+        ).where(
+            in_month, ClassSession.branch == StudentProfile.branch
+        ).group_by(AttendanceRecord.student_profile_id).subquery()
+
+        marked = func.coalesce(getattr(marks.c, mark_column), 0)
+        return select(
+            StudentProfile.user_id.label("user_id"),
+            (marked * 100.0 / branch_sessions.c.sessions).label("value"),
+        ).join(
+            branch_sessions, branch_sessions.c.branch == StudentProfile.branch
+        ).outerjoin(
+            marks, marks.c.student_profile_id == StudentProfile.id
+        ).where(StudentProfile.status == "active")
+    return source
+
+
+def _practice_days_rate(month: date):
+    """Per user: % of the month's days with at least one mental-math session."""
+    start, end = _month_window(month)
+    days_in_month = (end - start).days
+    return select(
+        UserDailyActivity.user_id.label("user_id"),
+        (func.count(UserDailyActivity.ist_date) * 100.0 / days_in_month).label("value"),
+    ).where(
+        UserDailyActivity.ist_date >= start.date(),
+        UserDailyActivity.ist_date < end.date(),
+        UserDailyActivity.sessions > 0
+    ).group_by(UserDailyActivity.user_id)
+
+
+def _from_source(source: Callable[[Optional[date]], object]):
+    """user_value reader that filters a batch source down to one user."""
+    def user_value(db: Session, user: User, month: Optional[date]) -> float:
+        rows = source(month).subquery()
+        return db.execute(select(rows.c.value).where(rows.c.user_id == user.id)).scalar() or 0
+    return user_value
+
+
+METRICS: Dict[str, Metric] = {
+    TOTAL_POINTS: Metric(
+        user_value=lambda db, user, month: user.total_points or 0,
+        source=lambda month: select(User.id.label("user_id"), User.total_points.label("value")),
+    ),
+    # Answered questions (correct + wrong) across mental math and papers, from user_stats
+    QUESTIONS_ATTEMPTED: Metric(
+        user_value=_questions_attempted,
+        source=lambda month: select(
+            UserStats.user_id.label("user_id"),
+            (UserStats.mental_correct + UserStats.mental_wrong
+             + UserStats.paper_correct + UserStats.paper_wrong).label("value"),
+        ),
+    ),
+    # % of the branch's class sessions in the month the student attended / wore the T-shirt to
+    MONTH_ATTENDANCE_RATE: Metric(user_value=_from_source(_class_rate("present")), source=_class_rate("present")),
+    MONTH_TSHIRT_RATE: Metric(user_value=_from_source(_class_rate("t_shirts")), source=_class_rate("t_shirts")),
+    MONTH_PRACTICE_DAYS_RATE: Metric(user_value=_from_source(_practice_days_rate), source=_practice_days_rate),
+}
+
+
+# SUPER journey thresholds from reward_system.md
+CHOCOLATE_MILESTONES = (1500, 4500, 7500, 10500, 13500, 16500, 19500)
+SUPER_LETTERS = ((3000, "S"), (6000, "U"), (9000, "P"), (12000, "E"), (15000, "R"))
+
+RULES = (
+    # Lifetime volume badges
+    RewardRule("bronze_mind", "🥉 Bronze Mind", QUESTIONS_ATTEMPTED, 500, category="lifetime", is_lifetime=True),
+    RewardRule("silver_mind", "🥈 Silver Mind", QUESTIONS_ATTEMPTED, 2000, category="lifetime", is_lifetime=True),
+    RewardRule("gold_mind", "🥇 Gold Mind", QUESTIONS_ATTEMPTED, 5000, category="lifetime", is_lifetime=True),
+    # Physical rewards
+    *(
+        RewardRule(f"chocolate_{points}", f"Chocolate 🍫 ({points} pts)", TOTAL_POINTS, points,
+                   category="super", milestone="chocolate")
+        for points in CHOCOLATE_MILESTONES
+    ),
+    # SUPER letters
+    *(
+        RewardRule(f"super_{letter.lower()}", f"SUPER Badge - {letter}", TOTAL_POINTS, points,
+                   category="super", milestone=f"letter_{letter}")
+        for points, letter in SUPER_LETTERS
+    ),
+    # Special rewards
+    RewardRule("mystery_gift", "Mystery Gift 🎁", TOTAL_POINTS, 18000, category="super", milestone="mystery_gift"),
+    RewardRule("party", "Party 🎉", TOTAL_POINTS, 21000, category="super", milestone="party"),
+    # Monthly class badges: every class of the month attended / with the T-shirt
+    RewardRule("attendance_champion", "⭐ Attendance Champion", MONTH_ATTENDANCE_RATE, 100,
+               period=MONTH, category="attendance"),
+    RewardRule("gold_tshirt_star", "🌟🌟 Gold T-Shirt Star", MONTH_TSHIRT_RATE, 100,
+               period=MONTH, category="attendance"),
+    # Full calendar month without a break
+    RewardRule("monthly_streak", "Monthly Streak Champion", MONTH_PRACTICE_DAYS_RATE, 100,
+               period=MONTH, category="monthly"),
+)
+
+
+def _month_earned(rule: RewardRule, month: Optional[date]) -> Optional[str]:
+    return f"{month.year}-{month.month:02d}" if rule.period == MONTH else None
+
+
+def _candidate(rule: RewardRule, month: Optional[date]) -> dict:
+    return badge(rule.badge_type, rule.badge_name, rule.category, rule.is_lifetime, _month_earned(rule, month))
+
+
+def rule_candidate(badge_type: str, month: Optional[date] = None) -> dict:
+    """award_badges candidate for a declared rule, for callers that already checked its condition."""
+    rule = next(rule for rule in RULES if rule.badge_type == badge_type)
+    return _candidate(rule, month)
+
+
+def rules_for(metrics: Optional[Iterable[str]] = None, period: str = LIFETIME) -> List[RewardRule]:
+    """Rules of one period, optionally limited to those reading `metrics`."""
+    metrics = None if metrics is None else set(metrics)
+    return [rule for rule in RULES if rule.period == period and (metrics is None or rule.metric in metrics)]
+
+
+def milestones() -> List[RewardRule]:
+    """Milestone rules in declaration order (chocolates, letters, specials)."""
+    return [rule for rule in RULES if rule.milestone]
+
+
+# SUPER progress tables, sorted by threshold once at import and searched with bisect
+_MILESTONE_TABLE = sorted(milestones(), key=lambda rule: rule.threshold)
+_MILESTONE_THRESHOLDS = [rule.threshold for rule in _MILESTONE_TABLE]
+_LETTER_TABLE = [rule for rule in _MILESTONE_TABLE if rule.milestone.startswith("letter_")]
+_LETTER_THRESHOLDS = [rule.threshold for rule in _LETTER_TABLE]
+
+
+def super_progress(points: int) -> dict:
+    """
+    SUPER journey position for a points total: current letter, next
+    milestone (the last one once everything is unlocked), progress % towards
+    it and unlocked reward names in threshold order.
+    """
+    unlocked = bisect_right(_MILESTONE_THRESHOLDS, points)
+    letters = bisect_right(_LETTER_THRESHOLDS, points)
+    next_rule = _MILESTONE_TABLE[min(unlocked, len(_MILESTONE_TABLE) - 1)]
+    progress = points / next_rule.threshold * 100 if next_rule.threshold > 0 else 0
+    return {
+        "current_letter": _LETTER_TABLE[letters - 1].milestone[len("letter_"):] if letters else None,
+        "next_milestone": next_rule.threshold,
+        "next_milestone_type": next_rule.milestone,
+        "progress_percentage": round(min(100, max(0, progress)), 2),
+        "unlocked_rewards": [rule.badge_name for rule in _MILESTONE_TABLE[:unlocked]],
+    }
+
+
+def evaluate_user(
+    db: Session,
+    user: User,
+    changed_metrics: Iterable[str],
+    owned: Optional[OwnedBadges] = None,
+    period: str = LIFETIME,
+    month: Optional[date] = None
+) -> List[str]:
+    """
+    Award the badges `user` now qualifies for among the rules reading
+    `changed_metrics`. Each metric is read once. Returns the new badge names.
+    Runs in the caller's transaction.
+    """
+    rules = rules_for(changed_metrics, period)
+    if not rules:
+        return []
+    values = {metric: METRICS[metric].user_value(db, user, month) for metric in {rule.metric for rule in rules}}
+    return award_badges(db, user.id, [
+        _candidate(rule, month) for rule in rules if values[rule.metric] >= rule.threshold
+    ], owned)
+
+
+def evaluate_batch(
+    db: Session,
+    period: str = LIFETIME,
+    month: Optional[date] = None,
+    metrics: Optional[Iterable[str]] = None
+) -> Dict[str, int]:
+    """
+    Evaluate the rules of `period` (optionally only those reading `metrics`)
+    for all users, one INSERT ... SELECT per rule. MONTH rules need `month`,
+    the first day of the month. Returns {badge_type: newly awarded count}.
+    Runs in the caller's transaction.
+    """
+    if period == MONTH and month is None:
+        raise ValueError("month is required for monthly rules")
+
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        insert = None
+
+    earned_at = get_ist_now()
+    awarded: Dict[str, int] = {}
+    for rule in rules_for(metrics, period):
+        source = METRICS[rule.metric].source(month).subquery()
+        if insert is None:
+            # Fallback for dialects without ON CONFLICT: qualifying users through award_badges
+            user_ids = [row.user_id for row in db.execute(
+                select(source.c.user_id).where(source.c.value >= rule.threshold)
+            )]
+            awarded[rule.badge_type] = sum(
+                len(award_badges(db, user_id, [_candidate(rule, month)])) for user_id in user_ids
+            )
+            continue
+
+        qualifying = select(
+            source.c.user_id,
+            literal(rule.badge_type, String),
+            literal(rule.badge_name, String),
+            literal(rule.category, String),
+            literal(rule.is_lifetime, Boolean),
+            literal(_month_earned(rule, month), String),
+            literal(earned_at, DateTime),
+        ).where(source.c.value >= rule.threshold)
+        result = db.execute(insert(Reward).from_select(
+            ["user_id", "badge_type", "badge_name", "badge_category", "is_lifetime", "month_earned", "earned_at"],
+            qualifying
+        ).on_conflict_do_nothing())
+        awarded[rule.badge_type] = max(result.rowcount or 0, 0)
+
+    total = sum(awarded.values())
+    if total:
+        from stats_cache import invalidate_on_commit, reward_summary_cache
+        invalidate_on_commit(db, reward_summary_cache)
+        print(f"✅ [REWARD_RULES] Awarded {total} {period} badges in batch")
+    return awarded
@@ -0,0 +1,118 @@
+"""
+Short-lived cache for the admin dashboard statistics.
+
+Several admins keep the dashboard open and refreshing during class hours.
+Each statistics block ("admin_stats", "database_stats") is computed in a
+single round trip - every COUNT/SUM/AVG is a scalar subquery of one SELECT -
+and cached for STATS_CACHE_TTL_SECONDS. Account creation, deletion, role
+changes and progress resets call invalidate(); practice submissions arrive
+many times a minute during class, so they are left to the TTL rather than
+emptying the cache on every request. Hit rates are reported by status().
+
+reward_summary_cache holds each student's /users/rewards/summary, keyed by
+user id. Writers that change points, badges, streaks or attendance call
+invalidate_on_commit, which drops the entry only once their transaction has
+committed - invalidating earlier would let a concurrent reader re-cache the
+pre-commit state.
+"""
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+
+STATS_CACHE_TTL_SECONDS = float(os.getenv("STATS_CACHE_TTL_SECONDS", "30"))
+REWARD_SUMMARY_TTL_SECONDS = float(os.getenv("REWARD_SUMMARY_TTL_SECONDS", "300"))
+
+_PENDING_INVALIDATIONS = "pending_cache_invalidations"
+
+
+def count_all(db: Session, expressions: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Evaluate several scalar selects in one round trip.
+    `expressions` maps a name to a select() returning one value (e.g. a COUNT).
+    """
+    row = db.execute(select(*[
+        expression.scalar_subquery().label(name) for name, expression in expressions.items()
+    ])).one()
+    return dict(row._mapping)
+
+
+def count_rows(model, *criteria):
+    """select(COUNT(*)) FROM model WHERE criteria, for count_all."""
+    return select(func.count()).select_from(model).where(*criteria)
+
+
+class StatsCache:
+    """Named cached values with a TTL, explicit invalidation and per-key hit counts."""
+
+    def __init__(self, ttl_seconds: float = STATS_CACHE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._values: Dict[str, Tuple[float, Any]] = {}
+        self._version = 0
+        self._hits: Dict[str, int] = {}
+        self._misses: Dict[str, int] = {}
+
+    def get(self, key: str, compute: Callable[[], Any]) -> Any:
+        """The cached value for key, or compute() it and cache the result."""
+        with self._lock:
+            cached = self._values.get(key)
+            if cached and time.monotonic() - cached[0] < self.ttl_seconds:
+                self._hits[key] = self._hits.get(key, 0) + 1
+                return cached[1]
+            self._misses[key] = self._misses.get(key, 0) + 1
+            version = self._version
+
+        value = compute()
+
+        with self._lock:
+            # Don't cache a value computed from data that was invalidated meanwhile
+            if version == self._version:
+                self._values[key] = (time.monotonic(), value)
+        return value
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        """Drop one key, or everything when key is None."""
+        with self._lock:
+            self._version += 1
+            if key is None:
+                self._values.clear()
+            else:
+                self._values.pop(key, None)
+
+    def status(self) -> dict:
+        with self._lock:
+            keys = sorted(set(self._hits) | set(self._misses))
+            per_key = {}
+            for key in keys:
+                hits, misses = self._hits.get(key, 0), self._misses.get(key, 0)
+                per_key[key] = {
+                    "hits": hits,
+                    "misses": misses,
+                    "hit_rate": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+                    "cached": key in self._values,
+                }
+            return {"ttl_seconds": self.ttl_seconds, "keys": per_key}
+
+
+stats_cache = StatsCache()
+reward_summary_cache = StatsCache(REWARD_SUMMARY_TTL_SECONDS)
+
+
+def invalidate_on_commit(db: Session, cache: StatsCache, key: Optional[Any] = None) -> None:
+    """Invalidate `key` (everything when None) once db's transaction commits; dropped on rollback."""
+    db.info.setdefault(_PENDING_INVALIDATIONS, set()).add((cache, key))
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending_invalidations(session: Session) -> None:
+    for cache, key in session.info.pop(_PENDING_INVALIDATIONS, ()):
+        cache.invalidate(key)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_pending_invalidations(session: Session) -> None:
+    session.info.pop(_PENDING_INVALIDATIONS, None)
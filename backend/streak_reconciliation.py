@@ -0,0 +1,393 @@
+"""
+Nightly streak reconciliation.
+
+Submissions only mark today as met: once the day's streak questions reach
+DAILY_QUESTION_REQUIREMENT, mark_day_met extends the streak by one and
+records today as the user's streak_date (user_streaks). Everything that
+depends on a day being over runs here once per IST day, shortly after
+midnight: resetting the streaks of students who didn't practise, keeping
+them for a grace skip redeemed that day, and the 7/14/21-day and full-month
+bonuses. It is one pass over the streak-course students joined to the
+finished day's daily activity rows, with bulk updates.
+
+A streak_runs row is written in the same transaction as the changes, so
+reconciling a day twice (several app workers, a manual re-run, the startup
+catch-up) changes nothing the second time. The catch-up reconciles every day
+since the last run, oldest first, and a day reconciled late still pays the
+bonus for the streak length the user had on that day. Submissions just after
+midnight can count the next day while a run is in progress; the run's writes
+are conditional on the streak it read, so it never undoes them.
+"""
+import os
+import threading
+from calendar import monthrange
+from datetime import date, datetime, timedelta
+from datetime import time as day_time
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy import and_, bindparam, case, exists, func, or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from daily_activity import DAILY_QUESTION_REQUIREMENT
+from models import SessionLocal, StreakRun, StudentProfile, User, UserDailyActivity, UserStreak
+from timezone_utils import IST_TIMEZONE, get_ist_now
+from upsert_utils import advance_upsert
+
+# Course -> daily activity column counted towards its streak
+STREAK_COURSES = {
+    "Abacus": UserDailyActivity.mental_math_questions,
+    "Vedic Maths": UserDailyActivity.paper_questions,
+}
+# Bonus points when a streak reaches these lengths
+STREAK_BONUSES = {7: 50, 14: 100, 21: 200}
+# Bonus points (plus the Monthly Streak Champion badge) for a full calendar month without a break
+MONTHLY_STREAK_BONUS = 500
+
+# Most days the startup catch-up reconciles when the app was down for several nights
+STREAK_CATCH_UP_DAYS = int(os.getenv("STREAK_CATCH_UP_DAYS", "31"))
+STREAK_RECONCILE_ENABLED = os.getenv("STREAK_RECONCILE_ENABLED", "true").lower() == "true"
+# Seconds after IST midnight the nightly run starts, so submissions from the old day have committed
+STREAK_RECONCILE_DELAY_SECONDS = float(os.getenv("STREAK_RECONCILE_DELAY_SECONDS", "120"))
+
+
+def mark_day_met(db: Session, user: User, day: date) -> bool:
+    """
+    Count `day` in the user's streak (the caller has checked the requirement).
+    Continues the streak if the previous counted day was the day before,
+    otherwise starts a new one. Returns False if the day was already counted.
+    Runs in the caller's transaction.
+    """
+    state = db.get(UserStreak, user.id)
+    if state is not None and state.streak_date >= day:
+        return False
+
+    continuing = state is not None and state.streak_date == day - timedelta(days=1)
+    user.current_streak = (user.current_streak or 0) + 1 if continuing else 1
+    if user.current_streak > (user.longest_streak or 0):
+        user.longest_streak = user.current_streak
+
+    if state is None:
+        db.add(UserStreak(user_id=user.id, streak_date=day))
+    else:
+        state.streak_date = day
+    return True
+
+
+def _run_summary(run: StreakRun, already_ran: bool) -> dict:
+    return {
+        "date": run.run_date.isoformat(),
+        "already_ran": already_ran,
+        "users_changed": run.users_changed,
+        "streaks_advanced": run.streaks_advanced,
+        "streaks_reset": run.streaks_reset,
+        "grace_preserved": run.grace_preserved,
+        "bonuses_awarded": run.bonuses_awarded,
+    }
+
+
+def reconcile_streaks(db: Session, day: date) -> dict:
+    """
+    Close IST day `day` for every streak-course student (commits):
+    - met the requirement but not yet counted -> streak advanced
+    - missed it with a grace skip redeemed that day -> streak kept
+    - missed it otherwise -> streak reset to 0
+    then award streak bonuses for streaks that reached a milestone on `day`.
+    Returns the run's counts; "already_ran" is True if `day` was done before.
+    """
+    existing = db.get(StreakRun, day)
+    if existing is not None:
+        return _run_summary(existing, already_ran=True)
+
+    run = StreakRun(run_date=day, users_changed=0, streaks_advanced=0, streaks_reset=0,
+                    grace_preserved=0, bonuses_awarded=0)
+    db.add(run)
+    try:
+        db.flush()  # Claims the day; a concurrent run for the same day fails here
+    except IntegrityError:
+        db.rollback()
+        return _run_summary(db.get(StreakRun, day), already_ran=True)
+
+    yesterday = day - timedelta(days=1)
+    streak_questions = func.coalesce(case(
+        *[(StudentProfile.course == course, column) for course, column in STREAK_COURSES.items()],
+        else_=0
+    ), 0)
+    rows = db.query(
+        User.id,
+        User.current_streak,
+        User.longest_streak,
+        User.last_grace_skip_date,
+        UserStreak.streak_date,
+        streak_questions.label("questions")
+    ).join(
+        StudentProfile, StudentProfile.user_id == User.id
+    ).outerjoin(
+        UserStreak, UserStreak.user_id == User.id
+    ).outerjoin(
+        UserDailyActivity, and_(UserDailyActivity.user_id == User.id, UserDailyActivity.ist_date == day)
+    ).filter(
+        StudentProfile.course.in_(list(STREAK_COURSES)),
+        or_(User.current_streak > 0, streak_questions >= DAILY_QUESTION_REQUIREMENT)
+    ).all()
+
+    streak_updates: List[dict] = []
+    counted_days: Dict[int, date] = {}
+    closed_streaks: Dict[int, int] = {}  # user -> streak length `day` closes with, for the bonuses
+    advanced, reset, graced = set(), set(), set()
+    days_in_month = monthrange(day.year, day.month)[1]
+    month_ends = day.day == days_in_month
+
+    for row in rows:
+        met = row.questions >= DAILY_QUESTION_REQUIREMENT
+        streak = row.current_streak or 0
+        streak_date = row.streak_date
+
+        if streak_date is None or streak_date < day:
+            if met:
+                # Met the requirement but no submission counted it (e.g. activity repaired later)
+                streak = streak + 1 if streak_date == yesterday else 1
+                streak_updates.append({"b_id": row.id, "b_old": row.current_streak or 0, "b_streak": streak,
+                                       "b_longest": max(row.longest_streak or 0, streak)})
+                counted_days[row.id] = day
+                advanced.add(row.id)
+            elif row.last_grace_skip_date is not None and row.last_grace_skip_date.date() == day:
+                counted_days[row.id] = day
+                graced.add(row.id)
+                continue
+            else:
+                streak_updates.append({"b_id": row.id, "b_old": row.current_streak or 0, "b_streak": 0,
+                                       "b_longest": row.longest_streak or 0})
+                reset.add(row.id)
+                continue
+        elif not met:
+            # Counted through a grace skip, or missed before the current streak started
+            continue
+        else:
+            # Counted already, possibly with later days on top (late or re-run reconciliation):
+            # the unbroken run ending on streak_date was this long on `day`
+            streak -= (streak_date - day).days
+            if streak < 1:
+                continue  # The current streak started after `day`
+        closed_streaks[row.id] = streak
+
+    try:
+        # Submissions just after midnight can count day + 1 while this runs, so
+        # every write is conditional on the state read above; users whose
+        # streak moved on in between are left as the submission wrote them
+        skipped = _write_streaks(db, day, streak_updates, counted_days)
+        advanced -= skipped
+        reset -= skipped
+        graced -= skipped
+        run.streaks_advanced, run.streaks_reset, run.grace_preserved = len(advanced), len(reset), len(graced)
+
+        # `day` was met and closes the streak at `streak` days
+        bonuses: Dict[int, List[tuple]] = {}
+        for user_id, streak in closed_streaks.items():
+            if user_id in skipped:
+                continue
+            if streak in STREAK_BONUSES:
+                bonuses.setdefault(user_id, []).append((STREAK_BONUSES[streak], f"{streak}-day streak bonus", "milestone", streak))
+            if month_ends and streak >= days_in_month:
+                bonuses.setdefault(user_id, []).append(
+                    (MONTHLY_STREAK_BONUS, "Monthly streak bonus (full calendar month)", "monthly", streak)
+                )
+        if bonuses:
+            _award_bonuses(db, bonuses, day)
+
+        changed = advanced | reset | graced | set(bonuses)
+        run.users_changed = len(changed)
+        run.bonuses_awarded = sum(len(user_bonuses) for user_bonuses in bonuses.values())
+        run.finished_at = get_ist_now().replace(tzinfo=None)
+
+        from stats_cache import invalidate_on_commit, reward_summary_cache
+        for user_id in changed:
+            invalidate_on_commit(db, reward_summary_cache, user_id)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"❌ [STREAKS] Reconciliation for {day} failed: {e}")
+        raise
+
+    if changed:
+        from leaderboard_refresher import leaderboard_refresher
+        for user_id in changed:
+            leaderboard_refresher.mark_dirty(user_id)
+
+    summary = _run_summary(run, already_ran=False)
+    print(
+        f"✅ [STREAKS] Reconciled {day}: {run.users_changed} users changed "
+        f"({run.streaks_advanced} advanced, {run.streaks_reset} reset, {run.grace_preserved} grace), "
+        f"{run.bonuses_awarded} bonuses"
+    )
+    return summary
+
+
+def _write_streaks(db: Session, day: date, streak_updates: List[dict], counted_days: Dict[int, date]) -> Set[int]:
+    """
+    Apply the streak changes for `day` only where the user's streak is still
+    as it was read: current_streak unchanged and no streak_date past `day`.
+    A streak_date is only ever moved forward. Returns the users that were
+    skipped because a concurrent submission changed their streak.
+    """
+    users = User.__table__
+    if streak_updates:
+        db.execute(
+            update(users).where(
+                users.c.id == bindparam("b_id"),
+                func.coalesce(users.c.current_streak, 0) == bindparam("b_old"),
+                ~exists().where(UserStreak.user_id == users.c.id, UserStreak.streak_date >= day)
+            ).values(current_streak=bindparam("b_streak"), longest_streak=bindparam("b_longest")),
+            streak_updates
+        )
+    advance_upsert(db, UserStreak, ("user_id",), "streak_date", [
+        {"user_id": user_id, "streak_date": counted} for user_id, counted in counted_days.items()
+    ])
+
+    # One read back tells which users kept the state this run wrote
+    targets = {values["b_id"] for values in streak_updates} | set(counted_days)
+    if not targets:
+        return set()
+    state = {
+        user_id: (current_streak or 0, streak_date)
+        for user_id, current_streak, streak_date in db.query(
+            User.id, User.current_streak, UserStreak.streak_date
+        ).outerjoin(UserStreak, UserStreak.user_id == User.id).filter(User.id.in_(list(targets)))
+    }
+    written = {values["b_id"]: values["b_streak"] for values in streak_updates}
+    skipped = set()
+    for user_id in targets:
+        current_streak, streak_date = state.get(user_id, (None, None))
+        if user_id in written and current_streak != written[user_id]:
+            skipped.add(user_id)
+        elif user_id in counted_days and streak_date != day:
+            skipped.add(user_id)
+        elif user_id not in counted_days and streak_date is not None and streak_date > day:
+            skipped.add(user_id)
+    return skipped
+
+
+def reconcile_pending(db: Session, until: Optional[date] = None) -> List[dict]:
+    """
+    Reconcile every day after the last reconciled one up to `until`
+    (default: yesterday), oldest first and at most STREAK_CATCH_UP_DAYS of
+    them, so nights the app was down still get their resets and bonuses.
+    """
+    until = until or get_ist_now().date() - timedelta(days=1)
+    last_run = db.query(func.max(StreakRun.run_date)).scalar()
+    first = last_run + timedelta(days=1) if last_run else until
+    earliest = until - timedelta(days=STREAK_CATCH_UP_DAYS - 1)
+    if first < earliest:
+        print(f"⚠️ [STREAKS] {(earliest - first).days} unreconciled days before {earliest} are past the catch-up limit, skipping them")
+        first = earliest
+    results = []
+    day = first
+    while day <= until:
+        results.append(reconcile_streaks(db, day))
+        day += timedelta(days=1)
+    return results
+
+
+def _award_bonuses(db: Session, bonuses: Dict[int, List[tuple]], day: date) -> None:
+    """Credit streak bonuses through the points ledger and award the monthly streak badge."""
+    from badge_awards import insert_rewards
+    from points_logger import log_points
+    from reward_rules import rule_candidate
+
+    badge_rows = []
+    for user in db.query(User).filter(User.id.in_(list(bonuses))):
+        for points, description, bonus_type, streak_days in bonuses[user.id]:
+            user.total_points += points
+            log_points(
+                db=db,
+                user=user,
+                points=points,
+                source_type="streak_bonus",
+                description=description,
+                extra_data={"streak_days": streak_days, "bonus_type": bonus_type, "streak_date": day.isoformat()}
+            )
+            if bonus_type == "monthly":
+                badge_rows.append({
+                    **rule_candidate("monthly_streak", date(day.year, day.month, 1)),
+                    "user_id": user.id,
+                    "earned_at": get_ist_now(),
+                })
+    insert_rewards(db, badge_rows)
+
+
+def backfill_if_empty(db: Session) -> int:
+    """
+    Seed user_streaks for streaks that predate it (first startup only): a
+    positive current_streak always ended on the last practice day. Returns
+    the number of rows written.
+    """
+    if db.query(UserStreak.user_id).first() is not None:
+        return 0
+    rows = db.query(User.id, User.last_practice_date).filter(
+        User.current_streak > 0, User.last_practice_date.isnot(None)
+    ).all()
+    db.add_all([UserStreak(user_id=user_id, streak_date=last_practice.date()) for user_id, last_practice in rows])
+    db.commit()
+    return len(rows)
+
+
+def seconds_until_next_run(now: Optional[datetime] = None) -> float:
+    """Seconds from `now` (IST) until the next nightly run."""
+    now = now or get_ist_now()
+    next_midnight = datetime.combine(now.date() + timedelta(days=1), day_time.min).replace(tzinfo=IST_TIMEZONE)
+    return max(0.0, (next_midnight - now).total_seconds() + STREAK_RECONCILE_DELAY_SECONDS)
+
+
+class StreakScheduler:
+    """Runs reconcile_streaks for the day that just ended, every night after IST midnight."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        self.last_result: Optional[dict] = None
+
+    def start(self) -> None:
+        """Catch up the days not reconciled yet (e.g. the app was down), then schedule nightly runs."""
+        threading.Thread(target=self._run, name="streak-reconcile-catch-up", daemon=True).start()
+
+    def stop(self) -> None:
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    def _schedule(self) -> None:
+        with self._lock:
+            self._timer = threading.Timer(seconds_until_next_run(), self._run)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _run(self) -> None:
+        db = SessionLocal()
+        try:
+            results = reconcile_pending(db)
+            if results:
+                self.last_result = results[-1]
+        except Exception as e:
+            print(f"❌ [STREAKS] Nightly reconciliation failed: {e}")
+        finally:
+            db.close()
+            self._schedule()
+
+
+streak_scheduler = StreakScheduler()
+
+
+if __name__ == "__main__":
+    import sys
+
+    # python streak_reconciliation.py [YYYY-MM-DD]  (default: every pending day up to yesterday, IST)
+    session = SessionLocal()
+    try:
+        if len(sys.argv) > 1:
+            print(reconcile_streaks(session, date.fromisoformat(sys.argv[1])))
+        else:
+            for result in reconcile_pending(session):
+                print(result)
+    finally:
+        session.close()
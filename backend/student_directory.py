@@ -0,0 +1,67 @@
+"""
+Student directory search for the admin student list and attendance picker.
+
+Both listings read students joined to their profile in one query, page
+server-side and accept a free-text search over name, email, public ID,
+branch and course. Every whitespace-separated term must match at least one
+of those columns (case-insensitive substring). On PostgreSQL the matches are
+backed by pg_trgm GIN indexes on lower(column), created at startup by
+create_search_indexes; SQLite has no trigram indexes, so there the search
+falls back to a LIKE scan over the (small) students table.
+"""
+from typing import Optional
+
+from sqlalchemy import and_, func, or_, text
+
+from models import StudentProfile, User
+
+SEARCH_COLUMNS = (
+    User.name,
+    User.email,
+    StudentProfile.full_name,
+    StudentProfile.public_id,
+    StudentProfile.branch,
+    StudentProfile.course,
+)
+
+# (table, column) pairs given a trigram index on PostgreSQL
+_TRIGRAM_INDEXES = (
+    ("users", "name"),
+    ("users", "email"),
+    ("student_profiles", "full_name"),
+    ("student_profiles", "public_id"),
+    ("student_profiles", "branch"),
+    ("student_profiles", "course"),
+)
+
+
+def _like_pattern(term: str) -> str:
+    escaped = term.lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def search_filter(search: Optional[str]):
+    """SQL condition matching every term of `search`, or None for an empty search."""
+    terms = (search or "").split()
+    if not terms:
+        return None
+    return and_(*[
+        or_(*[func.lower(column).like(_like_pattern(term), escape="\\") for column in SEARCH_COLUMNS])
+        for term in terms
+    ])
+
+
+def create_search_indexes(engine) -> None:
+    """Create pg_trgm indexes for the search columns (PostgreSQL only, best effort)."""
+    if engine.dialect.name != "postgresql":
+        return
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            for table, column in _TRIGRAM_INDEXES:
+                conn.execute(text(
+                    f"CREATE INDEX IF NOT EXISTS idx_trgm_{table}_{column} "
+                    f"ON {table} USING gin (lower({column}) gin_trgm_ops)"
+                ))
+    except Exception as e:
+        print(f"⚠️ [DB] Could not create student search indexes (search will scan): {e}")
@@ -0,0 +1,180 @@
+"""
+Per-user cumulative practice totals (`user_stats`).
+
+Saving a practice session, starting a paper attempt and submitting it each
+add to the user's single user_stats row in the same transaction, so
+/users/stats, the admin student view, the reward summary and lifetime-badge
+checks read one row instead of aggregating history.
+get_history_totals recomputes the same totals from PracticeSession and
+PaperAttempt (one UNION ALL of two COUNT/SUM queries); reconcile_user_stats
+uses the grouped form of it to backfill, repair and report drift.
+"""
+from typing import Dict, List, Optional
+
+from sqlalchemy import func, literal, select, union_all
+from sqlalchemy.orm import Session
+
+from models import PaperAttempt, PracticeSession, UserStats
+from timezone_utils import get_ist_now
+from upsert_utils import increment_upsert
+
+_TOTAL_KEYS = ("sessions", "questions", "correct", "wrong")
+
+# (source, total key) -> user_stats column
+_COLUMNS = {
+    ("mental", "sessions"): "mental_sessions",
+    ("mental", "questions"): "mental_questions",
+    ("mental", "correct"): "mental_correct",
+    ("mental", "wrong"): "mental_wrong",
+    ("paper", "sessions"): "paper_attempts",
+    ("paper", "questions"): "paper_questions",
+    ("paper", "correct"): "paper_correct",
+    ("paper", "wrong"): "paper_wrong",
+}
+
+
+def _empty_totals() -> Dict[str, Dict[str, int]]:
+    return {source: dict.fromkeys(_TOTAL_KEYS, 0) for source in ("mental", "paper")}
+
+
+def _record(db: Session, user_id: int, counters: Dict[str, int]) -> None:
+    increment_upsert(
+        db,
+        UserStats,
+        key={"user_id": user_id},
+        counters=counters,
+        extra={"updated_at": get_ist_now().replace(tzinfo=None)}
+    )
+
+
+def record_practice_session(db: Session, user_id: int, total_questions: int, correct: int, wrong: int) -> None:
+    """Add a saved practice session. Runs in the caller's transaction."""
+    _record(db, user_id, {
+        "mental_sessions": 1,
+        "mental_questions": total_questions or 0,
+        "mental_correct": correct or 0,
+        "mental_wrong": wrong or 0,
+    })
+
+
+def record_paper_started(db: Session, user_id: int, total_questions: int) -> None:
+    """Count a new paper attempt. Runs in the caller's transaction."""
+    _record(db, user_id, {"paper_attempts": 1, "paper_questions": total_questions or 0})
+
+
+def record_paper_scored(db: Session, user_id: int, correct: int, wrong: int) -> None:
+    """Add a submitted paper attempt's results. Runs in the caller's transaction."""
+    _record(db, user_id, {"paper_correct": correct or 0, "paper_wrong": wrong or 0})
+
+
+def get_user_stats(db: Session, user_id: int) -> Dict[str, Dict[str, int]]:
+    """{"mental": {...}, "paper": {...}} sessions/questions/correct/wrong from the user's snapshot row."""
+    row = db.query(UserStats).filter(UserStats.user_id == user_id).first()
+    totals = _empty_totals()
+    if row is not None:
+        for (source, key), column in _COLUMNS.items():
+            totals[source][key] = getattr(row, column) or 0
+    return totals
+
+
+def questions_attempted(totals: Dict[str, Dict[str, int]]) -> int:
+    """Answered questions (correct + wrong) across mental math and papers."""
+    return sum(totals[source]["correct"] + totals[source]["wrong"] for source in ("mental", "paper"))
+
+
+def accuracy(correct: int, questions: int) -> float:
+    """Percentage rounded to 2 places, 0 when there are no questions."""
+    return round(correct / questions * 100, 2) if questions > 0 else 0.0
+
+
+def _source_totals(model):
+    return (
+        func.count(model.id).label("sessions"),
+        func.coalesce(func.sum(model.total_questions), 0).label("questions"),
+        func.coalesce(func.sum(model.correct_answers), 0).label("correct"),
+        func.coalesce(func.sum(model.wrong_answers), 0).label("wrong"),
+    )
+
+
+def get_history_totals(db: Session, user_id: int) -> Dict[str, Dict[str, int]]:
+    """Same shape as get_user_stats, recomputed from the source tables in a single round trip."""
+    mental = select(literal("mental").label("source"), *_source_totals(PracticeSession)).where(
+        PracticeSession.user_id == user_id
+    )
+    paper = select(literal("paper").label("source"), *_source_totals(PaperAttempt)).where(
+        PaperAttempt.user_id == user_id
+    )
+
+    totals = _empty_totals()
+    for row in db.execute(union_all(mental, paper)):
+        totals[row.source] = {key: int(getattr(row, key) or 0) for key in _TOTAL_KEYS}
+    return totals
+
+
+def _all_history_totals(db: Session, user_id: Optional[int] = None) -> Dict[int, Dict[str, int]]:
+    """{user_id: {user_stats column: value}} recomputed from the source tables, grouped per user."""
+    result: Dict[int, Dict[str, int]] = {}
+    for source, model in (("mental", PracticeSession), ("paper", PaperAttempt)):
+        query = db.query(model.user_id, *_source_totals(model)).group_by(model.user_id)
+        if user_id is not None:
+            query = query.filter(model.user_id == user_id)
+        for row in query:
+            columns = result.setdefault(row.user_id, dict.fromkeys(_COLUMNS.values(), 0))
+            for key in _TOTAL_KEYS:
+                columns[_COLUMNS[(source, key)]] = int(getattr(row, key) or 0)
+    return result
+
+
+def reconcile_user_stats(db: Session, user_id: Optional[int] = None, repair: bool = True) -> dict:
+    """
+    Recompute totals from PracticeSession/PaperAttempt and compare them with
+    user_stats. With repair=True, drifted or missing rows are rewritten
+    (commits). Returns {"checked_users", "drifted": [...], "repaired"}.
+    """
+    expected = _all_history_totals(db, user_id)
+    query = db.query(UserStats)
+    if user_id is not None:
+        query = query.filter(UserStats.user_id == user_id)
+    rows = {row.user_id: row for row in query}
+
+    drifted: List[dict] = []
+    for uid in sorted(set(expected) | set(rows)):
+        want = expected.get(uid, dict.fromkeys(_COLUMNS.values(), 0))
+        row = rows.get(uid)
+        have = {column: (getattr(row, column) or 0) if row else 0 for column in _COLUMNS.values()}
+        diff = {column: want[column] - have[column] for column in _COLUMNS.values() if want[column] != have[column]}
+        if diff:
+            drifted.append({"user_id": uid, "missing_row": row is None, "differences": diff})
+
+    repaired = 0
+    if repair and drifted:
+        try:
+            updated_at = get_ist_now().replace(tzinfo=None)
+            for entry in drifted:
+                uid = entry["user_id"]
+                row = rows.get(uid)
+                if row is None:
+                    row = UserStats(user_id=uid)
+                    db.add(row)
+                for column, value in expected.get(uid, dict.fromkeys(_COLUMNS.values(), 0)).items():
+                    setattr(row, column, value)
+                row.updated_at = updated_at
+            db.commit()
+            repaired = len(drifted)
+        except Exception as e:
+            db.rollback()
+            print(f"❌ [USER_STATS] Error repairing stats: {e}")
+            raise
+
+    if drifted:
+        print(f"⚠️ [USER_STATS] {len(drifted)} users drifted{', repaired' if repaired else ''}")
+    return {"checked_users": len(set(expected) | set(rows)), "drifted": drifted, "repaired": repaired}
+
+
+def backfill_if_empty(db: Session) -> int:
+    """Build user_stats from history the first time the app starts with an empty table."""
+    if db.query(UserStats.user_id).first() is not None:
+        return 0
+    if db.query(PracticeSession.id).first() is None and db.query(PaperAttempt.id).first() is None:
+        return 0
+    return reconcile_user_stats(db)["repaired"]
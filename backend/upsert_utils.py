@@ -0,0 +1,119 @@
+"""
+Upserts shared by the rollup tables.
+
+increment_upsert adds to counter columns of the row identified by its key,
+creating the row if needed; replace_upsert writes recounted rows over the
+ones already there; advance_upsert only ever moves a column forward. Each is
+a single INSERT ... ON CONFLICT DO UPDATE on PostgreSQL and SQLite. Other
+dialects fall back to select-then-update.
+"""
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy.orm import Session
+
+
+def _dialect_insert(db: Session):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+        return insert
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+        return insert
+    return None
+
+
+def increment_upsert(
+    db: Session,
+    model,
+    key: Dict[str, Any],
+    counters: Dict[str, int],
+    extra: Optional[Dict[str, Any]] = None
+) -> None:
+    """
+    Add `counters` to the row of `model` identified by `key` (its primary key
+    or a unique index). `extra` columns are set on insert and overwritten on
+    update. Runs inside the caller's transaction - don't commit here.
+    """
+    extra = extra or {}
+    values = {**key, **counters, **extra}
+
+    insert = _dialect_insert(db)
+    if insert is not None:
+        stmt = insert(model).values(**values)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[getattr(model, name) for name in key],
+            set_={
+                **{name: getattr(model, name) + getattr(stmt.excluded, name) for name in counters},
+                **{name: getattr(stmt.excluded, name) for name in extra},
+            }
+        ))
+        return
+
+    # Fallback for dialects without ON CONFLICT
+    row = db.query(model).filter_by(**key).first()
+    if row is None:
+        db.add(model(**values))
+    else:
+        for name, amount in counters.items():
+            setattr(row, name, (getattr(row, name) or 0) + amount)
+        for name, value in extra.items():
+            setattr(row, name, value)
+
+
+def replace_upsert(db: Session, model, key: Sequence[str], rows: List[Dict[str, Any]]) -> None:
+    """
+    Write `rows` (all with the same columns) to `model`, overwriting the
+    non-key columns of rows that already exist for their `key` columns (the
+    primary key or a unique index). Runs inside the caller's transaction.
+    """
+    if not rows:
+        return
+    columns = [name for name in rows[0] if name not in key]
+
+    insert = _dialect_insert(db)
+    if insert is not None:
+        stmt = insert(model).values(rows)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[getattr(model, name) for name in key],
+            set_={name: getattr(stmt.excluded, name) for name in columns}
+        ))
+        return
+
+    # Fallback for dialects without ON CONFLICT
+    for values in rows:
+        row = db.query(model).filter_by(**{name: values[name] for name in key}).first()
+        if row is None:
+            db.add(model(**values))
+        else:
+            for name in columns:
+                setattr(row, name, values[name])
+
+
+def advance_upsert(db: Session, model, key: Sequence[str], column: str, rows: List[Dict[str, Any]]) -> None:
+    """
+    Write `rows` (key columns plus `column`) to `model`, but only move `column`
+    forward: a row that already holds a value >= the new one keeps it, e.g.
+    when a concurrent writer got there first. Runs inside the caller's
+    transaction.
+    """
+    if not rows:
+        return
+
+    insert = _dialect_insert(db)
+    if insert is not None:
+        stmt = insert(model).values(rows)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[getattr(model, name) for name in key],
+            set_={column: getattr(stmt.excluded, column)},
+            where=getattr(model, column) < getattr(stmt.excluded, column)
+        ))
+        return
+
+    # Fallback for dialects without ON CONFLICT
+    for values in rows:
+        row = db.query(model).filter_by(**{name: values[name] for name in key}).first()
+        if row is None:
+            db.add(model(**values))
+        elif getattr(row, column) < values[column]:
+            setattr(row, column, values[column])
@@ -1,21 +1,23 @@
 """API routes for user authentication, progress tracking, and dashboards."""
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks, Query
+from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks, Query, Header, Response
 from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy import func, desc
 from typing import List, Optional
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from timezone_utils import get_ist_now
 
-from models import User, PracticeSession, Attempt, Reward, Leaderboard, PaperAttempt, Paper, StudentProfile, ProfileAuditLog, AttendanceRecord, ClassSession, VacantId, PointsLog, get_db
+from models import User, PracticeSession, Attempt, PracticeSessionAttemptPack, QuestionTemplate, UserDailyActivity, UserStats, PointsPeriodRollup, Reward, Leaderboard, PaperAttempt, Paper, StudentProfile, ProfileAuditLog, AttendanceRecord, ClassSession, VacantId, PointsLog, get_db
 from auth import get_current_user, get_current_admin, verify_google_token, create_access_token
 from user_schemas import (
     LoginRequest, LoginResponse, UserResponse, PracticeSessionCreate,
-    PracticeSessionResponse, StudentStats, LeaderboardEntry, AdminStats,
+    PracticeSessionResponse, StudentStats, LeaderboardEntry, MonthlyLeaderboardEntry, LeaderboardPosition, LeaderboardAroundMeResponse, AdminStats,
     PracticeSessionDetailResponse, AttemptResponse,
     StudentProfileResponse, StudentProfileUpdate, ProfileAuditLogResponse,
     PaperAttemptResponse, PaperAttemptDetailResponse,
     StudentIDInfo, UpdateStudentIDRequest, UpdateStudentIDResponse,
-    RewardSummaryResponse, BadgeResponse, GraceSkipResponse, SuperProgress, PointsLogResponse, PointsSummaryResponse
+    RewardSummaryResponse, BadgeResponse, GraceSkipResponse, SuperProgress, PointsLogResponse, PointsSummaryResponse,
+    LedgerVerificationResponse, UserStatsReconcileResponse
 )
 from student_profile_utils import (
     validate_level, validate_course, validate_branch, validate_status,
@@ -36,9 +38,8 @@ def process_practice_session_async(session_id: int, user_id: int, attempted_ques
     """Background task to process practice session - updates stats, badges, leaderboards.
     Note: Points are already updated in main request, so we don't update them here."""
     from models import get_db, User, StudentProfile, PracticeSession
-    from reward_system import update_user_question_count
-    from gamification import update_streak, check_and_award_super_rewards, check_and_award_badges
-    from leaderboard_service import update_leaderboard, update_weekly_leaderboard
+    from gamification import update_streak
+    from leaderboard_refresher import leaderboard_refresher
     import time
     
     start_time = time.time()
@@ -52,21 +53,22 @@ def process_practice_session_async(session_id: int, user_id: int, attempted_ques
             print(f"⚠️ [BG_TASK] User or session not found for session_id={session_id}")
             return
         
-        # Update question count (points already updated in main request)
-        update_user_question_count(db, user, attempted_questions)
+        # Question count and points were already updated in the main request
         
         # Update streak (only for mental math, based on course type)
         profile = db.query(StudentProfile).filter(StudentProfile.user_id == user.id).first()
         if profile and profile.course == "Abacus":
             # Abacus students: streaks depend on mental math
-            update_streak(db, user, questions_practiced_today=attempted_questions)
+            update_streak(db, user, questions_practiced_today=attempted_questions, source="mental_math")
         
-        # Check for lifetime badges (new reward system)
-        from reward_system import check_and_award_lifetime_badges
-        check_and_award_lifetime_badges(db, user)
+        # Lifetime volume and SUPER badges: only rules reading the metrics this submission changed
+        if attempted_questions > 0:
+            from reward_rules import QUESTIONS_ATTEMPTED, TOTAL_POINTS, evaluate_user
+            evaluate_user(db, user, {TOTAL_POINTS, QUESTIONS_ATTEMPTED})
         
-        # Check for SUPER badge rewards
-        check_and_award_super_rewards(db, user)
+        # The streak may have changed
+        from stats_cache import invalidate_on_commit, reward_summary_cache
+        invalidate_on_commit(db, reward_summary_cache, user.id)
         
         # Note: Monthly badges (accuracy_ace, perfect_precision, comeback_kid) are evaluated
         # at end of month via monthly_badge_evaluation.py, not per-session
@@ -74,16 +76,8 @@ def process_practice_session_async(session_id: int, user_id: int, attempted_ques
         db.commit()
         db.refresh(user)
         
-        # Update leaderboards (these have their own commits)
-        try:
-            update_leaderboard(db)
-        except Exception as e:
-            print(f"⚠️ [BG_TASK] Error updating leaderboard: {e}")
-        
-        try:
-            update_weekly_leaderboard(db)
-        except Exception as e:
-            print(f"⚠️ [BG_TASK] Error updating weekly leaderboard: {e}")
+        # Queue a leaderboard refresh (coalesced with other submissions)
+        leaderboard_refresher.mark_dirty(user.id)
         
         elapsed = time.time() - start_time
         print(f"✅ [BG_TASK] Processed practice session {session_id} in {elapsed:.2f}s")
@@ -95,11 +89,11 @@ def process_practice_session_async(session_id: int, user_id: int, attempted_ques
     finally:
         db.close()
 
-from gamification import calculate_points, check_and_award_badges, update_streak, check_and_award_super_rewards
-from leaderboard_service import (
-    update_leaderboard, update_weekly_leaderboard,
-    get_overall_leaderboard, get_weekly_leaderboard
-)
+from gamification import calculate_points, update_streak
+from leaderboard_refresher import leaderboard_refresher
+from leaderboard_cache import leaderboard_read_model
+from leaderboard_index import leaderboard_index
+from leaderboard_service import publish_leaderboard_changes
 # Lazy import reward_system to prevent startup failures
 # Functions will be imported when needed
 
@@ -178,6 +172,8 @@ async def login(login_data: LoginRequest, db: Session = Depends(get_db)):
                 db.add(profile)
 
             db.commit()
+            from stats_cache import stats_cache
+            stats_cache.invalidate()
         else:
             # Existing user - update info and check if role needs updating
             user.name = user_info["name"]
@@ -315,6 +311,8 @@ async def update_display_name(
     current_user.display_name = request.display_name
     db.commit()
     db.refresh(current_user)
+    leaderboard_read_model.invalidate()  # Leaderboard shows display names
+    leaderboard_index.update_profile(current_user.id, current_user.display_name or current_user.name, current_user.avatar_url)
     return UserResponse.model_validate(current_user)
 
 
@@ -323,11 +321,26 @@ async def save_practice_session(
     session_data: PracticeSessionCreate,
     background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
-    """Save a practice session with all attempts."""
+    """Save a practice session with all attempts.
+    
+    If an Idempotency-Key header is sent, a retry with the same key returns the
+    original response without creating another session or awarding points again."""
     import time
+    from idempotency import validate_idempotency_key, hash_request, get_cached_response, store_response
     request_start = time.time()
+    
+    endpoint = "POST /users/practice-session"
+    idempotency_key = validate_idempotency_key(idempotency_key)
+    request_hash = None
+    if idempotency_key:
+        request_hash = hash_request(endpoint, session_data.model_dump(mode="json"))
+        cached = get_cached_response(db, current_user.id, idempotency_key, endpoint, request_hash)
+        if cached is not None:
+            return PracticeSessionResponse.model_validate(cached)
+    
     try:
         # Calculate attempted questions (answered questions, right or wrong)
         attempted_questions = session_data.correct_answers + session_data.wrong_answers
@@ -360,18 +373,9 @@ async def save_practice_session(
         db.add(session)
         db.flush()  # Get session ID
         
-        # Save attempts
-        for attempt_data in session_data.attempts:
-            attempt = Attempt(
-                session_id=session.id,
-                question_data=attempt_data.get("question_data", {}),
-                user_answer=attempt_data.get("user_answer"),
-                correct_answer=attempt_data.get("correct_answer"),
-                is_correct=attempt_data.get("is_correct", False),
-                time_taken=attempt_data.get("time_taken", 0),
-                question_number=attempt_data.get("question_number", 0)
-            )
-            db.add(attempt)
+        # Save attempts (one packed row per session, or bulk rows with ATTEMPT_STORAGE=rows)
+        from attempt_storage import store_attempts
+        store_attempts(db, session.id, session_data.attempts)
         
         # Update user points immediately (needed for response)
         current_user.total_points += points_earned
@@ -399,6 +403,23 @@ async def save_practice_session(
         from reward_system import update_user_question_count
         update_user_question_count(db, current_user, attempted_questions)
         
+        # Roll the session into today's activity row (streaks read this)
+        from daily_activity import record_activity
+        record_activity(db, current_user.id, mental_math_questions=attempted_questions, sessions=1, points=points_earned)
+        from student_stats import record_practice_session
+        record_practice_session(
+            db, current_user.id, session_data.total_questions,
+            session_data.correct_answers, session_data.wrong_answers
+        )
+        
+        if idempotency_key:
+            # Store the response in the same transaction as the session it describes
+            db.flush()
+            store_response(
+                db, current_user.id, idempotency_key, endpoint, request_hash,
+                PracticeSessionResponse.model_validate(session).model_dump(mode="json")
+            )
+        
         db.commit()
         db.refresh(session)
         db.refresh(current_user)
@@ -433,6 +454,18 @@ async def save_practice_session(
     except HTTPException:
         # Re-raise HTTP exceptions as-is
         raise
+    except IntegrityError as e:
+        db.rollback()
+        if idempotency_key:
+            # A concurrent request with the same key committed first - replay its response
+            cached = get_cached_response(db, current_user.id, idempotency_key, endpoint, request_hash)
+            if cached is not None:
+                return PracticeSessionResponse.model_validate(cached)
+        print(f"❌ [PRACTICE SESSION] Integrity error saving practice session: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Practice session conflicts with an existing record"
+        )
     except Exception as e:
         # Rollback transaction on error
         db.rollback()
@@ -453,38 +486,17 @@ async def get_student_stats(
     db: Session = Depends(get_db)
 ):
     """Get student statistics and progress."""
-    import time
-    request_start = time.time()
-    # Get session stats (mental math)
-    sessions = db.query(PracticeSession).filter(
-        PracticeSession.user_id == current_user.id
-    ).all()
-
-    total_mental_sessions = len(sessions)
-    mental_questions = sum(s.total_questions for s in sessions)
-    mental_correct = sum(s.correct_answers for s in sessions)
-    mental_wrong = sum(s.wrong_answers for s in sessions)
-
-    # Get paper attempt stats
-    from models import PaperAttempt
-    paper_attempts = db.query(PaperAttempt).filter(
-        PaperAttempt.user_id == current_user.id
-    ).all()
-
-    total_paper_attempts_count = len(paper_attempts)
-    paper_questions = sum(p.total_questions for p in paper_attempts)
-    paper_correct = sum(p.correct_answers for p in paper_attempts)
-    paper_wrong = sum(p.wrong_answers for p in paper_attempts)
+    from student_stats import get_user_stats, accuracy
+    
+    # Session and paper totals from the user's stats snapshot
+    totals = get_user_stats(db, current_user.id)
+    mental, paper = totals["mental"], totals["paper"]
 
     # Combined totals
-    total_sessions = total_mental_sessions + total_paper_attempts_count
-    total_questions = mental_questions + paper_questions
-    total_correct = mental_correct + paper_correct
-    total_wrong = mental_wrong + paper_wrong
-    overall_accuracy = (total_correct / total_questions * 100) if total_questions > 0 else 0
-
-    # Paper accuracy
-    paper_overall_accuracy = (paper_correct / paper_questions * 100) if paper_questions > 0 else 0
+    total_sessions = mental["sessions"] + paper["sessions"]
+    total_questions = mental["questions"] + paper["questions"]
+    total_correct = mental["correct"] + paper["correct"]
+    total_wrong = mental["wrong"] + paper["wrong"]
 
     # Get badges - filter out old badge system (accuracy_king, perfect_score, speed_star)
     old_badge_types = ["accuracy_king", "perfect_score", "speed_star"]
@@ -522,7 +534,7 @@ async def get_student_stats(
         total_questions=total_questions,
         total_correct=total_correct,
         total_wrong=total_wrong,
-        overall_accuracy=round(overall_accuracy, 2),
+        overall_accuracy=accuracy(total_correct, total_questions),
         total_points=current_user.total_points,
         current_streak=current_user.current_streak,
         longest_streak=current_user.longest_streak,
@@ -530,12 +542,31 @@ async def get_student_stats(
         recent_sessions=[PracticeSessionResponse.model_validate(s) for s in recent_sessions],
         recent_paper_attempts=[PaperAttemptResponse.model_validate(a) for a in recent_paper_attempts],
         # Practice paper metrics
-        total_paper_attempts=total_paper_attempts_count,
-        paper_total_questions=paper_questions,
-        paper_total_correct=paper_correct,
-        paper_total_wrong=paper_wrong,
-        paper_overall_accuracy=round(paper_overall_accuracy, 2)
+        total_paper_attempts=paper["sessions"],
+        paper_total_questions=paper["questions"],
+        paper_total_correct=paper["correct"],
+        paper_total_wrong=paper["wrong"],
+        paper_overall_accuracy=accuracy(paper["correct"], paper["questions"])
+    )
+
+
+@router.get("/practice-sessions", response_model=List[PracticeSessionResponse])
+async def get_practice_sessions(
+    response: Response,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None)
+):
+    """Get practice session history, newest first. Older pages via the X-Next-Cursor header."""
+    from pagination import keyset_page, set_next_cursor
+    
+    sessions, next_cursor = keyset_page(
+        db.query(PracticeSession).filter(PracticeSession.user_id == current_user.id),
+        PracticeSession.started_at, PracticeSession.id, cursor, limit
     )
+    set_next_cursor(response, next_cursor)
+    return [PracticeSessionResponse.model_validate(s) for s in sessions]
 
 
 @router.get("/practice-session/{session_id}", response_model=PracticeSessionDetailResponse)
@@ -545,18 +576,14 @@ async def get_practice_session_detail(
     db: Session = Depends(get_db)
 ):
     """Get detailed practice session with all attempts."""
-    session = db.query(PracticeSession).filter(
-        PracticeSession.id == session_id,
-        PracticeSession.user_id == current_user.id
-    ).first()
+    from attempt_storage import get_session_with_attempts, load_session_attempts
+    session = get_session_with_attempts(db, session_id, current_user.id)
     
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    # Get all attempts for this session
-    attempts = db.query(Attempt).filter(
-        Attempt.session_id == session_id
-    ).order_by(Attempt.question_number).all()
+    # Get all attempts for this session (packed or legacy rows)
+    attempts = load_session_attempts(db, session)
     
     # Ensure datetimes are treated as IST (SQLAlchemy returns naive datetimes)
     from timezone_utils import IST_TIMEZONE
@@ -593,18 +620,14 @@ async def get_practice_session_detail_admin(
 ):
     """Admin: Get detailed practice session for a specific student, with all attempts."""
     # Ensure the session belongs to the requested student
-    session = db.query(PracticeSession).filter(
-        PracticeSession.id == session_id,
-        PracticeSession.user_id == student_id
-    ).first()
+    from attempt_storage import get_session_with_attempts, load_session_attempts
+    session = get_session_with_attempts(db, session_id, student_id)
 
     if not session:
         raise HTTPException(status_code=404, detail="Session not found for this student")
 
-    # Get all attempts for this session
-    attempts = db.query(Attempt).filter(
-        Attempt.session_id == session_id
-    ).order_by(Attempt.question_number).all()
+    # Get all attempts for this session (packed or legacy rows)
+    attempts = load_session_attempts(db, session)
 
     # Ensure datetimes are treated as IST (SQLAlchemy returns naive datetimes)
     from timezone_utils import IST_TIMEZONE
@@ -649,22 +672,60 @@ async def get_paper_attempt_detail_admin(
     return PaperAttemptDetailResponse.model_validate(paper_attempt)
 
 
+def _leaderboard_response(db: Session, board: str, if_none_match: Optional[str]) -> Response:
+    """Serve a cached leaderboard snapshot, or 304 if the client already has it."""
+    snapshot = leaderboard_read_model.get(db, board)
+    headers = {"ETag": snapshot.etag, "Cache-Control": "no-cache"}
+    if if_none_match and snapshot.etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=snapshot.body, media_type="application/json", headers=headers)
+
+
 @router.get("/leaderboard/overall", response_model=List[LeaderboardEntry])
-async def get_overall_leaderboard_endpoint(db: Session = Depends(get_db)):
-    """Get overall leaderboard."""
+async def get_overall_leaderboard_endpoint(
+    db: Session = Depends(get_db),
+    if_none_match: Optional[str] = Header(None)
+):
+    """Get overall leaderboard (top entries, served from the in-memory read model)."""
     import time
     request_start = time.time()
-    entries = get_overall_leaderboard(db)
+    response = _leaderboard_response(db, "overall", if_none_match)
     elapsed = time.time() - request_start
-    print(f"⏱ [LEADERBOARD] GET /users/leaderboard/overall took {elapsed:.2f}s")
-    return [LeaderboardEntry(**entry) for entry in entries]
+    if elapsed > 0.5:  # Only log if slow
+        print(f"⏱ [LEADERBOARD] GET /users/leaderboard/overall took {elapsed:.2f}s")
+    return response
 
 
 @router.get("/leaderboard/weekly", response_model=List[LeaderboardEntry])
-async def get_weekly_leaderboard_endpoint(db: Session = Depends(get_db)):
-    """Get weekly leaderboard."""
-    entries = get_weekly_leaderboard(db)
-    return [LeaderboardEntry(**entry) for entry in entries]
+async def get_weekly_leaderboard_endpoint(
+    db: Session = Depends(get_db),
+    if_none_match: Optional[str] = Header(None)
+):
+    """Get weekly leaderboard (top entries, served from the in-memory read model)."""
+    return _leaderboard_response(db, "weekly", if_none_match)
+
+
+@router.get("/leaderboard/monthly", response_model=List[MonthlyLeaderboardEntry])
+async def get_monthly_leaderboard_endpoint(
+    db: Session = Depends(get_db),
+    if_none_match: Optional[str] = Header(None)
+):
+    """Get this month's leaderboard (points from every source since the 1st, IST)."""
+    return _leaderboard_response(db, "monthly", if_none_match)
+
+
+@router.get("/leaderboard/me", response_model=LeaderboardAroundMeResponse)
+async def get_my_leaderboard_position(
+    k: int = Query(5, ge=0, le=50, description="Entries to include above and below"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get the current user's overall and weekly rank with the k entries around them."""
+    return LeaderboardAroundMeResponse(
+        user_id=current_user.id,
+        overall=LeaderboardPosition(**leaderboard_index.position(db, "overall", current_user.id, k)),
+        weekly=LeaderboardPosition(**leaderboard_index.position(db, "weekly", current_user.id, k))
+    )
 
 
 # Admin routes
@@ -673,56 +734,86 @@ async def get_admin_stats(
     admin: User = Depends(get_current_admin),
     db: Session = Depends(get_db)
 ):
-    """Get admin dashboard statistics."""
-    # Total students
-    total_students = db.query(User).filter(User.role == "student").count()
-    
-    # Total sessions (mental math + practice paper attempts)
-    total_mental_math_sessions = db.query(PracticeSession).count()
-    total_paper_attempts = db.query(PaperAttempt).count()
-    total_sessions = total_mental_math_sessions + total_paper_attempts
-    
-    # Total questions
-    total_questions = db.query(func.sum(PracticeSession.total_questions)).scalar() or 0
-    
-    # Average accuracy
-    avg_accuracy = db.query(func.avg(PracticeSession.accuracy)).scalar() or 0
+    """Get admin dashboard statistics (cached briefly, see stats_cache)."""
+    from stats_cache import stats_cache, count_all, count_rows
+    from sqlalchemy import select
+    
+    def compute():
+        # Every figure in one round trip; session/question totals come from user_stats
+        values = count_all(db, {
+            "total_students": count_rows(User, User.role == "student"),
+            "mental_sessions": select(func.coalesce(func.sum(UserStats.mental_sessions), 0)),
+            "paper_attempts": select(func.coalesce(func.sum(UserStats.paper_attempts), 0)),
+            "total_questions": select(func.coalesce(func.sum(UserStats.mental_questions), 0)),
+            "average_accuracy": select(func.coalesce(func.avg(PracticeSession.accuracy), 0)),
+            # Students with a practice session today (IST) - one rollup row per active user and day
+            "active_today": select(func.count()).select_from(UserDailyActivity).join(
+                User, User.id == UserDailyActivity.user_id
+            ).where(
+                UserDailyActivity.ist_date == get_ist_now().date(),
+                UserDailyActivity.sessions > 0,
+                User.role == "student"
+            ),
+        })
+        return {
+            "total_students": values["total_students"],
+            "total_sessions": int(values["mental_sessions"]) + int(values["paper_attempts"]),
+            "total_questions": int(values["total_questions"]),
+            "average_accuracy": round(float(values["average_accuracy"]), 2),
+            "active_students_today": values["active_today"],
+        }
     
-    # Active students today (IST)
-    ist_now = get_ist_now()
-    today_start = ist_now.replace(hour=0, minute=0, second=0, microsecond=0)
-    active_today = db.query(func.count(func.distinct(PracticeSession.user_id))).filter(
-        PracticeSession.started_at >= today_start
-    ).scalar() or 0
+    stats = stats_cache.get("admin_stats", compute)
     
-    # Top students
-    top_students = get_overall_leaderboard(db, limit=10)
+    # Top students (served from the leaderboard read model)
+    top_students = leaderboard_read_model.top(db, "overall", limit=10)
     
     return AdminStats(
-        total_students=total_students,
-        total_sessions=total_sessions,
-        total_questions=int(total_questions),
-        average_accuracy=round(float(avg_accuracy), 2),
-        active_students_today=active_today,
+        **stats,
         top_students=[LeaderboardEntry(**entry) for entry in top_students]
     )
 
 
+@router.get("/admin/stats/cache")
+async def get_admin_stats_cache_status(
+    admin: User = Depends(get_current_admin)
+):
+    """Hit rates and TTL of the admin statistics cache."""
+    from stats_cache import stats_cache
+    return stats_cache.status()
+
+
 @router.get("/admin/students", response_model=List[UserResponse])
 async def get_all_students(
+    response: Response,
+    search: Optional[str] = Query(None, max_length=100),
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    offset: int = Query(0, ge=0),
     admin: User = Depends(get_current_admin),
     db: Session = Depends(get_db)
 ):
-    """Get all students."""
+    """
+    Get students with their public IDs, ordered by id.
+    search matches name, email, public ID, branch and course; pass limit/offset
+    to page (the X-Total-Count header carries the number of matches).
+    """
+    from student_directory import search_filter
     try:
-        students = db.query(User).filter(User.role == "student").order_by(
-            User.id.asc()
-        ).all()
-
-        # Add public_id from student profiles
-        result = []
-        for student in students:
-            student_dict = {
+        query = db.query(User, StudentProfile.public_id).outerjoin(
+            StudentProfile, StudentProfile.user_id == User.id
+        ).filter(User.role == "student")
+        condition = search_filter(search)
+        if condition is not None:
+            query = query.filter(condition)
+
+        if limit is not None:
+            response.headers["X-Total-Count"] = str(query.order_by(None).count())
+            rows = query.order_by(User.id.asc()).offset(offset).limit(limit).all()
+        else:
+            rows = query.order_by(User.id.asc()).all()
+
+        return [
+            UserResponse.model_validate({
                 "id": student.id,
                 "email": student.email,
                 "name": student.name,
@@ -733,17 +824,10 @@ async def get_all_students(
                 "current_streak": student.current_streak,
                 "longest_streak": student.longest_streak,
                 "created_at": student.created_at,
-                "public_id": None
-            }
-
-            # Get public_id from student profile
-            profile = db.query(StudentProfile).filter(StudentProfile.user_id == student.id).first()
-            if profile:
-                student_dict["public_id"] = profile.public_id
-
-            result.append(UserResponse.model_validate(student_dict))
-
-        return result
+                "public_id": public_id
+            })
+            for student, public_id in rows
+        ]
     except Exception as e:
         # Ensure we never drop the connection without a response.
         raise HTTPException(status_code=500, detail=f"Failed to load students: {str(e)}")
@@ -764,16 +848,11 @@ async def get_student_stats_admin(
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
     
-    # Reuse the stats logic
-    sessions = db.query(PracticeSession).filter(
-        PracticeSession.user_id == student.id
-    ).all()
+    from student_stats import get_user_stats, accuracy
     
-    total_sessions = len(sessions)
-    total_questions = sum(s.total_questions for s in sessions)
-    total_correct = sum(s.correct_answers for s in sessions)
-    total_wrong = sum(s.wrong_answers for s in sessions)
-    overall_accuracy = (total_correct / total_questions * 100) if total_questions > 0 else 0
+    # Session and paper totals from the student's stats snapshot
+    totals = get_user_stats(db, student.id)
+    mental, paper = totals["mental"], totals["paper"]
     
     # Filter out old badge system (accuracy_king, perfect_score, speed_star)
     old_badge_types = ["accuracy_king", "perfect_score", "speed_star"]
@@ -792,35 +871,65 @@ async def get_student_stats_admin(
         PaperAttempt.user_id == student.id
     ).order_by(desc(PaperAttempt.started_at)).limit(10).all()
     
-    # Calculate practice paper metrics
-    all_paper_attempts = db.query(PaperAttempt).filter(
-        PaperAttempt.user_id == student.id
-    ).all()
-    
-    total_paper_attempts = len(all_paper_attempts)
-    paper_total_questions = sum(a.total_questions for a in all_paper_attempts)
-    paper_total_correct = sum(a.correct_answers for a in all_paper_attempts)
-    paper_total_wrong = sum(a.wrong_answers for a in all_paper_attempts)
-    paper_overall_accuracy = (paper_total_correct / paper_total_questions * 100) if paper_total_questions > 0 else 0.0
-    
     return StudentStats(
-        total_sessions=total_sessions,
-        total_questions=total_questions,
-        total_correct=total_correct,
-        total_wrong=total_wrong,
-        overall_accuracy=round(overall_accuracy, 2),
+        # Admin view keeps mental math in the headline totals
+        total_sessions=mental["sessions"],
+        total_questions=mental["questions"],
+        total_correct=mental["correct"],
+        total_wrong=mental["wrong"],
+        overall_accuracy=accuracy(mental["correct"], mental["questions"]),
         total_points=student.total_points,
         current_streak=student.current_streak,
         longest_streak=student.longest_streak,
         badges=badge_names,
         recent_sessions=[PracticeSessionResponse.model_validate(s) for s in recent_sessions],
         recent_paper_attempts=[PaperAttemptResponse.model_validate(a) for a in recent_paper_attempts],
-        total_paper_attempts=total_paper_attempts,
-        paper_total_questions=paper_total_questions,
-        paper_total_correct=paper_total_correct,
-        paper_total_wrong=paper_total_wrong,
-        paper_overall_accuracy=round(paper_overall_accuracy, 2)
+        total_paper_attempts=paper["sessions"],
+        paper_total_questions=paper["questions"],
+        paper_total_correct=paper["correct"],
+        paper_total_wrong=paper["wrong"],
+        paper_overall_accuracy=accuracy(paper["correct"], paper["questions"])
+    )
+
+
+@router.get("/admin/students/{student_id}/practice-sessions", response_model=List[PracticeSessionResponse])
+async def get_student_practice_sessions_admin(
+    student_id: int,
+    response: Response,
+    admin: User = Depends(get_current_admin),
+    db: Session = Depends(get_db),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None)
+):
+    """Get a student's practice session history (admin view). Older pages via the X-Next-Cursor header."""
+    from pagination import keyset_page, set_next_cursor
+    
+    sessions, next_cursor = keyset_page(
+        db.query(PracticeSession).filter(PracticeSession.user_id == student_id),
+        PracticeSession.started_at, PracticeSession.id, cursor, limit
+    )
+    set_next_cursor(response, next_cursor)
+    return [PracticeSessionResponse.model_validate(s) for s in sessions]
+
+
+@router.get("/admin/students/{student_id}/paper-attempts", response_model=List[PaperAttemptResponse])
+async def get_student_paper_attempts_admin(
+    student_id: int,
+    response: Response,
+    admin: User = Depends(get_current_admin),
+    db: Session = Depends(get_db),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None)
+):
+    """Get a student's paper attempt history (admin view). Older pages via the X-Next-Cursor header."""
+    from pagination import keyset_page, set_next_cursor
+    
+    attempts, next_cursor = keyset_page(
+        db.query(PaperAttempt).filter(PaperAttempt.user_id == student_id),
+        PaperAttempt.started_at, PaperAttempt.id, cursor, limit
     )
+    set_next_cursor(response, next_cursor)
+    return [PaperAttemptResponse.model_validate(a) for a in attempts]
 
 
 class UpdatePointsRequest(BaseModel):
@@ -878,13 +987,26 @@ async def delete_student(
     if leaderboard:
         db.delete(leaderboard)
     
+    # Sessions the student was marked in, so the attendance rollups can be recounted without them
+    marked_sessions = []
+    if profile:
+        marked_sessions = db.query(ClassSession).join(
+            AttendanceRecord, AttendanceRecord.session_id == ClassSession.id
+        ).filter(AttendanceRecord.student_profile_id == profile.id).all()
+    
     # Delete user (cascade will handle sessions, attempts, rewards, paper_attempts, and student_profile)
     db.delete(student)
+    if marked_sessions:
+        from attendance_rollup import month_start, refresh_attendance_months, refresh_daily_summary, summary_key
+        refresh_attendance_months(db, [profile.id], {month_start(session.session_date) for session in marked_sessions})
+        refresh_daily_summary(db, {summary_key(session) for session in marked_sessions})
     db.commit()
     
-    # Refresh leaderboard after deletion
-    update_leaderboard(db)
-    update_weekly_leaderboard(db)
+    # Re-rank the remaining students
+    leaderboard_index.remove(student_id)
+    leaderboard_refresher.mark_dirty()
+    from stats_cache import stats_cache
+    stats_cache.invalidate()
     
     return {"message": f"Student {student.name} deleted successfully"}
 
@@ -928,14 +1050,8 @@ async def update_student_points(
     
     db.commit()
     
-    # Update leaderboard entry
-    leaderboard = db.query(Leaderboard).filter(Leaderboard.user_id == student_id).first()
-    if leaderboard:
-        leaderboard.total_points = student.total_points
-        db.commit()
-    
-    # Refresh leaderboard rankings
-    update_leaderboard(db)
+    # Queue this student's leaderboard entry for refresh and re-rank
+    leaderboard_refresher.mark_dirty(student_id)
     
     return {
         "message": f"Points updated for {student.name}",
@@ -945,14 +1061,23 @@ async def update_student_points(
 
 
 @router.post("/admin/leaderboard/refresh")
-async def refresh_leaderboard(
-    admin: User = Depends(get_current_admin),
-    db: Session = Depends(get_db)
+def refresh_leaderboard(
+    admin: User = Depends(get_current_admin)
+):
+    """
+    Force-flush the leaderboard refresher: full resync of overall and weekly leaderboards now.
+    A plain def so FastAPI runs the (blocking) resync in its threadpool.
+    """
+    leaderboard_refresher.flush(force=True)
+    return {"message": "Leaderboard refreshed successfully", "status": leaderboard_refresher.status()}
+
+
+@router.get("/admin/leaderboard/refresh")
+async def get_leaderboard_refresh_status(
+    admin: User = Depends(get_current_admin)
 ):
-    """Manually refresh both overall and weekly leaderboards."""
-    update_leaderboard(db)
-    update_weekly_leaderboard(db)
-    return {"message": "Leaderboard refreshed successfully"}
+    """Leaderboard refresher state: last refresh time, pending signals and lag."""
+    return leaderboard_refresher.status()
 
 
 @router.get("/admin/database/stats", response_model=DatabaseStatsResponse)
@@ -960,66 +1085,70 @@ async def get_database_stats(
     admin: User = Depends(get_current_admin),
     db: Session = Depends(get_db)
 ):
-    """Get database statistics."""
+    """Get database statistics (cached briefly, see stats_cache)."""
+    from stats_cache import stats_cache
     try:
-        total_users = db.query(User).count()
-        total_students = db.query(User).filter(User.role == "student").count()
-        total_admins = db.query(User).filter(User.role == "admin").count()
-        total_sessions = db.query(PracticeSession).count()
-        total_paper_attempts = db.query(PaperAttempt).count()
-        total_rewards = db.query(Reward).count()
-        total_papers = db.query(Paper).count()
-
-        # Calculate database size (SQLite or PostgreSQL)
-        import os
-        from sqlalchemy import text
-        db_path = os.getenv("DATABASE_URL", "sqlite:///./abacus_replitt.db")
-
-        if db_path.startswith("sqlite:///"):
-            # SQLite: get file size
-            db_file = db_path.replace("sqlite:///", "")
-            # If it's a relative path, make it absolute from the project root
-            if not os.path.isabs(db_file):
-                # Assume we're running from backend directory, go up one level
-                project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-                db_file = os.path.join(project_root, db_file)
-            
-            print(f"🔍 [DB STATS] Checking database file: {db_file}")
-            if os.path.exists(db_file):
-                db_size_mb = os.path.getsize(db_file) / (1024 * 1024)
-                print(f"✅ [DB STATS] Database size: {db_size_mb:.2f} MB")
-            else:
-                print(f"⚠️ [DB STATS] Database file not found: {db_file}")
-                db_size_mb = 0.0
+        return stats_cache.get("database_stats", lambda: _compute_database_stats(db))
+    except Exception as e:
+        # Ensure we never drop the connection without a response.
+        raise HTTPException(status_code=500, detail=f"Failed to load database stats: {str(e)}")
+
+
+def _compute_database_stats(db: Session) -> DatabaseStatsResponse:
+    from stats_cache import count_all, count_rows
+    
+    # All counts in one round trip
+    counts = count_all(db, {
+        "total_users": count_rows(User),
+        "total_students": count_rows(User, User.role == "student"),
+        "total_admins": count_rows(User, User.role == "admin"),
+        "total_sessions": count_rows(PracticeSession),
+        "total_paper_attempts": count_rows(PaperAttempt),
+        "total_rewards": count_rows(Reward),
+        "total_papers": count_rows(Paper),
+    })
+
+    # Calculate database size (SQLite or PostgreSQL)
+    import os
+    from sqlalchemy import text
+    db_path = os.getenv("DATABASE_URL", "sqlite:///./abacus_replitt.db")
+
+    if db_path.startswith("sqlite:///"):
+        # SQLite: get file size
+        db_file = db_path.replace("sqlite:///", "")
+        # If it's a relative path, make it absolute from the project root
+        if not os.path.isabs(db_file):
+            # Assume we're running from backend directory, go up one level
+            project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            db_file = os.path.join(project_root, db_file)
+        
+        print(f"🔍 [DB STATS] Checking database file: {db_file}")
+        if os.path.exists(db_file):
+            db_size_mb = os.path.getsize(db_file) / (1024 * 1024)
+            print(f"✅ [DB STATS] Database size: {db_size_mb:.2f} MB")
         else:
-            # PostgreSQL: use pg_database_size query
-            try:
-                if "postgresql" in db_path or "postgres" in db_path:
-                    result = db.execute(text("SELECT pg_database_size(current_database()) as size_bytes"))
-                    size_bytes = result.scalar()
-                    if size_bytes:
-                        db_size_mb = size_bytes / (1024 * 1024)
-                    else:
-                        db_size_mb = 0.0
+            print(f"⚠️ [DB STATS] Database file not found: {db_file}")
+            db_size_mb = 0.0
+    else:
+        # PostgreSQL: use pg_database_size query
+        try:
+            if "postgresql" in db_path or "postgres" in db_path:
+                result = db.execute(text("SELECT pg_database_size(current_database()) as size_bytes"))
+                size_bytes = result.scalar()
+                if size_bytes:
+                    db_size_mb = size_bytes / (1024 * 1024)
                 else:
                     db_size_mb = 0.0
-            except Exception as e:
-                print(f"⚠️ [DB STATS] Failed to get PostgreSQL size: {e}")
+            else:
                 db_size_mb = 0.0
+        except Exception as e:
+            print(f"⚠️ [DB STATS] Failed to get PostgreSQL size: {e}")
+            db_size_mb = 0.0
 
-        return DatabaseStatsResponse(
-            total_users=total_users,
-            total_students=total_students,
-            total_admins=total_admins,
-            total_sessions=total_sessions,
-            total_paper_attempts=total_paper_attempts,
-            total_rewards=total_rewards,
-            total_papers=total_papers,
-            database_size_mb=round(db_size_mb, 2)
-        )
-    except Exception as e:
-        # Ensure we never drop the connection without a response.
-        raise HTTPException(status_code=500, detail=f"Failed to load database stats: {str(e)}")
+    return DatabaseStatsResponse(
+        **counts,
+        database_size_mb=round(db_size_mb, 2)
+    )
 
 
 @router.post("/admin/promote-self")
@@ -1050,6 +1179,10 @@ async def promote_self_to_admin(
     # Promote to admin
     current_user.role = "admin"
     db.commit()
+    leaderboard_read_model.invalidate()  # Admins drop off the leaderboard
+    leaderboard_index.remove(current_user.id)
+    from stats_cache import stats_cache
+    stats_cache.invalidate()
     
     return {
         "message": f"Successfully promoted {current_user.email} to admin",
@@ -1082,14 +1215,19 @@ async def reset_all_progress_data(
     - Certificates
     """
     try:
-        # 1. Delete all attempts first (child table)
+        # 1. Delete all attempts first (child tables)
         deleted_attempts = db.query(Attempt).delete()
+        deleted_attempts += db.query(PracticeSessionAttemptPack).delete()
+        db.query(QuestionTemplate).delete()
         
         # 2. Delete all practice sessions (parent table)
         deleted_sessions = db.query(PracticeSession).delete()
         
         # 3. Delete all paper attempts
         deleted_papers = db.query(PaperAttempt).delete()
+        db.query(UserStats).delete()
+        db.query(UserDailyActivity).delete()
+        db.query(PointsPeriodRollup).delete()
         
         # 4. Delete all rewards/badges
         deleted_rewards = db.query(Reward).delete()
@@ -1116,6 +1254,10 @@ async def reset_all_progress_data(
         
         # Commit all changes
         db.commit()
+        publish_leaderboard_changes()
+        from stats_cache import reward_summary_cache, stats_cache
+        stats_cache.invalidate()
+        reward_summary_cache.invalidate()
         
         return {
             "message": "All progress data reset successfully",
@@ -1676,37 +1818,23 @@ async def get_reward_summary(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get comprehensive reward summary for student."""
+    """Get comprehensive reward summary for student (cached per user, see stats_cache)."""
+    from stats_cache import reward_summary_cache
+    return reward_summary_cache.get(current_user.id, lambda: _compute_reward_summary(db, current_user))
+
+
+def _compute_reward_summary(db: Session, current_user: User) -> RewardSummaryResponse:
     ist_now = get_ist_now()
     current_month = ist_now.month
     current_year = ist_now.year
     month_str = f"{current_year}-{current_month:02d}"
     
-    # Calculate attendance percentage for current month
+    # Attendance percentage for current month (from the monthly attendance rollup)
     attendance_percentage = 0.0
     profile = db.query(StudentProfile).filter(StudentProfile.user_id == current_user.id).first()
     if profile:
-        month_start = datetime(current_year, current_month, 1).replace(tzinfo=None)
-        if current_month == 12:
-            month_end = datetime(current_year + 1, 1, 1).replace(tzinfo=None)
-        else:
-            month_end = datetime(current_year, current_month + 1, 1).replace(tzinfo=None)
-        
-        # Get sessions for this month
-        sessions = db.query(ClassSession).filter(
-            ClassSession.branch == profile.branch,
-            ClassSession.session_date >= month_start,
-            ClassSession.session_date < month_end
-        ).all()
-        
-        if sessions:
-            session_ids = [s.id for s in sessions]
-            attendance_records = db.query(AttendanceRecord).filter(
-                AttendanceRecord.student_profile_id == profile.id,
-                AttendanceRecord.session_id.in_(session_ids),
-                AttendanceRecord.status == "present"
-            ).all()
-            attendance_percentage = (len(attendance_records) / len(sessions) * 100) if sessions else 0.0
+        from attendance_rollup import attendance_percentage as month_attendance_percentage
+        attendance_percentage = month_attendance_percentage(db, profile, date(current_year, current_month, 1))
     
     # Get all badges - filter out old badge system (accuracy_king, perfect_score, speed_star)
     old_badge_types = ["accuracy_king", "perfect_score", "speed_star"]
@@ -1721,78 +1849,23 @@ async def get_reward_summary(
                       if not b.is_lifetime and b.month_earned == month_str]
     current_badges = lifetime_badges + monthly_badges
     
-    # Calculate SUPER progress
+    # SUPER progress from the precomputed milestone table
+    from reward_rules import super_progress as compute_super_progress
     total_points = current_user.total_points
-    chocolate_milestones = [1500, 4500, 7500, 10500, 13500, 16500, 19500]
-    super_letter_milestones = [
-        (3000, "S"), (6000, "U"), (9000, "P"), (12000, "E"), (15000, "R")
-    ]
-    special_milestones = [(18000, "mystery_gift"), (21000, "party")]
-    
-    # Find current letter
-    current_letter = None
-    for threshold, letter in reversed(super_letter_milestones):
-        if total_points >= threshold:
-            current_letter = letter
-            break
-    
-    # Find next milestone
-    all_milestones = []
-    for milestone in chocolate_milestones:
-        all_milestones.append((milestone, "chocolate"))
-    for threshold, letter in super_letter_milestones:
-        all_milestones.append((threshold, f"letter_{letter}"))
-    for threshold, reward_type in special_milestones:
-        all_milestones.append((threshold, reward_type))
-    
-    all_milestones.sort()
-    next_milestone = None
-    next_milestone_type = None
-    for threshold, m_type in all_milestones:
-        if total_points < threshold:
-            next_milestone = threshold
-            next_milestone_type = m_type
-            break
-    
-    if not next_milestone:
-        next_milestone = 21000
-        next_milestone_type = "party"
-    
-    progress_percentage = (total_points / next_milestone * 100) if next_milestone > 0 else 0
-    progress_percentage = min(100, max(0, progress_percentage))
-    
-    # Get unlocked rewards
-    unlocked_rewards = []
-    for milestone in chocolate_milestones:
-        if total_points >= milestone:
-            unlocked_rewards.append(f"Chocolate 🍫 ({milestone} pts)")
-    for threshold, letter in super_letter_milestones:
-        if total_points >= threshold:
-            unlocked_rewards.append(f"SUPER Badge - {letter}")
-    if total_points >= 18000:
-        unlocked_rewards.append("Mystery Gift 🎁")
-    if total_points >= 21000:
-        unlocked_rewards.append("Party 🎉")
-    
-    super_progress = SuperProgress(
-        current_letter=current_letter,
-        current_points=total_points,
-        next_milestone=next_milestone,
-        next_milestone_type=next_milestone_type,
-        progress_percentage=round(progress_percentage, 2),
-        unlocked_rewards=unlocked_rewards
-    )
+    super_progress = SuperProgress(current_points=total_points, **compute_super_progress(total_points))
     
     # Check grace skip availability
     from reward_system import can_use_grace_skip
     can_use, reason = can_use_grace_skip(db, current_user)
     
+    from student_stats import get_user_stats, questions_attempted
+    
     return RewardSummaryResponse(
         total_points=total_points,
         current_streak=current_user.current_streak,
         longest_streak=current_user.longest_streak,
         attendance_percentage=round(attendance_percentage, 2),
-        total_questions_attempted=current_user.total_questions_attempted or 0,
+        total_questions_attempted=questions_attempted(get_user_stats(db, current_user.id)),
         super_progress=super_progress,
         current_badges=current_badges,
         lifetime_badges=lifetime_badges,
@@ -1851,45 +1924,120 @@ async def redeem_grace_skip(
     )
 
 
+def _points_logs_page(db: Session, background_tasks: BackgroundTasks, user_id: int, limit: int,
+                      cursor: Optional[str], offset: int) -> PointsSummaryResponse:
+    """
+    One page of a user's points log, newest first, with the ledger checksum.
+    Read-only; a due checkpoint is advanced after the response on its own session.
+    """
+    from points_logger import advance_checkpoint_in_background, get_points_summary
+    from pagination import keyset_page
+    
+    query = db.query(PointsLog).filter(PointsLog.user_id == user_id)
+    if offset and not cursor:
+        # Legacy offset paging; clients should follow next_cursor instead
+        query = query.order_by(PointsLog.created_at.desc(), PointsLog.id.desc()).offset(offset)
+        logs = query.limit(limit).all()
+        next_cursor = None
+    else:
+        logs, next_cursor = keyset_page(query, PointsLog.created_at, PointsLog.id, cursor, limit)
+    
+    # Get summary with checksum
+    summary = get_points_summary(db, user_id)
+    if summary["checkpoint_due"]:
+        background_tasks.add_task(advance_checkpoint_in_background, user_id)
+    
+    return PointsSummaryResponse(
+        total_points_from_logs=summary["total_points_from_logs"],
+        total_points_from_user=summary["total_points_from_user"],
+        match=summary["match"],
+        logs=[PointsLogResponse.model_validate(log) for log in logs],
+        total_entries=summary["total_entries"],
+        next_cursor=next_cursor
+    )
+
+
 @router.get("/points/logs", response_model=PointsSummaryResponse)
 async def get_points_logs(
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
     limit: Optional[int] = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None),
     offset: Optional[int] = Query(0, ge=0)
 ):
-    """Get points transaction log with checksum verification."""
-    from points_logger import get_points_summary
+    """Get points transaction log with checksum verification. Page with next_cursor."""
+    return _points_logs_page(db, background_tasks, current_user.id, limit, cursor, offset)
+
+
+@router.get("/admin/students/{student_id}/points/logs", response_model=PointsSummaryResponse)
+async def get_student_points_logs_admin(
+    student_id: int,
+    background_tasks: BackgroundTasks,
+    admin: User = Depends(get_current_admin),
+    db: Session = Depends(get_db),
+    limit: Optional[int] = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None)
+):
+    """Get a student's points transaction log (admin view). Page with next_cursor."""
+    if not db.query(User.id).filter(User.id == student_id).first():
+        raise HTTPException(status_code=404, detail="Student not found")
+    return _points_logs_page(db, background_tasks, student_id, limit, cursor, 0)
+
+
+@router.post("/admin/stats/reconcile", response_model=UserStatsReconcileResponse)
+async def reconcile_user_stats_admin(
+    repair: bool = Query(True),
+    admin: User = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """Recompute every user's stats snapshot from sessions and paper attempts, report drift and repair it."""
+    from student_stats import reconcile_user_stats
     
-    # Get points logs
-    logs = db.query(PointsLog).filter(
-        PointsLog.user_id == current_user.id
-    ).order_by(PointsLog.created_at.desc()).offset(offset).limit(limit).all()
+    try:
+        result = reconcile_user_stats(db, repair=repair)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Stats reconciliation failed: {str(e)}"
+        )
+    return UserStatsReconcileResponse(**result)
+
+
+@router.post("/admin/points/verify-ledger", response_model=LedgerVerificationResponse)
+async def verify_points_ledger(
+    advance_checkpoints: bool = Query(True),
+    admin: User = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """Verify every user's points ledger against their total and advance ledger checkpoints."""
+    from points_logger import verify_all_ledgers
     
-    # Get summary with checksum
-    summary = get_points_summary(db, current_user.id)
+    try:
+        result = verify_all_ledgers(db, advance_checkpoints=advance_checkpoints)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Ledger verification failed: {str(e)}"
+        )
     
-    return PointsSummaryResponse(
-        total_points_from_logs=summary["total_points_from_logs"],
-        total_points_from_user=summary["total_points_from_user"],
-        match=summary["match"],
-        logs=[PointsLogResponse.model_validate(log) for log in logs],
-        total_entries=db.query(PointsLog).filter(PointsLog.user_id == current_user.id).count()
-    )
+    if result["mismatches"]:
+        print(f"⚠️ [POINTS] Ledger mismatch for {len(result['mismatches'])} of {result['checked_users']} users")
+    return LedgerVerificationResponse(**result)
 
 
 @router.post("/admin/rewards/evaluate-monthly")
-async def evaluate_monthly_badges_admin(
+def evaluate_monthly_badges_admin(
     year: Optional[int] = Query(None),
     month: Optional[int] = Query(None),
-    admin: User = Depends(get_current_admin),
-    db: Session = Depends(get_db)
+    admin: User = Depends(get_current_admin)
 ):
-    """Admin endpoint to manually trigger monthly badge evaluation."""
+    """
+    Admin endpoint to manually trigger monthly badge evaluation.
+    A plain def so FastAPI runs the (blocking) evaluation in its threadpool.
+    """
     # Lazy import to prevent startup failures
-    from reward_system import (
-        evaluate_attendance_badges, evaluate_tshirt_star_badges, award_leaderboard_badges
-    )
+    from monthly_badge_evaluation import evaluate_monthly_badges
     
     ist_now = get_ist_now()
     
@@ -1907,24 +2055,45 @@ async def evaluate_monthly_badges_admin(
         if eval_month < 1 or eval_month > 12:
             raise HTTPException(status_code=400, detail="Month must be between 1 and 12")
     
-    try:
-        # Evaluate all monthly badges
-        evaluate_attendance_badges(db, eval_year, eval_month)
-        evaluate_tshirt_star_badges(db, eval_year, eval_month)
-        award_leaderboard_badges(db, eval_year, eval_month)
-        
-        db.commit()
-        
-        return {
-            "success": True,
-            "message": f"Monthly badges evaluated for {eval_year}-{eval_month:02d}",
-            "year": eval_year,
-            "month": eval_month
-        }
-    except Exception as e:
-        db.rollback()
+    # Stages run in parallel on their own sessions and commit independently
+    result = evaluate_monthly_badges(eval_year, eval_month)
+    if result["failed"]:
+        errors = "; ".join(f"{name}: {result['stages'][name]['error']}" for name in result["failed"])
         raise HTTPException(
             status_code=500,
-            detail=f"Failed to evaluate monthly badges: {str(e)}"
+            detail=f"Failed to evaluate monthly badges: {errors}"
         )
+    
+    return {
+        "success": True,
+        "message": f"Monthly badges evaluated for {eval_year}-{eval_month:02d}",
+        "year": eval_year,
+        "month": eval_month,
+        "awarded": result["awarded"],
+        "seconds": result["seconds"],
+        "stages": result["stages"]
+    }
+
+
+@router.post("/admin/streaks/reconcile")
+def reconcile_streaks_admin(
+    run_date: Optional[date] = Query(None, alias="date"),
+    admin: User = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """Admin endpoint to run the nightly streak reconciliation for one IST day (default: yesterday)."""
+    # Lazy import to prevent startup failures
+    from streak_reconciliation import reconcile_streaks
+    
+    today = get_ist_now().date()
+    day = run_date or today - timedelta(days=1)
+    if day >= today:
+        raise HTTPException(status_code=400, detail="Only days that are over can be reconciled")
+    
+    try:
+        result = reconcile_streaks(db, day)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to reconcile streaks: {str(e)}")
+    
+    return {"success": True, **result}
 
@@ -1,5 +1,5 @@
 """Pydantic schemas for user-related models."""
-from pydantic import BaseModel, EmailStr, field_serializer, Field, model_validator
+from pydantic import BaseModel, EmailStr, field_serializer, Field, model_validator, AliasChoices
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 from timezone_utils import utc_to_ist, IST_TIMEZONE
@@ -68,6 +68,16 @@ class LoginResponse(BaseModel):
     user: UserResponse
 
 
+class AttemptCreate(BaseModel):
+    """A single answered question, validated up front so attempts can be bulk inserted."""
+    question_data: Dict[str, Any] = Field(default_factory=dict)
+    user_answer: Optional[float] = None  # None if the question was skipped
+    correct_answer: float
+    is_correct: bool = False
+    time_taken: float = 0
+    question_number: int = 0
+
+
 class PracticeSessionCreate(BaseModel):
     operation_type: str
     difficulty_mode: str
@@ -78,7 +88,7 @@ class PracticeSessionCreate(BaseModel):
     score: int
     time_taken: float
     points_earned: int
-    attempts: List[dict]  # List of attempt data
+    attempts: List[AttemptCreate]
 
 
 class AttemptResponse(BaseModel):
@@ -159,6 +169,24 @@ class LeaderboardEntry(BaseModel):
     weekly_points: int
 
 
+class MonthlyLeaderboardEntry(LeaderboardEntry):
+    monthly_points: int
+
+
+class LeaderboardPosition(BaseModel):
+    rank: Optional[int]  # None if the user isn't on this board
+    points: int
+    total_entries: int
+    above: List[LeaderboardEntry]  # Up to k entries ranked directly above
+    below: List[LeaderboardEntry]  # Up to k entries ranked directly below
+
+
+class LeaderboardAroundMeResponse(BaseModel):
+    user_id: int
+    overall: LeaderboardPosition
+    weekly: LeaderboardPosition
+
+
 class AdminStats(BaseModel):
     total_students: int
     total_sessions: int
@@ -471,7 +499,8 @@ class PointsLogResponse(BaseModel):
     source_type: str
     description: str
     source_id: Optional[int] = None
-    metadata: Optional[Dict[str, Any]] = None
+    # Stored as PointsLog.extra_data (`metadata` is reserved on SQLAlchemy models)
+    metadata: Optional[Dict[str, Any]] = Field(None, validation_alias=AliasChoices("extra_data", "metadata"))
     created_at: datetime
     
     @field_serializer('created_at')
@@ -493,6 +522,37 @@ class PointsSummaryResponse(BaseModel):
     match: bool
     logs: List[PointsLogResponse]
     total_entries: int
+    next_cursor: Optional[str] = None  # Pass back as ?cursor= for the next page
+
+
+class LedgerMismatch(BaseModel):
+    """A user whose points ledger doesn't add up to their total."""
+    user_id: int
+    name: str
+    total_points_from_user: int
+    total_points_from_logs: int
+    difference: int
+
+
+class LedgerVerificationResponse(BaseModel):
+    """Result of verifying all points ledgers."""
+    checked_users: int
+    mismatches: List[LedgerMismatch]
+    checkpoints_advanced: int
+
+
+class UserStatsDrift(BaseModel):
+    """A user whose stats snapshot disagrees with their sessions and paper attempts."""
+    user_id: int
+    missing_row: bool
+    differences: Dict[str, int]  # column -> expected minus stored
+
+
+class UserStatsReconcileResponse(BaseModel):
+    """Result of reconciling user_stats with history."""
+    checked_users: int
+    drifted: List[UserStatsDrift]
+    repaired: int
 
 
 class SuperProgress(BaseModel):
@@ -0,0 +1,53 @@
+"""Shared fixtures for the backend tests: a throwaway SQLite database per test."""
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Point the backend at a scratch database before anything imports models
+_DB_DIR = tempfile.mkdtemp(prefix="abacus-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_DB_DIR, 'test.db')}"
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret")
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """A session on freshly created tables; background leaderboard refreshes are disabled."""
+    from models import Base, SessionLocal, engine
+    from leaderboard_refresher import leaderboard_refresher
+
+    # SQLite index names are global and two tables declare idx_user_created
+    seen = set()
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            if index.name in seen:
+                index.name = f"{table.name}_{index.name}"
+            seen.add(index.name)
+
+    monkeypatch.setattr(leaderboard_refresher, "mark_dirty", lambda user_id=None: None)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def make_student(db):
+    """Create a student user with a profile: make_student(name, course=..., branch=..., **user_fields)."""
+    from models import StudentProfile, User
+
+    def make(name, course="Abacus", branch="Rohini-16", **user_fields):
+        user = User(google_id=name, email=f"{name}@example.com", name=name, role="student", **user_fields)
+        db.add(user)
+        db.flush()
+        db.add(StudentProfile(user_id=user.id, course=course, branch=branch,
+                              public_id=f"TH-{user.id:04d}", full_name=name))
+        db.commit()
+        return user
+
+    return make
@@ -267,7 +267,9 @@ export async function submitPaperAttempt(
       method: "PUT",
       headers: { 
         "Content-Type": "application/json",
-        "Authorization": `Bearer ${token}`
+        "Authorization": `Bearer ${token}`,
+        // Same attempt always maps to the same key, so a resubmission replays the stored result
+        "Idempotency-Key": `paper-attempt-${attemptId}`
       },
       body: JSON.stringify({ answers, time_taken: timeTaken }),
     });
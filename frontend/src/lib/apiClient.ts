@@ -441,7 +441,7 @@ export const apiClient = {
   get: <T>(endpoint: string, options?: { requireAuth?: boolean; timeout?: number }) =>
     apiRequest<T>('GET', endpoint, { ...options }),
 
-  post: <T>(endpoint: string, body?: any, options?: { requireAuth?: boolean; timeout?: number }) =>
+  post: <T>(endpoint: string, body?: any, options?: { requireAuth?: boolean; timeout?: number; headers?: HeadersInit }) =>
     apiRequest<T>('POST', endpoint, { body, ...options }),
 
   put: <T>(endpoint: string, body?: any, options?: { requireAuth?: boolean; timeout?: number }) =>
@@ -222,11 +222,19 @@ export async function getAttendanceRecords(params?: {
   if (params?.session_id) queryParams.append("session_id", params.session_id.toString());
   if (params?.start_date) queryParams.append("start_date", params.start_date);
   if (params?.end_date) queryParams.append("end_date", params.end_date);
-  
-  const res = await fetch(`${ATTENDANCE_BASE}/records?${queryParams}`, {
-    headers: getAuthHeaders(),
-  });
-  return readResponse<AttendanceRecord[]>(res);
+  queryParams.set("limit", "500");
+
+  // The endpoint pages its results; follow X-Next-Cursor until the last page
+  const records: AttendanceRecord[] = [];
+  for (;;) {
+    const res = await fetch(`${ATTENDANCE_BASE}/records?${queryParams}`, {
+      headers: getAuthHeaders(),
+    });
+    records.push(...(await readResponse<AttendanceRecord[]>(res)));
+    const nextCursor = res.headers.get("X-Next-Cursor");
+    if (!nextCursor) return records;
+    queryParams.set("cursor", nextCursor);
+  }
 }
 
 export async function deleteAttendanceRecord(
@@ -194,7 +194,10 @@ export async function savePracticeSession(session: PracticeSessionData): Promise
   });
   
   try {
-    const data = await apiClient.post("/users/practice-session", session);
+    // One key per save: automatic retries reuse it, so the server never stores the session twice
+    const data = await apiClient.post("/users/practice-session", session, {
+      headers: { "Idempotency-Key": crypto.randomUUID() },
+    });
     console.log("✅ [API] Practice session saved successfully!");
     return data;
   } catch (error) {
@@ -231,6 +234,11 @@ export async function getWeeklyLeaderboard(): Promise<LeaderboardEntry[]> {
   return apiClient.get<LeaderboardEntry[]>("/users/leaderboard/weekly");
 }
 
+// Get monthly leaderboard (current IST month, all points sources)
+export async function getMonthlyLeaderboard(): Promise<(LeaderboardEntry & { monthly_points: number })[]> {
+  return apiClient.get<(LeaderboardEntry & { monthly_points: number })[]>("/users/leaderboard/monthly");
+}
+
 // Admin: Get all students
 export async function getAllStudents(): Promise<User[]> {
   return apiClient.get<User[]>("/users/admin/students");
@@ -442,8 +450,11 @@ export interface PointsSummaryResponse {
   match: boolean;
   logs: PointsLogEntry[];
   total_entries: number;
+  next_cursor?: string | null;
 }
 
-export async function getPointsLogs(limit: number = 100, offset: number = 0): Promise<PointsSummaryResponse> {
-  return apiClient.get(`/users/points/logs?limit=${limit}&offset=${offset}`);
+export async function getPointsLogs(limit: number = 100, cursor?: string | null): Promise<PointsSummaryResponse> {
+  const params = new URLSearchParams({ limit: String(limit) });
+  if (cursor) params.set("cursor", cursor);
+  return apiClient.get(`/users/points/logs?${params.toString()}`);
 }
\ No newline at end of file
@@ -594,7 +594,7 @@ export default function StudentDashboard() {
               setShowPointsLog(true);
               setLoadingPointsLog(true);
               try {
-                const data = await getPointsLogs(500, 0);
+                const data = await getPointsLogs(500);
                 setPointsLogData(data);
               } catch (error) {
                 console.error("Failed to load points log:", error);
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""Tests for the reward rules engine, batch badge awards and monthly leaderboard badges."""
+from datetime import datetime
+
+import pytest
+
+from leaderboard_service import get_monthly_leaderboard
+from models import PointsLog, Reward
+from points_rollup import rebuild_points_rollup
+from reward_rules import CHOCOLATE_MILESTONES, LIFETIME, SUPER_LETTERS, TOTAL_POINTS, evaluate_batch, super_progress
+from reward_system import award_leaderboard_badges
+
+
+def _owned(db, user_id):
+    return sorted(badge_type for (badge_type,) in db.query(Reward.badge_type).filter(Reward.user_id == user_id))
+
+
+def test_evaluate_batch_rerun_awards_nothing(db, make_student):
+    low = make_student("low", total_points=1499)
+    mid = make_student("mid", total_points=3000)
+
+    first = evaluate_batch(db, LIFETIME, metrics={TOTAL_POINTS})
+    db.commit()
+    again = evaluate_batch(db, LIFETIME, metrics={TOTAL_POINTS})
+    db.commit()
+
+    assert first["chocolate_1500"] == 1 and first["super_s"] == 1
+    assert sum(again.values()) == 0
+    assert _owned(db, low.id) == []
+    assert _owned(db, mid.id) == ["chocolate_1500", "super_s"]
+
+
+@pytest.mark.parametrize("points, letter, next_milestone, unlocked", [
+    (0, None, 1500, 0),
+    (1499, None, 1500, 0),
+    (1500, None, 3000, 1),
+    (2999, None, 3000, 1),
+    (3000, "S", 4500, 2),
+    (15000, "R", 16500, 10),
+    (20999, "R", 21000, 13),
+    (21000, "R", 21000, 14),
+    (50000, "R", 21000, 14),
+])
+def test_super_progress_boundaries(points, letter, next_milestone, unlocked):
+    progress = super_progress(points)
+
+    assert progress["current_letter"] == letter
+    assert progress["next_milestone"] == next_milestone
+    assert len(progress["unlocked_rewards"]) == unlocked
+    assert progress["progress_percentage"] == round(min(100, points / next_milestone * 100), 2)
+
+
+def test_super_progress_covers_every_milestone():
+    assert len(super_progress(10 ** 6)["unlocked_rewards"]) == len(CHOCOLATE_MILESTONES) + len(SUPER_LETTERS) + 2
+
+
+def _earned(db, user, points, when):
+    db.add(PointsLog(user_id=user.id, points=points, source_type="mental_math", description="practice", created_at=when))
+
+
+def test_leaderboard_badges_rerank_past_month(db, make_student):
+    first = make_student("first", branch="Gurgaon")
+    second = make_student("second", branch="Gurgaon")
+    other = make_student("other", branch="Rohini-16")
+    _earned(db, first, 300, datetime(2026, 2, 10))
+    _earned(db, second, 200, datetime(2026, 2, 11))
+    _earned(db, other, 100, datetime(2026, 2, 12))
+    _earned(db, other, 1000, datetime(2026, 3, 1))  # Next month, must not count
+    db.commit()
+    rebuild_points_rollup(db)
+
+    award_leaderboard_badges(db, 2026, 2)
+    db.commit()
+    assert "leaderboard_gold" in _owned(db, first.id)
+    assert "leaderboard_silver" in _owned(db, second.id)
+    assert _owned(db, other.id) == ["branch_leaderboard_gold", "leaderboard_bronze"]
+
+    # A corrected ledger re-ranks the month cleanly
+    _earned(db, second, 500, datetime(2026, 2, 20))
+    db.commit()
+    rebuild_points_rollup(db)
+    award_leaderboard_badges(db, 2026, 2)
+    db.commit()
+
+    assert "leaderboard_gold" in _owned(db, second.id)
+    assert "leaderboard_silver" in _owned(db, first.id)
+    assert "leaderboard_gold" not in _owned(db, first.id)
+    assert db.query(Reward).filter(Reward.month_earned == "2026-02").count() == 6
+
+
+def test_leaderboard_badges_match_monthly_board(db, make_student):
+    deducted = make_student("deducted")
+    steady = make_student("steady")
+    _earned(db, deducted, 400, datetime(2026, 2, 3))
+    _earned(db, deducted, -250, datetime(2026, 2, 4))  # Correction, nets to 150
+    _earned(db, steady, 200, datetime(2026, 2, 5))
+    db.commit()
+    rebuild_points_rollup(db)
+
+    award_leaderboard_badges(db, 2026, 2)
+    db.commit()
+
+    board = [entry["user_id"] for entry in get_monthly_leaderboard(db, year=2026, month=2)]
+    assert board == [steady.id, deducted.id]
+    assert "leaderboard_gold" in _owned(db, steady.id)
+    assert "leaderboard_silver" in _owned(db, deducted.id)
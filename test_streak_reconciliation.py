@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""Tests for the nightly streak reconciliation."""
+from datetime import date, datetime, timedelta
+
+from models import PointsLog, Reward, StreakRun, UserDailyActivity, UserStreak
+from streak_reconciliation import mark_day_met, reconcile_pending, reconcile_streaks
+
+DAY = date(2026, 3, 18)
+
+
+def _streak(db, user, current, streak_date):
+    user.current_streak = current
+    user.longest_streak = max(user.longest_streak or 0, current)
+    db.add(UserStreak(user_id=user.id, streak_date=streak_date))
+
+
+def _practised(db, user, day, mental_math=20, paper=0):
+    db.add(UserDailyActivity(user_id=user.id, ist_date=day, mental_math_questions=mental_math, paper_questions=paper))
+
+
+def _bonuses(db, user_id):
+    return [log.points for log in db.query(PointsLog).filter_by(user_id=user_id, source_type="streak_bonus")]
+
+
+def test_advance_reset_and_grace(db, make_student):
+    met = make_student("met")
+    missed = make_student("missed")
+    grace = make_student("grace", last_grace_skip_date=datetime(2026, 3, 18, 9, 30))
+    for user in (met, missed, grace):
+        _streak(db, user, 3, DAY - timedelta(days=1))
+    _practised(db, met, DAY)
+    _practised(db, missed, DAY, mental_math=10)
+    db.commit()
+
+    result = reconcile_streaks(db, DAY)
+
+    assert result["streaks_advanced"] == 1
+    assert result["streaks_reset"] == 1
+    assert result["grace_preserved"] == 1
+    assert result["users_changed"] == 3
+    db.expire_all()
+    assert (met.current_streak, db.get(UserStreak, met.id).streak_date) == (4, DAY)
+    assert missed.current_streak == 0
+    assert (grace.current_streak, db.get(UserStreak, grace.id).streak_date) == (3, DAY)
+
+
+def test_course_decides_which_questions_count(db, make_student):
+    vedic = make_student("vedic", course="Vedic Maths")
+    _streak(db, vedic, 2, DAY - timedelta(days=1))
+    _practised(db, vedic, DAY, mental_math=30, paper=0)
+    db.commit()
+
+    reconcile_streaks(db, DAY)
+
+    db.expire_all()
+    assert vedic.current_streak == 0
+
+
+def test_milestone_bonus_paid_once(db, make_student):
+    user = make_student("seven")
+    _streak(db, user, 6, DAY - timedelta(days=1))
+    _practised(db, user, DAY)
+    db.commit()
+
+    first = reconcile_streaks(db, DAY)
+    again = reconcile_streaks(db, DAY)
+
+    assert first["bonuses_awarded"] == 1 and not first["already_ran"]
+    assert again["already_ran"] and again["bonuses_awarded"] == 1
+    db.expire_all()
+    assert _bonuses(db, user.id) == [50]
+    assert user.total_points == 50
+    assert db.query(StreakRun).count() == 1
+
+
+def test_submission_marked_day_earns_bonus(db, make_student):
+    user = make_student("submitted")
+    _streak(db, user, 13, DAY - timedelta(days=1))
+    _practised(db, user, DAY)
+    db.commit()
+    assert mark_day_met(db, user, DAY)
+    assert not mark_day_met(db, user, DAY)
+    db.commit()
+
+    result = reconcile_streaks(db, DAY)
+
+    assert result["streaks_advanced"] == 0
+    db.expire_all()
+    assert user.current_streak == 14
+    assert _bonuses(db, user.id) == [100]
+
+
+def test_full_month_bonus_and_badge(db, make_student):
+    month_end = date(2026, 4, 30)
+    user = make_student("april")
+    _streak(db, user, 30, month_end)
+    _practised(db, user, month_end)
+    db.commit()
+
+    reconcile_streaks(db, month_end)
+
+    assert _bonuses(db, user.id) == [500]
+    assert [(reward.badge_type, reward.month_earned) for reward in db.query(Reward)] == [("monthly_streak", "2026-04")]
+
+
+def test_late_reconciliation_pays_bonus_for_that_day(db, make_student):
+    # The student met DAY (their 7th day) and the next day before DAY was reconciled
+    user = make_student("late")
+    _streak(db, user, 8, DAY + timedelta(days=1))
+    _practised(db, user, DAY)
+    _practised(db, user, DAY + timedelta(days=1))
+    db.commit()
+
+    reconcile_streaks(db, DAY)
+
+    db.expire_all()
+    assert user.current_streak == 8
+    assert _bonuses(db, user.id) == [50]
+
+
+def test_catch_up_reconciles_every_missed_day(db, make_student):
+    user = make_student("away")
+    _streak(db, user, 5, DAY - timedelta(days=3))
+    db.add(StreakRun(run_date=DAY - timedelta(days=3), users_changed=0, streaks_advanced=0,
+                     streaks_reset=0, grace_preserved=0, bonuses_awarded=0))
+    for offset in (2, 1, 0):
+        _practised(db, user, DAY - timedelta(days=offset))
+    db.commit()
+
+    results = reconcile_pending(db, until=DAY)
+
+    assert [result["date"] for result in results] == [str(DAY - timedelta(days=offset)) for offset in (2, 1, 0)]
+    db.expire_all()
+    assert user.current_streak == 8
+    assert _bonuses(db, user.id) == [50]
+    assert reconcile_pending(db, until=DAY) == []
+
+
+def test_submission_during_the_run_is_kept(db, make_student, monkeypatch):
+    import streak_reconciliation
+
+    missed = make_student("missed")
+    grace = make_student("grace", last_grace_skip_date=datetime(2026, 3, 18, 9, 30))
+    for user in (missed, grace):
+        _streak(db, user, 3, DAY - timedelta(days=1))
+    db.commit()
+
+    # Both practise just after midnight, between the run's read and its writes
+    write_streaks = streak_reconciliation._write_streaks
+
+    def submissions_first(db, day, streak_updates, counted_days):
+        for user in (missed, grace):
+            _practised(db, user, day + timedelta(days=1))
+            assert mark_day_met(db, user, day + timedelta(days=1))
+        db.flush()
+        return write_streaks(db, day, streak_updates, counted_days)
+
+    monkeypatch.setattr(streak_reconciliation, "_write_streaks", submissions_first)
+    result = reconcile_streaks(db, DAY)
+
+    assert (result["streaks_reset"], result["grace_preserved"], result["users_changed"]) == (0, 0, 0)
+    db.expire_all()
+    for user in (missed, grace):
+        assert (user.current_streak, db.get(UserStreak, user.id).streak_date) == (1, DAY + timedelta(days=1))